@@ -0,0 +1,452 @@
+import asyncio
+import logging
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional
+from .channel_reader import TAIL_WINDOW, scan_window, get_channel_reader
+from .ssh_manager import SSHManager, has_command_error
+from .drivers import GENERIC_PROMPT_PATTERN, strip_pager_artifacts, get_driver, detect_driver
+from .concurrency import AIMDController, classify_error
+from .rate_limit import AdmissionController, AdmissionTicket, get_admission_controller
+from .result_sink import ResultSink
+from .cancellation import POLL_INTERVAL, CancelToken
+from .metrics import DEVICE_SECONDS, DEVICES_TOTAL, ERRORS_TOTAL, QUEUE_WAIT_SECONDS
+
+try:
+    import asyncssh
+except ImportError:  # 未安装 asyncssh 时通过线程桥接 paramiko
+    asyncssh = None
+
+
+class AsyncCommandExecutor:
+    """基于 asyncio 的批量命令执行引擎
+
+    单个事件循环驱动大量设备会话，并发由自适应并发控制器(AIMD)决定，
+    上限为 max_concurrency。安装了 asyncssh 时直接使用异步SSH；否则
+    paramiko 的连接和登录通过有界线程池桥接，命令的读写在事件循环中进行，
+    线程只在握手期间占用。登录前同样经过站点/AAA服务器/网段的限流，
+    结果格式和指标与 CommandExecutor 相同。
+    """
+
+    def __init__(self, max_concurrency: int = 200, bridge_threads: int = 32,
+                 use_asyncssh: Optional[bool] = None, concurrency: Optional[AIMDController] = None,
+                 adaptive_concurrency: bool = True, job_timeout: Optional[float] = None,
+                 admission: Optional[AdmissionController] = None, sink: Optional[ResultSink] = None):
+        """
+        Args:
+            max_concurrency: 同时进行的设备会话上限
+            bridge_threads: 桥接 paramiko 连接和登录的线程数
+            concurrency: 共享的并发控制器，默认单独创建
+            adaptive_concurrency: 根据连接耗时和错误自适应调整并发，关闭时固定为 max_concurrency
+            job_timeout: 每次批量执行的总时限(秒)
+            admission: 按站点/AAA服务器/网段的限流控制，默认使用 config.json 中的规则
+            sink: 结果输出目标，设置后每台设备完成即写入完整结果，
+                  results 中只保留摘要，完整结果通过 sink.reader() 按需读取
+        """
+        self.logger = logging.getLogger(__name__)
+        self.results = {}
+        self.max_concurrency = max_concurrency
+        self.bridge_threads = bridge_threads
+        self.use_asyncssh = asyncssh is not None if use_asyncssh is None else use_asyncssh
+        self.concurrency = concurrency or AIMDController(
+            initial=max(1, max_concurrency // 2) if adaptive_concurrency else max_concurrency,
+            max_limit=max_concurrency,
+            min_limit=1 if adaptive_concurrency else max_concurrency,
+            name="异步执行"
+        )
+        self.job_timeout = job_timeout
+        self.admission = admission or get_admission_controller()
+        self.sink = sink
+        self.cancel_token = CancelToken(job_timeout)  # 传入桥接线程中的连接，cancel_all 时触发
+        self.progress_callback = None
+        self.is_running = False
+        self.pending_devices = []
+        self._bridge = None
+        self._loop = None
+        self._tasks: List[asyncio.Task] = []
+
+    def set_progress_callback(self, callback: Callable[[int, int], None]) -> None:
+        """设置进度回调函数"""
+        self.progress_callback = callback
+
+    async def execute_device_commands(
+        self,
+        ip: str,
+        username: str,
+        password: str,
+        commands: List[str],
+        port: int = 22,
+        timeout: Optional[int] = None,
+        device: Optional[Dict] = None
+    ) -> Dict:
+        """为单个设备执行命令
+
+        Args:
+            device: 设备字典，用于按站点、AAA服务器等属性限流
+        """
+        result = {
+            'ip': ip,
+            'status': 'failed',
+            'commands': {},
+            'error': None,
+            'start_time': time.time()
+        }
+        session = {'vendor': 'unknown', 'error': None}  # 记录指标用的厂商和连接失败原因
+
+        try:
+            ticket = await self._admit(device or {'ip': ip}, result)
+            try:
+                if self.use_asyncssh:
+                    await self._run_asyncssh(result, session, username, password, commands, int(port), timeout)
+                else:
+                    await self._run_bridged(result, session, username, password, commands, int(port), timeout)
+            finally:
+                ticket.release()
+        except asyncio.CancelledError:
+            result['error'] = 'Cancelled'
+            raise
+        except Exception as e:
+            result['error'] = str(e)
+            self.logger.error(f"设备 {ip} 执行出错: {str(e)}")
+        finally:
+            result['end_time'] = time.time()
+            self._record_metrics(session, result)
+            if self.sink:
+                result = await self._write_result(result)
+            self.results[ip] = result
+            if self.progress_callback:
+                self.progress_callback(len(self.results), len(self.pending_devices))
+
+        return result
+
+    async def _admit(self, device: Dict, result: Dict) -> AdmissionTicket:
+        """在线程中等待限流放行，任务被取消时等线程结束并归还已拿到的名额"""
+        loop = asyncio.get_running_loop()
+        admit_start = time.monotonic()
+        waiting = loop.run_in_executor(self._bridge, lambda: self.admission.acquire(device, cancel=self.cancel_token))
+        try:
+            ticket = await asyncio.shield(waiting)
+        except asyncio.CancelledError:
+            await asyncio.wait([waiting])
+            if not waiting.cancelled() and waiting.exception() is None:
+                waiting.result().release()
+            raise
+        result['queue_wait'] = time.monotonic() - admit_start
+        QUEUE_WAIT_SECONDS.observe(result['queue_wait'], stage='admission')
+        return ticket
+
+    async def _write_result(self, result: Dict) -> Dict:
+        """在线程中写入 sink，返回摘要；任务被取消时仍写完"""
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.shield(loop.run_in_executor(None, self.sink.write, result))
+        except Exception as e:
+            self.logger.error(f"设备 {result['ip']} 结果写入失败: {str(e)}")
+            return result
+
+    def _record_metrics(self, session: Dict, result: Dict) -> None:
+        """记录设备耗时和按厂商的错误，与 CommandExecutor 相同"""
+        vendor = session['vendor']
+        DEVICES_TOTAL.inc(status=result['status'])
+        DEVICE_SECONDS.observe(result['end_time'] - result['start_time'], status=result['status'])
+        if result['status'] != 'success':
+            ERRORS_TOTAL.inc(vendor=vendor, kind=session['error'] or 'execution')
+        errors = sum(1 for output in result['commands'].values() if has_command_error(output))
+        if errors:
+            ERRORS_TOTAL.inc(errors, vendor=vendor, kind='command')
+
+    async def _run_bridged(self, result: Dict, session: Dict, username: str, password: str,
+                           commands: List[str], port: int, timeout: Optional[int]) -> None:
+        """连接和登录在桥接线程中完成，之后由共享的通道读取器把输出送回事件循环"""
+        loop = asyncio.get_running_loop()
+        ssh = SSHManager(result['ip'], username, password, port=port, cancel=self.cancel_token)
+        reader = get_channel_reader()
+        watching = False
+        connecting = loop.run_in_executor(self._bridge, ssh.connect)
+        try:
+            connected = await asyncio.shield(connecting)
+            session['vendor'] = ssh.driver.name
+            session['error'] = ssh.last_error
+            self.concurrency.record(ssh.last_error, ssh.connect_latency, key=result['ip'])
+            if not connected:
+                result['error'] = 'Connection failed'
+                self.logger.error(f"设备 {result['ip']} 连接失败")
+                return
+
+            chunks: asyncio.Queue = asyncio.Queue()
+            reader.watch(
+                ssh.shell,
+                on_data=lambda chunk: loop.call_soon_threadsafe(chunks.put_nowait, chunk),
+                on_close=lambda: loop.call_soon_threadsafe(chunks.put_nowait, None),
+                encoding=ssh.encoding
+            )
+            watching = True
+
+            for cmd in commands:
+                cmd = cmd.strip()
+                if not cmd:
+                    continue
+                if not self.is_running:
+                    break
+                result['commands'][cmd] = await self._execute_on_loop(ssh, chunks, cmd, timeout)
+
+            result['status'] = 'success'
+            self.logger.info(f"设备 {result['ip']} 命令执行完成")
+        finally:
+            # 取消时等登录线程结束再关闭，避免与正在进行的登录争用连接
+            await asyncio.wait([connecting])
+            await loop.run_in_executor(self._bridge, self._close_bridged, ssh, reader if watching else None)
+
+    @staticmethod
+    def _close_bridged(ssh: SSHManager, reader) -> None:
+        """停止读取后再关闭，归还连接池前的读取不会与读取器争用通道"""
+        if reader:
+            reader.unwatch(ssh.shell, wait=True)
+        ssh.close()
+
+    async def _execute_on_loop(self, ssh: SSHManager, chunks: asyncio.Queue,
+                               command: str, timeout: Optional[int]) -> str:
+        """在事件循环中执行一条命令，处理方式与 SSHManager.execute_command 相同"""
+        # 清空上一条命令之后的残留输出
+        while not chunks.empty():
+            if chunks.get_nowait() is None:
+                raise Exception("SSH通道已关闭")
+
+        renames_host = ssh.driver.renames_host(command)
+        if renames_host:
+            ssh.prompt_regex = re.compile(GENERIC_PROMPT_PATTERN)
+        ssh.shell.send(command + '\n')
+
+        wait_time = timeout or ssh._command_timeout(command)
+        start_time = time.monotonic()
+        output, matched = await self._read_until_prompt(
+            chunks.get, ssh.shell.send, ssh._prompt_at_end, wait_time, ssh._auto_responses()
+        )
+        ssh.last_output = output
+        ssh._record_latency(command, time.monotonic() - start_time, output)
+        if renames_host and matched:
+            ssh._learn_prompt(output)
+
+        if output:
+            if not matched:
+                self.logger.warning(f"命令 {command} 在 {wait_time} 秒内未返回提示符")
+            return output.strip()
+        self.logger.warning(f"命令 {command} 没有返回任何输出")
+        return "命令执行无响应"
+
+    async def _run_asyncssh(self, result: Dict, session: Dict, username: str, password: str,
+                            commands: List[str], port: int, timeout: Optional[int]) -> None:
+        """使用 asyncssh 的交互式会话执行命令"""
+        connect_start = time.monotonic()
+        try:
+            conn = await asyncssh.connect(
+                result['ip'],
+                port=port,
+                username=username,
+                password=password,
+                known_hosts=None,
+                connect_timeout=10
+            )
+        except Exception as e:
+            session['error'] = classify_error(e)
+            self.concurrency.record(e, key=result['ip'])
+            raise
+        self.concurrency.record(None, time.monotonic() - connect_start, key=result['ip'])
+        try:
+            process = await conn.create_process(
+                term_type='vt100',
+                term_size=(160, 48),
+                encoding='utf-8',
+                errors='replace'
+            )
+            driver = get_driver(None)
+            prompt = re.compile(GENERIC_PROMPT_PATTERN)
+            output, matched = await self._read_process(process, prompt, 5, driver)
+            if not matched:
+                raise Exception("等待提示符超时")
+
+            driver = detect_driver(conn.get_extra_info('server_version', '') or '', output)
+            session['vendor'] = driver.name
+            lines = [line for line in output.replace('\r', '\n').split('\n') if line.strip()]
+            hostname = driver.extract_hostname(lines[-1]) if lines else None
+            if hostname:
+                prompt = re.compile(driver.prompt_pattern(hostname))
+
+            # 关闭分页
+            if driver.paging_command:
+                process.stdin.write(driver.paging_command + '\n')
+                await self._read_process(process, prompt, 5, driver)
+
+            for cmd in commands:
+                cmd = cmd.strip()
+                if not cmd:
+                    continue
+                if not self.is_running:
+                    break
+                renames_host = driver.renames_host(cmd)
+                process.stdin.write(cmd + '\n')
+                output, matched = await self._read_process(
+                    process,
+                    re.compile(GENERIC_PROMPT_PATTERN) if renames_host else prompt,
+                    timeout or driver.command_timeout(cmd),
+                    driver
+                )
+                result['commands'][cmd] = output.strip() if output else "命令执行无响应"
+                if renames_host and matched:
+                    lines = [line for line in output.replace('\r', '\n').split('\n') if line.strip()]
+                    hostname = driver.extract_hostname(lines[-1]) if lines else None
+                    if hostname:
+                        prompt = re.compile(driver.prompt_pattern(hostname))
+
+            result['status'] = 'success'
+            self.logger.info(f"设备 {result['ip']} 命令执行完成")
+        finally:
+            conn.close()
+
+    async def _read_process(self, process, prompt, timeout: float, driver) -> tuple:
+        """读取 asyncssh 会话的输出直到出现提示符"""
+        return await self._read_until_prompt(
+            lambda: process.stdout.read(65535),
+            process.stdin.write,
+            lambda tail: bool(prompt.search(tail[-512:])),
+            timeout,
+            driver.auto_responses()
+        )
+
+    async def _read_until_prompt(self, read: Callable[[], Awaitable[Optional[str]]],
+                                 send: Callable[[str], object], matcher: Callable[[str], bool],
+                                 timeout: float, responses: list) -> tuple:
+        """读取输出直到缓冲区末尾出现提示符，只检查末尾窗口
+
+        read 返回空值表示通道已关闭。取消或超过作业截止时间时抛出 CancelledError。
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        chunks = []
+        tail = ""
+        received = 0  # 累计收到的字符数
+        replied_at = 0  # 上次应答时已收到的字符数，之前的内容不再扫描
+
+        while True:
+            self.cancel_token.check()
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return strip_pager_artifacts(''.join(chunks)), False
+            try:
+                chunk = await asyncio.wait_for(read(), self.cancel_token.remaining(remaining))
+            except asyncio.TimeoutError:
+                continue
+            if not chunk:
+                return strip_pager_artifacts(''.join(chunks)), False
+            chunks.append(chunk)
+            tail = (tail + chunk)[-TAIL_WINDOW:]
+            received += len(chunk)
+
+            # 确认对话框和分页提示按驱动规则应答，已应答过的内容不再匹配
+            window = scan_window(tail, min(256, received - replied_at))
+            reply = next((reply for pattern, reply in responses if pattern.search(window)), None)
+            if reply is not None:
+                send(reply)
+                replied_at = received
+                continue
+            if matcher(tail):
+                return strip_pager_artifacts(''.join(chunks)), True
+
+    async def batch_execute_async(
+        self,
+        devices: List[Dict],
+        command_map: Dict[str, List[str]],
+        timeout: Optional[int] = None
+    ) -> Dict:
+        """在当前事件循环中批量执行命令"""
+        if self.is_running:
+            raise RuntimeError("已有命令正在执行")
+
+        self.is_running = True
+        self.cancel_token = CancelToken(self.job_timeout)
+        self.results.clear()
+        self.pending_devices = devices
+        self._loop = asyncio.get_running_loop()
+        if not self.use_asyncssh:
+            self._bridge = ThreadPoolExecutor(
+                max_workers=self.bridge_threads,
+                thread_name_prefix="AsyncBridge"
+            )
+
+        self._tasks = []
+        queue = deque((device, command_map[device['ip']]) for device in devices if command_map.get(device['ip']))
+        slot_freed = asyncio.Event()
+
+        def slot_done(_) -> None:
+            # 完成回调在任务未开始就被取消时同样执行，名额不会泄漏
+            self.concurrency.release()
+            slot_freed.set()
+
+        try:
+            # 在并发控制器的名额内启动设备，不阻塞事件循环
+            while queue and self.is_running and not self.cancel_token.cancelled:
+                if not self.concurrency.acquire(timeout=0):
+                    slot_freed.clear()
+                    try:
+                        # 共享的控制器可能由其他作业归还名额，定期重试
+                        await asyncio.wait_for(slot_freed.wait(), POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                device, commands = queue.popleft()
+                task = asyncio.ensure_future(self.execute_device_commands(
+                    device['ip'],
+                    device['username'],
+                    device['password'],
+                    commands,
+                    device.get('port', 22),
+                    timeout,
+                    device=device
+                ))
+                task.add_done_callback(slot_done)
+                self._tasks.append(task)
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        except Exception as e:
+            self.logger.error(f"批量执行过程中发生错误: {str(e)}")
+        finally:
+            self.is_running = False
+            self._tasks = []
+            self._loop = None
+            if self._bridge:
+                self._bridge.shutdown(wait=False)
+                self._bridge = None
+            if self.sink:
+                self.sink.flush()
+            self.logger.info(
+                f"异步执行完成: 成功 {sum(1 for r in self.results.values() if r['status'] == 'success')}"
+                f"/{len(self.results)}"
+            )
+
+        return self.results
+
+    def batch_execute(
+        self,
+        devices: List[Dict],
+        command_map: Dict[str, List[str]],
+        timeout: Optional[int] = None
+    ) -> Dict:
+        """批量执行命令，接口与 CommandExecutor.batch_execute 相同"""
+        return asyncio.run(self.batch_execute_async(devices, command_map, timeout))
+
+    def cancel_all(self) -> None:
+        """取消所有正在执行的任务，可从其他线程调用"""
+        self.cancel_token.cancel()
+        if self.is_running:
+            self.is_running = False
+            loop = self._loop
+            if loop:
+                for task in list(self._tasks):
+                    loop.call_soon_threadsafe(task.cancel)
+            self.logger.info("已取消所有正在执行的任务")
+
+    def get_progress(self) -> tuple:
+        """获取执行进度"""
+        return len(self.results), len(self.pending_devices)
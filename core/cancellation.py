@@ -0,0 +1,92 @@
+import threading
+import time
+import logging
+from typing import Callable, List, Optional
+
+# 阻塞等待时检查取消的最长间隔(秒)
+POLL_INTERVAL = 0.5
+
+
+class CancelledError(Exception):
+    """作业被取消或超过截止时间"""
+
+
+class CancelToken:
+    """作业的取消令牌和截止时间
+
+    传入连接、读取、SFTP和等待调用中，取消或超过截止时间后
+    阻塞中的操作在 POLL_INTERVAL 内退出；登记的回调(如关闭套接字)
+    在取消时立即执行，用于打断握手和认证。
+    """
+
+    def __init__(self, timeout: Optional[float] = None, parent: Optional["CancelToken"] = None):
+        self.logger = logging.getLogger(__name__)
+        self.deadline = time.monotonic() + timeout if timeout else None
+        if parent and parent.deadline and (self.deadline is None or parent.deadline < self.deadline):
+            self.deadline = parent.deadline
+        self.reason = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        if parent:
+            parent.on_cancel(lambda: self.cancel(parent.reason))
+
+    @property
+    def cancelled(self) -> bool:
+        """已取消或已超过截止时间"""
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("超过作业截止时间")
+            return True
+        return False
+
+    def cancel(self, reason: Optional[str] = None) -> None:
+        """取消，执行登记的回调"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason or "作业已取消"
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                self.logger.debug(f"取消回调失败: {str(e)}")
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """登记取消时执行的回调，返回注销函数；已取消时立即执行"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._discard(callback)
+        callback()
+        return lambda: None
+
+    def _discard(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def remaining(self, timeout: Optional[float] = None) -> Optional[float]:
+        """timeout 与截止时间剩余时间中较小者，二者都没有时返回 None"""
+        if self.deadline is None:
+            return timeout
+        left = max(0.0, self.deadline - time.monotonic())
+        return left if timeout is None else min(timeout, left)
+
+    def check(self) -> None:
+        """已取消时抛出 CancelledError"""
+        if self.cancelled:
+            raise CancelledError(self.reason)
+
+    def sleep(self, seconds: float) -> None:
+        """可被取消打断的等待，取消时抛出 CancelledError"""
+        end = time.monotonic() + seconds
+        while True:
+            self.check()
+            left = end - time.monotonic()
+            if left <= 0:
+                return
+            self._event.wait(self.remaining(min(left, POLL_INTERVAL)))
@@ -0,0 +1,270 @@
+import codecs
+import selectors
+import socket
+import threading
+import time
+import logging
+from typing import Callable, Dict, List, Optional, Pattern, Tuple, Union
+from .cancellation import POLL_INTERVAL, CancelToken
+
+# 匹配条件: 编译好的正则或接收缓冲区末尾窗口返回bool的函数
+Matcher = Union[Pattern, Callable[[str], bool]]
+
+# 匹配条件只检查缓冲区末尾的这些字符
+TAIL_WINDOW = 1024
+
+# 自动应答扫描新数据时向前重叠的字符数，防止提示跨块被截断
+SCAN_OVERLAP = 64
+
+
+class ReadResult:
+    """read_until 的返回结果"""
+
+    def __init__(self, output: str, matched: bool, closed: bool = False):
+        self.output = output
+        self.matched = matched  # 是否在截止时间前匹配成功
+        self.closed = closed  # 通道是否已关闭
+
+    def __repr__(self):
+        return f"ReadResult(matched={self.matched}, closed={self.closed}, size={len(self.output)})"
+
+
+def scan_window(tail: str, size: int) -> str:
+    """缓冲区末尾 size 个字符"""
+    return tail[max(0, len(tail) - size):] if size > 0 else ''
+
+
+def _is_match(matcher: Matcher, buffer: str) -> bool:
+    if hasattr(matcher, 'search'):
+        return bool(matcher.search(buffer))
+    return matcher(buffer)
+
+
+def read_until(
+    channel,
+    matcher: Matcher,
+    timeout: float,
+    responses: Optional[List[Tuple[Pattern, str]]] = None,
+    on_data: Optional[Callable[[str], None]] = None,
+    encoding: str = 'utf-8',
+    cancel: Optional[CancelToken] = None
+) -> ReadResult:
+    """阻塞读取通道直到匹配条件成立或超时
+
+    输出按块累积，只在收到新数据时检查缓冲区末尾的窗口，
+    多字节字符跨块时由增量解码器拼接，整体开销与输出长度成线性关系。
+
+    Args:
+        channel: paramiko Channel
+        matcher: 结束条件，只作用于缓冲区末尾 TAIL_WINDOW 个字符
+        timeout: 截止时间(秒)
+        responses: 自动应答列表 [(正则, 回复内容)]，如确认提示
+        on_data: 每收到一段数据时的回调
+        encoding: 设备输出编码，如 utf-8、gbk
+        cancel: 取消令牌，取消或超过作业截止时间时抛出 CancelledError
+    """
+    deadline = time.monotonic() + timeout
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    chunks: List[str] = []
+    tail = ""
+    new_chars = 0  # 上次检查之后新增的字符数
+    received = 0  # 累计收到的字符数
+    replied_at = 0  # 上次应答时已收到的字符数，之前的内容不再扫描
+
+    with selectors.DefaultSelector() as selector:
+        selector.register(channel.fileno(), selectors.EVENT_READ)
+
+        while True:
+            # 先取走已缓存的数据，再等待新数据
+            while channel.recv_ready():
+                data = channel.recv(65535)
+                if not data:
+                    break
+                chunk = decoder.decode(data)
+                if not chunk:
+                    continue
+                chunks.append(chunk)
+                tail = (tail + chunk)[-TAIL_WINDOW:]
+                new_chars += len(chunk)
+                received += len(chunk)
+                if on_data:
+                    on_data(chunk)
+
+            if new_chars:
+                if _is_match(matcher, tail):
+                    return ReadResult(''.join(chunks), True)
+
+                if responses:
+                    # 只扫描新增内容及少量重叠，不回看上次应答之前的内容，
+                    # 否则应答后回显的换行仍会让同一个对话框再次匹配
+                    window = scan_window(tail, min(new_chars + SCAN_OVERLAP, received - replied_at))
+                    new_chars = 0
+                    reply = next((reply for pattern, reply in responses if pattern.search(window)), None)
+                    if reply is not None:
+                        channel.send(reply)
+                        replied_at = received
+                        continue
+                new_chars = 0
+
+            if channel.closed or channel.eof_received:
+                chunks.append(decoder.decode(b'', final=True))
+                return ReadResult(''.join(chunks), False, closed=True)
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return ReadResult(''.join(chunks), False)
+
+            if cancel:
+                cancel.check()
+                remaining = min(remaining, POLL_INTERVAL)
+            selector.select(remaining)
+
+
+class ChannelReader:
+    """基于 selectors 的事件驱动读取器，一个线程服务多个通道
+
+    通道有数据时回调 on_data(chunk)，通道关闭时回调 on_close()。
+    """
+
+    def __init__(self, encoding: str = 'utf-8'):
+        self.logger = logging.getLogger(__name__)
+        self.encoding = encoding
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[str, object, Optional[Callable], Optional[Callable], Optional[str]]] = []
+        self._watched: Dict[int, Tuple[object, Callable, Optional[Callable], object]] = {}
+        self._thread = None
+        self._running = False
+        # 用socketpair唤醒select，以便及时处理注册变更
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+
+    def start(self) -> None:
+        """启动读取线程"""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(
+                target=self._run,
+                name="ChannelReader",
+                daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        """停止读取线程"""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+        self._wakeup()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    def watch(
+        self,
+        channel,
+        on_data: Callable[[str], None],
+        on_close: Optional[Callable[[], None]] = None,
+        encoding: Optional[str] = None
+    ) -> None:
+        """注册通道，收到数据时回调"""
+        with self._lock:
+            self._pending.append(('add', channel, on_data, on_close, encoding))
+        self.start()
+        self._wakeup()
+
+    def unwatch(self, channel, wait: bool = False) -> None:
+        """取消注册通道，wait 为 True 时等待读取线程不再读取该通道"""
+        done = threading.Event() if wait else None
+        with self._lock:
+            self._pending.append(('remove', channel, None, done.set if done else None, None))
+        self._wakeup()
+        if done and self._running and self._thread is not threading.current_thread():
+            done.wait(2)
+
+    def _wakeup(self) -> None:
+        try:
+            self._wakeup_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def _apply_pending(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, []
+
+        for action, channel, on_data, on_close, encoding in pending:
+            fd = channel.fileno()
+            if action == 'add':
+                if fd not in self._watched:
+                    self._selector.register(fd, selectors.EVENT_READ)
+                decoder = codecs.getincrementaldecoder(encoding or self.encoding)(errors='replace')
+                self._watched[fd] = (channel, on_data, on_close, decoder)
+                # 注册前已到达的数据也要处理
+                self._drain(fd)
+            else:
+                if fd in self._watched:
+                    self._selector.unregister(fd)
+                    self._watched.pop(fd, None)
+                if on_close:
+                    on_close()  # 注销已生效
+
+    def _drain(self, fd: int) -> None:
+        """读取通道中所有可用数据，通道关闭时注销"""
+        entry = self._watched.get(fd)
+        if not entry:
+            return
+        channel, on_data, on_close, decoder = entry
+
+        try:
+            while channel.recv_ready():
+                data = channel.recv(65535)
+                if not data:
+                    break
+                chunk = decoder.decode(data)
+                if chunk:
+                    on_data(chunk)
+        except Exception as e:
+            self.logger.error(f"读取通道数据失败: {str(e)}")
+
+        if channel.closed or (channel.eof_received and not channel.recv_ready()):
+            self._selector.unregister(fd)
+            self._watched.pop(fd, None)
+            rest = decoder.decode(b'', final=True)
+            if rest:
+                on_data(rest)
+            if on_close:
+                try:
+                    on_close()
+                except Exception as e:
+                    self.logger.error(f"通道关闭回调失败: {str(e)}")
+
+    def _run(self) -> None:
+        while self._running:
+            self._apply_pending()
+            for key, _ in self._selector.select():
+                if key.fileobj is self._wakeup_r:
+                    try:
+                        while self._wakeup_r.recv(1024):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                    continue
+                self._drain(key.fd)
+
+
+_default_reader = None
+_default_reader_lock = threading.Lock()
+
+
+def get_channel_reader() -> ChannelReader:
+    """获取进程内共享的通道读取器"""
+    global _default_reader
+    with _default_reader_lock:
+        if _default_reader is None:
+            _default_reader = ChannelReader()
+        return _default_reader
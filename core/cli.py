@@ -0,0 +1,341 @@
+"""命令行批量执行入口，不依赖Qt，可用于计划任务和CI
+
+    python -m core run -i devices.txt -f commands.txt -o results.jsonl
+    python -m core run -i devices.json -t template.txt --canary 2 --wave-size 0.2
+    python -m core scan -n 192.168.1.0/24
+    python -m core upload -i devices.txt --local vrp.cc --remote /
+    python -m core --metrics-file nettool.prom run -i devices.txt -c "display version"
+
+设备清单支持界面导出的 ip,username,password,port 文本、带表头的CSV和JSON；
+结果以每台设备一行JSON输出到标准输出，日志输出到标准错误。
+"""
+import argparse
+import csv
+import getpass
+import json
+import logging
+import os
+import signal
+import sys
+from typing import Dict, List, Optional
+
+PASSWORD_ENV = 'NETTOOL_PASSWORD'
+
+
+def load_inventory(path: str, username: Optional[str] = None, password: Optional[str] = None,
+                   port: int = 22) -> List[Dict]:
+    """读取设备清单，缺少的用户名、密码和端口使用默认值"""
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        text = f.read()
+
+    if path.endswith('.json'):
+        data = json.loads(text)
+        devices = data.get('devices', []) if isinstance(data, dict) else data
+    else:
+        lines = [line for line in text.splitlines() if line.strip() and not line.lstrip().startswith('#')]
+        if lines and lines[0].split(',')[0].strip().lower() == 'ip':
+            devices = [{k.strip(): (v or '').strip() for k, v in row.items() if k}
+                       for row in csv.DictReader(lines)]
+        else:
+            # 与界面导入导出相同的格式: ip,username,password,port[,driver]
+            fields = ('ip', 'username', 'password', 'port', 'driver')
+            devices = [dict(zip(fields, (part.strip() for part in line.split(',')))) for line in lines]
+
+    inventory = []
+    for device in devices:
+        device = {key: value for key, value in device.items() if value not in ('', None)}
+        device.setdefault('username', username)
+        if password:
+            device.setdefault('password', password)
+        device['port'] = int(device.get('port', port))
+        inventory.append(device)
+    return inventory
+
+
+def read_commands(paths: List[str]) -> List[str]:
+    """读取命令文件，每行一条命令"""
+    commands = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            commands.extend(line.rstrip('\r\n') for line in f)
+    return [cmd for cmd in commands if cmd.strip()]
+
+
+def build_command_map(devices: List[Dict], commands: List[str], template: Optional[str]) -> Dict[str, List[str]]:
+    """生成每台设备的命令: 清单中的 commands 字段、公共命令、按设备字段渲染的模板"""
+    command_map = {}
+    for device in devices:
+        device_commands = list(device.get('commands', [])) + commands
+        if template:
+            try:
+                rendered = template.format_map(device)
+            except KeyError as e:
+                raise ValueError(f"设备 {device['ip']} 缺少模板变量 {e}")
+            device_commands += [line for line in rendered.splitlines() if line.strip()]
+        command_map[device['ip']] = device_commands
+    return command_map
+
+
+def _json_default(value):
+    # networkx 布局坐标为 numpy 数组
+    return value.tolist() if hasattr(value, 'tolist') else str(value)
+
+
+def _emit(record: Dict) -> None:
+    sys.stdout.write(json.dumps(record, ensure_ascii=False, default=_json_default) + '\n')
+    sys.stdout.flush()
+
+
+def _resolve_credentials(args, devices: List[Dict]) -> None:
+    """补全清单中缺少的密码，交互终端下可提示输入"""
+    missing = [device['ip'] for device in devices if not device.get('username')]
+    if missing:
+        raise ValueError(f"设备 {', '.join(missing[:5])} 缺少用户名，请使用 --username")
+    if all(device.get('password') for device in devices):
+        return
+    password = args.password or os.environ.get(PASSWORD_ENV)
+    if not password and sys.stdin.isatty():
+        password = getpass.getpass("设备密码: ")
+    if not password:
+        raise ValueError(f"设备清单缺少密码，请使用 --password 或环境变量 {PASSWORD_ENV}")
+    for device in devices:
+        if not device.get('password'):
+            device['password'] = password
+
+
+def cmd_run(args) -> int:
+    """批量执行命令"""
+    devices = load_inventory(args.inventory, args.username, None, args.port)
+    _resolve_credentials(args, devices)
+    template = None
+    if args.template:
+        with open(args.template, 'r', encoding='utf-8') as f:
+            template = f.read()
+    command_map = build_command_map(devices, list(args.command or []) + read_commands(args.commands or []), template)
+    if not any(command_map.values()):
+        raise ValueError("没有要执行的命令，请使用 -c、-f 或 -t 指定")
+    if args.engine == 'async':
+        return _run_async(args, devices, command_map)
+
+    # 只在真正执行时导入SSH相关模块
+    from .command_executor import CommandExecutor
+    from .job_journal import JobJournal
+    from .result_sink import create_sink
+    from .rollout import device_failed
+
+    sink = create_sink(args.output) if args.output else None
+    executor = CommandExecutor(
+        max_threads=args.concurrency,
+        mode=args.mode,
+        pipeline=args.pipeline,
+        order=args.order,
+        adaptive_concurrency=not args.fixed_concurrency,
+        sink=sink,
+        journal=JobJournal(args.journal) if args.journal and not args.resume else None,
+        job_timeout=args.job_timeout
+    )
+    # Ctrl+C 时取消作业，正在执行的设备在1秒内结束，已完成的结果照常输出
+    signal.signal(signal.SIGINT, lambda *_: executor.cancel_all())
+    try:
+        if args.resume:
+            results = executor.resume(args.journal, devices, command_map, timeout=args.timeout)
+        elif args.canary or args.wave_size:
+            results = executor.rollout(
+                devices, command_map,
+                canary=args.canary,
+                wave_size=_parse_wave_size(args.wave_size),
+                max_failures=_parse_wave_size(args.max_failures) or 0,
+                timeout=args.timeout
+            )
+        else:
+            results = executor.batch_execute(devices, command_map, timeout=args.timeout)
+    finally:
+        if sink:
+            sink.close()
+        if executor.journal:
+            executor.journal.close()
+
+    for result in results.values():
+        _emit(result)
+    if executor.rollout_status.get('halted'):
+        logging.getLogger(__name__).warning(f"分批下发已停止: {executor.rollout_status}")
+    return 1 if any(device_failed(result) for result in results.values()) or len(results) < len(devices) else 0
+
+
+def _run_async(args, devices: List[Dict], command_map: Dict[str, List[str]]) -> int:
+    """使用异步引擎执行，适合大量设备的只读巡检"""
+    unsupported = [option for option, value in (
+        ('--journal', args.journal), ('--canary', args.canary), ('--wave-size', args.wave_size),
+        ('--pipeline', args.pipeline), ('--mode exec', args.mode == 'exec')
+    ) if value]
+    if unsupported:
+        raise ValueError(f"--engine async 不支持 {', '.join(unsupported)}")
+
+    from .async_executor import AsyncCommandExecutor
+    from .result_sink import create_sink
+    from .rollout import device_failed
+
+    sink = create_sink(args.output) if args.output else None
+    executor = AsyncCommandExecutor(
+        max_concurrency=args.concurrency or 200,
+        adaptive_concurrency=not args.fixed_concurrency,
+        job_timeout=args.job_timeout,
+        sink=sink
+    )
+    signal.signal(signal.SIGINT, lambda *_: executor.cancel_all())
+    try:
+        results = executor.batch_execute(devices, command_map, timeout=args.timeout)
+    finally:
+        if sink:
+            sink.close()
+
+    for result in results.values():
+        _emit(result)
+    return 1 if any(device_failed(result) for result in results.values()) or len(results) < len(devices) else 0
+
+
+def _parse_wave_size(value: Optional[str]):
+    """整数为台数，带小数点或百分号为比例"""
+    if not value:
+        return None
+    if value.endswith('%'):
+        return float(value[:-1]) / 100
+    return float(value) if '.' in value else int(value)
+
+
+def cmd_scan(args) -> int:
+    """扫描网段并输出拓扑"""
+    from .network_scanner import NetworkScanner
+
+    scanner = NetworkScanner(on_progress=lambda message: logging.getLogger(__name__).info(message))
+    topology = scanner.discover(args.network)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(topology, f, ensure_ascii=False, indent=2, default=_json_default)
+    else:
+        _emit(topology)
+    return 0
+
+
+def cmd_transfer(args) -> int:
+    """批量上传或下载文件"""
+    from concurrent.futures import ThreadPoolExecutor
+    from .concurrency import AIMDController, configured_max_threads
+    from .ftp_manager import FTPManager
+
+    devices = load_inventory(args.inventory, args.username, None, args.port)
+    _resolve_credentials(args, devices)
+    upload = args.action == 'upload'
+    # 与命令执行相同的自适应并发: 从一半起步，登录出现超时/拒绝时减半
+    max_workers = args.concurrency or configured_max_threads()
+    concurrency = AIMDController(initial=max(1, max_workers // 2), max_limit=max_workers, name="文件传输")
+
+    def transfer(device: Dict) -> Dict:
+        with concurrency.slot():
+            return transfer_one(device)
+
+    def transfer_one(device: Dict) -> Dict:
+        ftp = FTPManager(device['ip'], device['username'], device['password'], port=device['port'], device=device)
+        record = {'ip': device['ip'], 'action': args.action, 'local': args.local, 'remote': args.remote,
+                  'status': 'failed'}
+        connected = ftp.connect()
+        concurrency.record(ftp.last_error, ftp.connect_latency, key=device['ip'])
+        if not connected:
+            record['error'] = 'Connection failed'
+            return record
+        try:
+            if upload:
+                remote = args.remote
+                if remote.endswith('/'):
+                    remote += os.path.basename(args.local)
+                ok = ftp.upload_file(args.local, remote)
+            else:
+                local = args.local
+                if os.path.isdir(local) or local.endswith(os.sep):
+                    local = os.path.join(local, f"{device['ip']}_{os.path.basename(args.remote)}")
+                ok = ftp.download_file(args.remote, local)
+            record['status'] = 'success' if ok else 'failed'
+        finally:
+            ftp.close()
+        return record
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for record in pool.map(transfer, devices):
+            failed += record['status'] != 'success'
+            _emit(record)
+    return 1 if failed else 0
+
+
+def _add_inventory_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('-i', '--inventory', required=True, help="设备清单(.txt/.csv/.json)")
+    parser.add_argument('-u', '--username', help="清单中未指定时使用的用户名")
+    parser.add_argument('-p', '--password', help=f"清单中未指定时使用的密码，也可使用环境变量 {PASSWORD_ENV}")
+    parser.add_argument('--port', type=int, default=22, help="默认SSH端口")
+    parser.add_argument('-j', '--concurrency', type=int, help="最大并发设备数，默认读取 config.json")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m core', description="网络设备批量运维命令行工具")
+    parser.add_argument('-v', '--verbose', action='count', default=0, help="输出更多日志(-vv 为调试日志)")
+    parser.add_argument('--metrics-file', help="结束时将指标以Prometheus文本格式写入文件")
+    parser.add_argument('--metrics-port', type=int, help="执行期间在本机端口提供 /metrics")
+    subparsers = parser.add_subparsers(dest='action', required=True)
+
+    run = subparsers.add_parser('run', help="批量执行命令")
+    _add_inventory_options(run)
+    run.add_argument('-c', '--command', action='append', help="要执行的命令，可重复")
+    run.add_argument('-f', '--commands', action='append', help="命令文件，每行一条，可重复")
+    run.add_argument('-t', '--template', help="命令模板，{字段} 按清单中的设备字段替换")
+    run.add_argument('-o', '--output', help="结果输出: *.jsonl / *.db / 目录(每台设备一个gzip文件)")
+    run.add_argument('--mode', choices=('shell', 'exec'), default='shell', help="只读命令是否走exec通道")
+    run.add_argument('--pipeline', action='store_true', help="配置命令流水线下发")
+    run.add_argument('--order', choices=('input', 'longest_first'), default='input', help="设备执行顺序")
+    run.add_argument('--engine', choices=('threads', 'async'), default='threads',
+                     help="执行引擎: threads 线程池；async 单事件循环，适合数百台以上设备的只读命令")
+    run.add_argument('--fixed-concurrency', action='store_true', help="关闭自适应并发")
+    run.add_argument('--timeout', type=int, help="单条命令的等待上限(秒)，默认按历史耗时自适应")
+    run.add_argument('--job-timeout', type=float, help="整个作业的时限(秒)")
+    run.add_argument('--journal', help="作业日志文件，用于中断后恢复")
+    run.add_argument('--resume', action='store_true', help="根据 --journal 跳过已完成的设备继续执行")
+    run.add_argument('--canary', type=int, default=0, help="金丝雀设备数，先执行并检查")
+    run.add_argument('--wave-size', help="每批设备数，或比例如 0.2、20%%")
+    run.add_argument('--max-failures', help="每批允许的失败设备数或比例，超过则停止")
+    run.set_defaults(handler=cmd_run)
+
+    scan = subparsers.add_parser('scan', help="扫描网段发现设备和拓扑")
+    scan.add_argument('-n', '--network', action='append', help="网段(CIDR)，可重复，默认本机所在网段")
+    scan.add_argument('-o', '--output', help="拓扑JSON文件，默认输出到标准输出")
+    scan.set_defaults(handler=cmd_scan)
+
+    for action, description in (('upload', "上传文件到设备"), ('download', "从设备下载文件")):
+        transfer = subparsers.add_parser(action, help=description)
+        _add_inventory_options(transfer)
+        transfer.add_argument('--local', required=True, help="本地文件(下载时为保存路径或目录)")
+        transfer.add_argument('--remote', required=True, help="设备上的路径(上传时以 / 结尾表示目录)")
+        transfer.set_defaults(handler=cmd_transfer)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=(logging.WARNING, logging.INFO, logging.DEBUG)[min(args.verbose, 2)],
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        stream=sys.stderr
+    )
+    if getattr(args, 'resume', False) and not args.journal:
+        parser.error("--resume 需要同时指定 --journal")
+    from .metrics import export_metrics, start_metrics_server
+    start_metrics_server(args.metrics_port)
+    try:
+        return args.handler(args)
+    except (OSError, ValueError) as e:
+        logging.getLogger(__name__).error(str(e))
+        return 2
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        export_metrics(args.metrics_file)
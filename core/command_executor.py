@@ -1,33 +1,101 @@
 import threading
-from typing import List, Dict, Callable, Optional
+from typing import List, Dict, Callable, Optional, Union
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed, Future, wait
-from .ssh_manager import SSHManager
+from concurrent.futures import ThreadPoolExecutor, Future
+from functools import partial
+from collections import deque
+from .ssh_manager import SSHManager, has_command_error, is_read_only_command
+from .latency_store import LatencyStore, get_latency_store
+from .concurrency import AIMDController, configured_max_threads
+from .rate_limit import AdmissionController, get_admission_controller
+from .result_sink import ResultSink
+from .job_journal import JobJournal
+from .rollout import ConnectionPrewarmer, device_failed, plan_waves
+from .cancellation import CancelToken
+from .metrics import DEVICE_SECONDS, DEVICES_TOTAL, ERRORS_TOTAL, QUEUE_WAIT_SECONDS, export_metrics
 import time
 
 class CommandExecutor:
-    def __init__(self, max_threads: int = 5):
+    def __init__(self, max_threads: Optional[int] = None, mode: str = 'shell', output_limit: Optional[int] = None,
+                 pipeline: bool = False, latency_store: Optional[LatencyStore] = None,
+                 adaptive_timeout: bool = True, order: str = 'input',
+                 concurrency: Optional[AIMDController] = None, adaptive_concurrency: bool = True,
+                 admission: Optional[AdmissionController] = None, sink: Optional[ResultSink] = None,
+                 journal: Optional[JobJournal] = None, job_timeout: Optional[float] = None):
+        """
+        Args:
+            max_threads: 最大并发设备数，默认读取 config.json 的 settings.max_threads
+            mode: 'shell' 全部走交互式shell；'exec' 只读命令走exec通道，
+                  含配置命令的设备仍使用交互式shell
+            output_limit: 结果中每条命令保留的最大字符数，流式显示时用于限制内存
+            pipeline: 交互式shell中按批一次写入多条命令，再按提示符切分输出，
+                      适合较长的配置块
+            latency_store: 命令耗时存储，默认使用进程内共享的存储
+            adaptive_timeout: 按设备和驱动的历史耗时(p99 × 余量)计算命令超时
+            order: 'input' 按输入顺序执行；'longest_first' 按历史耗时从长到短执行，
+                   慢设备先开始，快设备填补空闲，缩短整体完成时间
+            concurrency: 共享的并发控制器，默认每个执行器单独创建
+            adaptive_concurrency: 根据连接耗时和错误自适应调整并发(AIMD)，
+                                  关闭时固定使用 max_threads
+            admission: 按站点/AAA服务器/网段的限流控制，默认使用 config.json 中的规则
+            sink: 结果输出目标，设置后每台设备完成即写入完整结果，
+                  results 中只保留摘要，完整结果通过 sink.reader() 按需读取
+            journal: 作业日志，记录每台设备和每条命令的完成情况，用于 resume()
+            job_timeout: 每次批量执行的总时限(秒)，超过后未开始的设备不再执行，
+                         正在连接或读取的设备在1秒内中止
+        """
         self.logger = logging.getLogger(__name__)
         self.results = {}
         self._lock = threading.Lock()
-        self.max_threads = max_threads
-        self.progress_callback = None
-        self.executor = ThreadPoolExecutor(
-            max_workers=max_threads,
-            thread_name_prefix="CmdExec"
+        self.max_threads = max_threads or configured_max_threads()
+        self.concurrency = concurrency or AIMDController(
+            initial=max(1, self.max_threads // 2) if adaptive_concurrency else self.max_threads,
+            max_limit=self.max_threads,
+            min_limit=1 if adaptive_concurrency else self.max_threads,
+            name="命令执行"
         )
+        self.mode = mode
+        self.output_limit = output_limit
+        self.pipeline = pipeline
+        self.latency_store = (latency_store or get_latency_store()) if adaptive_timeout else None
+        self.order = order
+        self.admission = admission or get_admission_controller()
+        self.sink = sink
+        self.journal = journal
+        self._resume_offsets: Optional[Dict[str, int]] = None  # 恢复执行时每台设备跳过的命令数
+        self.rollout_status: Dict = {}  # 最近一次分批下发的批次和检查结果
+        self._batch_start: Optional[float] = None  # 本次批量执行的开始时间，用于统计总耗时
+        self._rollout_token: Optional[CancelToken] = None  # 分批下发期间的总令牌，各批次令牌为其子令牌
+        self._prewarmer: Optional[ConnectionPrewarmer] = None  # 为当前批次预热传输的预热器
+        self._on_wave_admitted: Optional[Callable[[], None]] = None  # 本批设备全部通过限流后开始预热下一批
+        self._admission_pending = 0
+        self.job_timeout = job_timeout
+        self.cancel_token = CancelToken(job_timeout)  # 传入连接、读取和等待，cancel_all 时触发
+        self.progress_callback = None
+        self.event_callback = None
         self.futures: List[Future] = []
         self.is_running = False
-        self._task_queue = []  # 任务队列
+        self._task_queue = deque()  # 任务队列
         self._active_tasks = set()  # 活动任务集合
+        self._sched_lock = threading.RLock()  # 调度状态锁，完成回调可能在提交线程中同步执行
+        self._all_done = threading.Event()
 
     def set_progress_callback(self, callback: Callable[[int, int], None]) -> None:
         """设置进度回调函数"""
         self.progress_callback = callback
 
+    def set_event_callback(self, callback: Callable[[Dict], None]) -> None:
+        """设置执行事件回调
+
+        事件为字典，type 依次为 device_start、command_start、output、
+        command_end、device_end，可在命令执行过程中实时获取输出。
+        """
+        self.event_callback = callback
+
     def add_task(self, device: Dict, commands: List[str]) -> None:
         """添加任务到队列"""
-        self._task_queue.append((device, commands))
+        with self._sched_lock:
+            self._task_queue.append((device, commands))
 
     def execute_device_commands(
         self,
@@ -36,9 +104,16 @@ class CommandExecutor:
         password: str,
         commands: List[str],
         port: int = 22,
-        timeout: Optional[int] = None
+        timeout: Optional[int] = None,
+        driver: Optional[str] = None,
+        device: Optional[Dict] = None
     ) -> Dict:
-        """为单个设备执行命令"""
+        """为单个设备执行命令
+
+        Args:
+            driver: 厂商驱动名称(huawei/h3c/cisco)，None 时自动识别
+            device: 设备字典，用于按站点、AAA服务器等属性限流
+        """
         result = {
             'ip': ip,
             'status': 'failed',
@@ -46,21 +121,58 @@ class CommandExecutor:
             'error': None,
             'start_time': time.time()
         }
+        self._emit_event({'type': 'device_start', 'ip': ip})
+        skipped = (self._resume_offsets or {}).get(ip, 0)
+        if self.journal:
+            self.journal.device_start(ip, skipped)
+        ssh = None
+        ticket = None
 
         try:
+            # 等待站点/AAA服务器/网段的限流放行，已预热的设备接手预热时占用的名额
+            admit_start = time.monotonic()
+            prewarmer = self._prewarmer
+            ticket = prewarmer.take_ticket(ip) if prewarmer else None
+            try:
+                if ticket is None:
+                    ticket = self.admission.acquire(device or {'ip': ip}, cancel=self.cancel_token)
+            finally:
+                self._admission_done()
+            result['queue_wait'] = time.monotonic() - admit_start
+            QUEUE_WAIT_SECONDS.observe(result['queue_wait'], stage='admission')
+
             # 获取或创建SSH连接
-            ssh = SSHManager(ip, username, password, port=port)
-            if ssh.connect():
-                # 分批执行命令以避免长时间阻塞
-                batch_size = 5
-                for i in range(0, len(commands), batch_size):
-                    batch_commands = commands[i:i + batch_size]
-                    command_results = ssh.execute_commands(batch_commands)
-                    result['commands'].update(command_results)
-                    
-                    # 检查是否需要取消执行
-                    if not self.is_running:
-                        break
+            ssh = SSHManager(ip, username, password, port=port, driver=driver, cancel=self.cancel_token)
+            ssh.latency_store = self.latency_store
+            use_exec = self._use_exec(commands)
+            connected = ssh.connect(interactive=not use_exec)
+            # 连接耗时和失败原因反馈给并发控制器
+            self.concurrency.record(ssh.last_error, ssh.connect_latency, key=ip)
+            if connected:
+                if use_exec and not self._execute_via_exec(ssh, commands, timeout, result):
+                    # 设备不支持exec通道时回退到交互式shell
+                    ssh.close()
+                    use_exec = False
+                    if not ssh.connect():
+                        raise Exception('Connection failed')
+
+                if not use_exec and self.pipeline:
+                    result['commands'].update(
+                        ssh.execute_pipelined(commands, on_event=self._command_event_handler(), wait_time=timeout)
+                    )
+                elif not use_exec:
+                    # 分批执行命令以避免长时间阻塞
+                    batch_size = 5
+                    for i in range(0, len(commands), batch_size):
+                        batch_commands = commands[i:i + batch_size]
+                        command_results = ssh.execute_commands(
+                            batch_commands, on_event=self._command_event_handler(), wait_time=timeout
+                        )
+                        result['commands'].update(command_results)
+                        
+                        # 检查是否需要取消执行
+                        if not self.is_running:
+                            break
                 
                 result['status'] = 'success'
                 self.logger.info(f"设备 {ip} 命令执行完成")
@@ -72,8 +184,34 @@ class CommandExecutor:
             result['error'] = str(e)
             self.logger.error(f"设备 {ip} 执行出错: {str(e)}")
         finally:
-            ssh.close()
+            if ssh:
+                ssh.close()
+            if ticket:
+                ticket.release()
             result['end_time'] = time.time()
+            self._record_metrics(ssh, result)
+            if self.latency_store:
+                self.latency_store.record_device(ip, result['end_time'] - result['start_time'])
+            if self.journal:
+                self.journal.device_end(ip, result['status'],
+                                        expected=skipped + sum(1 for cmd in commands if cmd.strip()))
+            if self.output_limit:
+                result['commands'] = {
+                    cmd: self._limit_output(output) for cmd, output in result['commands'].items()
+                }
+            self._emit_event({
+                'type': 'device_end',
+                'ip': ip,
+                'status': result['status'],
+                'error': result['error'],
+                'elapsed': result['end_time'] - result['start_time']
+            })
+
+        if self.sink:
+            try:
+                result = self.sink.write(result)
+            except Exception as e:
+                self.logger.error(f"设备 {ip} 结果写入失败: {str(e)}")
 
         with self._lock:
             self.results[ip] = result
@@ -84,6 +222,72 @@ class CommandExecutor:
 
         return result
 
+    def _admission_done(self) -> None:
+        """分批下发时本批设备都已通过限流，此后空闲的名额才用于预热下一批"""
+        with self._lock:
+            if self._on_wave_admitted is None:
+                return
+            self._admission_pending -= 1
+            if self._admission_pending > 0:
+                return
+            callback, self._on_wave_admitted = self._on_wave_admitted, None
+        callback()
+
+    def _record_metrics(self, ssh: Optional[SSHManager], result: Dict) -> None:
+        """记录设备耗时和按厂商的错误"""
+        vendor = ssh.driver.name if ssh else 'unknown'
+        DEVICES_TOTAL.inc(status=result['status'])
+        DEVICE_SECONDS.observe(result['end_time'] - result['start_time'], status=result['status'])
+        if result['status'] != 'success':
+            ERRORS_TOTAL.inc(vendor=vendor, kind=(ssh and ssh.last_error) or 'execution')
+        errors = sum(1 for output in result['commands'].values() if has_command_error(output))
+        if errors:
+            ERRORS_TOTAL.inc(errors, vendor=vendor, kind='command')
+
+    def _emit_event(self, event: Dict) -> None:
+        """发送执行事件，回调异常不影响命令执行"""
+        if self.event_callback:
+            try:
+                self.event_callback(event)
+            except Exception as e:
+                self.logger.error(f"事件回调失败: {str(e)}")
+
+    def _command_event_handler(self) -> Optional[Callable[[Dict], None]]:
+        """命令级事件回调: 记录作业日志并转发给事件回调"""
+        if not self.journal:
+            return self.event_callback
+
+        def handler(event: Dict) -> None:
+            if event['type'] == 'command_end':
+                self.journal.command_done(event['ip'], event['command'])
+            if self.event_callback:
+                self.event_callback(event)
+
+        return handler
+
+    def _limit_output(self, output: str) -> str:
+        """只保留输出末尾 output_limit 个字符"""
+        if len(output) <= self.output_limit:
+            return output
+        return f"...(已截断 {len(output) - self.output_limit} 个字符)\n" + output[-self.output_limit:]
+
+    def _use_exec(self, commands: List[str]) -> bool:
+        """只读命令集合在exec模式下走exec通道"""
+        return self.mode == 'exec' and all(is_read_only_command(cmd) for cmd in commands if cmd.strip())
+
+    def _execute_via_exec(self, ssh: SSHManager, commands: List[str],
+                          timeout: Optional[int], result: Dict) -> bool:
+        """通过exec通道并发执行只读命令，失败返回False"""
+        try:
+            result['commands'].update(
+                ssh.exec_commands(commands, wait_time=timeout, on_event=self._command_event_handler())
+            )
+            return True
+        except Exception as e:
+            self.logger.warning(f"设备 {ssh.ip} exec通道执行失败，回退到交互式shell: {str(e)}")
+            result['commands'].clear()
+            return False
+
     def batch_execute(
         self,
         devices: List[Dict],
@@ -95,6 +299,11 @@ class CommandExecutor:
             raise RuntimeError("已有命令正在执行")
 
         self.is_running = True
+        if self._rollout_token:
+            self.cancel_token = CancelToken(parent=self._rollout_token)
+        else:
+            self.cancel_token = CancelToken(self.job_timeout)
+        self._batch_start = time.time()
         self.results.clear()
         self.pending_devices = devices
         self.futures.clear()
@@ -102,63 +311,227 @@ class CommandExecutor:
         self._active_tasks.clear()
 
         try:
+            if self.journal and self._resume_offsets is None:
+                self.journal.start_job(devices, command_map)
+
             # 将所有任务添加到队列
-            for device in devices:
+            for device in self.order_devices(devices):
                 ip = device['ip']
                 commands = command_map.get(ip, [])
                 if commands:
                     self.add_task(device, commands)
 
-            # 创建任务执行器
+            # 任务完成时在回调中提交下一个任务，调度线程只等待全部完成，空闲时不占用CPU
             with ThreadPoolExecutor(max_workers=self.max_threads) as executor:
-                while self._task_queue or self._active_tasks:
-                    # 检查是否需要取消执行
-                    if not self.is_running:
-                        break
-                        
-                    # 提交新任务
-                    while len(self._active_tasks) < self.max_threads and self._task_queue:
-                        device, commands = self._task_queue.pop(0)
-                        future = executor.submit(
-                            self.execute_device_commands,
-                            device['ip'],
-                            device['username'],
-                            device['password'],
-                            commands,
-                            device.get('port', 22),
-                            timeout
-                        )
-                        self._active_tasks.add(future)
-                    
-                    # 处理完成的任务
-                    done, _ = wait(self._active_tasks, timeout=0.1)
-                    for future in done:
-                        try:
-                            result = future.result()
-                            self.results[result['ip']] = result
-                        except Exception as e:
-                            self.logger.error(f"任务执行失败: {str(e)}")
-                        finally:
-                            self._active_tasks.remove(future)
+                self._all_done.clear()
+                with self._sched_lock:
+                    self._submit_pending(executor, timeout)
+                self._all_done.wait()
 
         except Exception as e:
             self.logger.error(f"批量执行过程中发生错误: {str(e)}")
         finally:
             self.is_running = False
+            if self.latency_store:
+                self.latency_store.save()
+            if self.sink:
+                self.sink.flush()
             self._print_statistics()
-            # 清理连接池
-            SSHManager.clear_connection_pool()
+            self.admission.log_stats()
+            export_metrics()
 
         return self.results
 
+    def resume(
+        self,
+        journal_path: str,
+        devices: List[Dict],
+        command_map: Optional[Dict[str, List[str]]] = None,
+        timeout: Optional[int] = None
+    ) -> Dict:
+        """根据作业日志恢复执行
+
+        已成功的设备跳过；执行中断的设备从所在配置块的开头继续；
+        失败的设备整体重做。devices 提供登录信息(日志中不保存密码)，
+        command_map 省略时使用日志中记录的命令。返回结果包含全部设备，
+        上次已完成的设备标记 resumed，不含命令输出(已在上次写出)。
+        """
+        state = JobJournal.load(journal_path)
+        command_map = command_map or state.command_map
+        remaining = {}
+        offsets = {}
+        for device in devices:
+            commands = [cmd.strip() for cmd in command_map.get(device['ip'], []) if cmd.strip()]
+            rest = state.remaining_commands(device['ip'], commands)
+            if rest:
+                remaining[device['ip']] = rest
+                offsets[device['ip']] = len(commands) - len(rest)
+
+        self.logger.info(
+            f"恢复作业: 跳过已完成设备 {sum(1 for d in devices if d['ip'] not in remaining)} 台，"
+            f"继续执行 {len(remaining)} 台"
+        )
+        if not self.journal:
+            self.journal = JobJournal(journal_path)
+        self._resume_offsets = offsets
+        try:
+            results = self.batch_execute([d for d in devices if d['ip'] in remaining], remaining, timeout)
+        finally:
+            self._resume_offsets = None
+        for device in devices:
+            if device['ip'] not in remaining:
+                results[device['ip']] = {
+                    'ip': device['ip'], 'status': 'success', 'commands': {}, 'error': None, 'resumed': True
+                }
+        return results
+
+    def rollout(
+        self,
+        devices: List[Dict],
+        command_map: Dict[str, List[str]],
+        canary: int = 1,
+        wave_size: Union[int, float, None] = None,
+        max_failures: Union[int, float] = 0,
+        timeout: Optional[int] = None,
+        prewarm: bool = True
+    ) -> Dict:
+        """分批下发命令: 先执行金丝雀设备，再按批次执行其余设备
+
+        每批结束后检查设备状态和命令输出中的错误信息('error'、'failed'、'invalid')，
+        失败设备超过 max_failures(整数为台数，小数为本批比例)时停止后续批次。
+        prewarm 为 True 时在当前批次执行期间为下一批建立SSH传输。
+
+        Args:
+            canary: 金丝雀设备数
+            wave_size: 每批设备数或占总数的比例，见 plan_waves
+        """
+        devices = [device for device in devices if command_map.get(device['ip'])]
+        waves = plan_waves(devices, canary, wave_size)
+        all_results = {}
+        self.rollout_status = {'waves': len(waves), 'completed_waves': 0, 'halted': False, 'failed_devices': []}
+        prewarmer = None
+        # 整个下发共用一个令牌和作业时限，批次之间的取消同样生效
+        rollout_token = self._rollout_token = CancelToken(self.job_timeout)
+
+        try:
+            for index, wave in enumerate(waves):
+                if rollout_token.cancelled:
+                    self.rollout_status['halted'] = True
+                    self.logger.warning(f"分批下发已取消({rollout_token.reason})，停止后续 {len(waves) - index} 批")
+                    break
+                next_prewarmer = None
+                if prewarm and index + 1 < len(waves):
+                    # 只预热下一批最先开始的设备，避免占用过多会话；
+                    # 本批设备都通过限流后再开始，预热不会占用本批需要的名额
+                    next_prewarmer = ConnectionPrewarmer(cancel=rollout_token, admission=self.admission)
+                    next_devices = waves[index + 1][:max(1, self.concurrency.limit)]
+                    with self._lock:
+                        self._admission_pending = len(wave)
+                        self._on_wave_admitted = partial(next_prewarmer.start, next_devices)
+
+                self.logger.info(f"开始第 {index + 1}/{len(waves)} 批: {len(wave)} 台设备")
+                self._emit_event({'type': 'wave_start', 'wave': index + 1, 'waves': len(waves), 'devices': len(wave)})
+                self._prewarmer = prewarmer
+                try:
+                    self.batch_execute(wave, command_map, timeout)
+                finally:
+                    self._prewarmer = None
+                    with self._lock:
+                        self._on_wave_admitted = None
+                all_results.update(self.results)
+
+                if prewarmer:
+                    prewarmer.release()
+                prewarmer = next_prewarmer
+
+                failed = [result['ip'] for result in self.results.values() if device_failed(result)]
+                limit = max_failures * len(wave) if isinstance(max_failures, float) else max_failures
+                passed = len(failed) <= limit and len(self.results) == len(wave)
+                self.rollout_status['failed_devices'].extend(failed)
+                self._emit_event({'type': 'wave_end', 'wave': index + 1, 'passed': passed, 'failed': failed})
+                if not passed:
+                    self.rollout_status['halted'] = True
+                    self.logger.warning(
+                        f"第 {index + 1} 批未通过检查(失败 {len(failed)} 台)，停止后续 {len(waves) - index - 1} 批"
+                    )
+                    break
+                self.rollout_status['completed_waves'] = index + 1
+        finally:
+            if prewarmer:
+                prewarmer.release()
+            self._rollout_token = None
+            self.results = all_results
+
+        return self.results
+
+    def order_devices(self, devices: List[Dict]) -> List[Dict]:
+        """按调度策略排列设备"""
+        if self.order != 'longest_first' or not self.latency_store:
+            return list(devices)
+        durations = {device['ip']: self.latency_store.device_duration(device['ip']) for device in devices}
+        known = sorted(d for d in durations.values() if d is not None)
+        # 没有记录的设备按已知设备的中位数估计
+        default = known[len(known) // 2] if known else 0.0
+        return sorted(
+            devices,
+            key=lambda device: durations[device['ip']] if durations[device['ip']] is not None else default,
+            reverse=True
+        )
+
+    def _submit_pending(self, executor: ThreadPoolExecutor, timeout: Optional[int]) -> None:
+        """在并发上限内提交排队的任务，调用方持有 _sched_lock"""
+        accepting = self.is_running and not self.cancel_token.cancelled
+        while accepting and self._task_queue and len(self._active_tasks) < self.concurrency.limit:
+            device, commands = self._task_queue.popleft()
+            future = executor.submit(
+                self.execute_device_commands,
+                device['ip'],
+                device['username'],
+                device['password'],
+                commands,
+                device.get('port', 22),
+                timeout,
+                device.get('driver'),
+                device
+            )
+            self._active_tasks.add(future)
+            future.add_done_callback(
+                lambda done, executor=executor: self._on_task_done(done, executor, timeout)
+            )
+
+        if not self._active_tasks and (not self._task_queue or not accepting):
+            self._all_done.set()
+
+    def _on_task_done(self, future: Future, executor: ThreadPoolExecutor, timeout: Optional[int]) -> None:
+        """任务完成回调: 记录异常并补充新任务"""
+        if not future.cancelled() and future.exception():
+            self.logger.error(f"任务执行失败: {str(future.exception())}")
+        with self._sched_lock:
+            self._active_tasks.discard(future)
+            self._submit_pending(executor, timeout)
+
+    def get_latency_stats(self, ip: Optional[str] = None) -> Dict:
+        """查看学习到的命令耗时和超时"""
+        return self.latency_store.get_stats(ip) if self.latency_store else {}
+
+    def reset_latency_stats(self, ip: Optional[str] = None, driver: Optional[str] = None) -> None:
+        """清除学习到的命令耗时"""
+        if self.latency_store:
+            self.latency_store.reset(ip, driver)
+
     def cancel_all(self) -> None:
-        """取消所有正在执行的任务"""
+        """取消所有正在执行的任务，阻塞中的连接和读取在1秒内中止"""
+        if self._rollout_token:
+            self._rollout_token.cancel()
+        self.cancel_token.cancel()
         if self.is_running:
             self.is_running = False
-            self._task_queue.clear()
-            for future in self._active_tasks:
-                future.cancel()
-            self._active_tasks.clear()
+            with self._sched_lock:
+                self._task_queue.clear()
+                for future in list(self._active_tasks):
+                    future.cancel()
+                if not self._active_tasks:
+                    self._all_done.set()
             self.logger.info("已取消所有正在执行的任务")
 
     def _print_statistics(self) -> None:
@@ -167,18 +540,29 @@ class CommandExecutor:
         success = sum(1 for r in self.results.values() if r['status'] == 'success')
         failed = total - success
         
-        # 计算总执行时间
-        total_time = sum(
+        # 设备并发执行，总耗时按批次的实际时间计算，单台耗时之和只用于平均值
+        durations = sorted(
             r.get('end_time', 0) - r.get('start_time', 0)
             for r in self.results.values()
         )
-        avg_time = total_time / total if total > 0 else 0
-        
+        ends = [r['end_time'] for r in self.results.values() if r.get('end_time')]
+        batch_start = self._batch_start or min(
+            (r['start_time'] for r in self.results.values() if r.get('start_time')), default=0
+        )
+        wall_time = max(ends) - batch_start if ends and batch_start else 0
+        avg_time = sum(durations) / total if total > 0 else 0
+
         self.logger.info("执行统计:")
         self.logger.info(f"总计设备: {total}")
         self.logger.info(f"成功: {success}")
         self.logger.info(f"失败: {failed}")
-        self.logger.info(f"平均执行时间: {avg_time:.2f}秒")
+        self.logger.info(f"总耗时: {wall_time:.2f}秒")
+        if durations:
+            p50 = durations[(len(durations) - 1) // 2]
+            p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+            self.logger.info(f"单台设备耗时: 平均 {avg_time:.2f}秒，p50 {p50:.2f}秒，p95 {p95:.2f}秒，最长 {durations[-1]:.2f}秒")
+        if wall_time > 0:
+            self.logger.info(f"吞吐: {total / wall_time:.2f} 台/秒")
         
         if failed > 0:
             self.logger.info("失败设备列表:")
@@ -0,0 +1,197 @@
+import errno
+import socket
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+from paramiko.ssh_exception import AuthenticationException, SSHException
+
+# 表示管理网络或AAA拥塞的错误类型，多台设备同时出现时并发减半
+CONGESTION_ERRORS = ('timeout', 'auth', 'reset')
+
+# 设备自身的错误，不影响并发: credentials 为用户名或密码错误
+DEVICE_ERRORS = ('credentials', 'other')
+
+
+def classify_error(error) -> Optional[str]:
+    """把异常或错误信息归类为 timeout / auth / credentials / reset / other，无错误返回 None
+
+    auth 为认证超时等AAA限流的表现，credentials 为用户名或密码被拒绝。
+    """
+    if error is None:
+        return None
+    if isinstance(error, AuthenticationException):
+        message = str(error).lower()
+        return 'auth' if 'timeout' in message or 'timed out' in message else 'credentials'
+    if isinstance(error, (socket.timeout, TimeoutError)):
+        return 'timeout'
+    if isinstance(error, (ConnectionResetError, ConnectionAbortedError, BrokenPipeError, EOFError)):
+        return 'reset'
+    if isinstance(error, OSError) and error.errno in (errno.EMFILE, errno.ENFILE, errno.ENOBUFS):
+        return 'reset'  # 本机资源耗尽同样需要降低并发
+
+    message = str(error).lower()
+    if 'timed out' in message or 'timeout' in message or '超时' in message:
+        return 'timeout'
+    if 'authentication' in message or 'permission denied' in message or '认证' in message:
+        return 'credentials'
+    if ('reset' in message or 'banner' in message or 'eof' in message
+            or isinstance(error, SSHException) and 'closed' in message):
+        return 'reset'
+    return 'other'
+
+
+class AIMDController:
+    """加性增、乘性减的自适应并发控制
+
+    连接/认证耗时正常且没有拥塞错误时，每完成约 limit 个任务并发加 increase；
+    window 秒内至少 min_devices 台不同设备出现超时、认证限流或连接重置，
+    且占这段时间结果的 congestion_ratio 以上时，并发乘以 decrease，
+    cooldown 秒内只减一次。单台设备反复失败不会拉低整体并发。
+    耗时超过基线 latency_tolerance 倍时停止增加。
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        max_limit: int,
+        min_limit: int = 1,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_tolerance: float = 2.0,
+        cooldown: float = 2.0,
+        window: float = 10.0,
+        min_devices: int = 3,
+        congestion_ratio: float = 0.2,
+        name: str = ''
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        self.window = window
+        self.min_devices = max(1, min_devices)
+        self.congestion_ratio = congestion_ratio
+        self._recent = deque()  # 窗口内的结果: (时间, 设备, 是否拥塞)
+        self._anonymous = 0  # 未指明设备的结果各自算一台
+        self._limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self._in_flight = 0
+        self._baseline = None  # 连接耗时基线(慢速跟随的低值)
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self.stats = {'successes': 0, 'congestion': 0, 'errors': 0, 'decreases': 0}
+
+    @property
+    def limit(self) -> int:
+        """当前并发上限"""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """等待一个并发名额，超时返回False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self._in_flight += 1
+            return True
+
+    def release(self) -> None:
+        """归还并发名额"""
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self):
+        """占用一个并发名额的上下文"""
+        self.acquire()
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def record(self, error=None, latency: Optional[float] = None, key: Optional[str] = None) -> None:
+        """记录一次操作结果
+
+        Args:
+            error: 异常、错误信息或 classify_error 的分类，成功时为 None
+            latency: 连接/认证耗时(秒)
+            key: 设备标识(如IP)，用于区分拥塞是否来自多台设备
+        """
+        kind = error if error in CONGESTION_ERRORS + DEVICE_ERRORS else classify_error(error)
+        with self._cond:
+            congested = kind in CONGESTION_ERRORS
+            if key is None:
+                self._anonymous += 1
+                key = f"#{self._anonymous}"
+            now = time.monotonic()
+            self._recent.append((now, key, congested))
+            while self._recent and now - self._recent[0][0] > self.window:
+                self._recent.popleft()
+
+            if congested:
+                self.stats['congestion'] += 1
+                if now - self._last_decrease >= self.cooldown and self._congestion_widespread():
+                    self._last_decrease = now
+                    self._recent.clear()  # 下一次减半需要新的证据
+                    self._limit = max(self.min_limit, self._limit * self.decrease)
+                    self.stats['decreases'] += 1
+                    self.logger.info(f"{self.name} 多台设备出现{kind}，并发降为 {self.limit}")
+                return
+
+            if kind:
+                self.stats['errors'] += 1  # 设备自身的错误不影响并发
+                return
+
+            self.stats['successes'] += 1
+            if latency is not None:
+                if self._baseline is None or latency < self._baseline:
+                    self._baseline = latency
+                else:
+                    self._baseline += 0.05 * (latency - self._baseline)
+                if latency > self._baseline * self.latency_tolerance:
+                    return  # 耗时明显上升，暂停增加
+
+            if self._limit < self.max_limit:
+                previous = int(self._limit)
+                self._limit = min(self.max_limit, self._limit + self.increase / max(1.0, self._limit))
+                if int(self._limit) > previous:
+                    self._cond.notify_all()
+
+    def _congestion_widespread(self) -> bool:
+        """窗口内拥塞错误来自足够多的设备且比例超过阈值(调用方持有锁)"""
+        congested = [key for _, key, is_congested in self._recent if is_congested]
+        if len(set(congested)) < self.min_devices:
+            return False
+        return len(congested) >= self.congestion_ratio * len(self._recent)
+
+    def get_stats(self) -> dict:
+        """获取当前并发和统计"""
+        with self._cond:
+            stats = dict(self.stats)
+            stats.update({'limit': self.limit, 'in_flight': self._in_flight, 'baseline': self._baseline})
+        return stats
+
+
+def configured_max_threads(default: int = 10) -> int:
+    """读取 config.json 中 settings.max_threads，作为自适应并发的上限"""
+    try:
+        from .settings import get_settings
+        value = get_settings().get('max_threads', default)
+        return max(1, int(value))
+    except Exception:
+        return default
@@ -0,0 +1,276 @@
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+class PooledSession:
+    """连接池中的一个SSH会话"""
+
+    def __init__(self, key: str, host: str, ssh, shell):
+        self.key = key
+        self.host = host
+        self.ssh = ssh
+        self.shell = shell
+        self.created_at = time.time()
+        self.last_used = time.time()
+        self.last_probe = time.time()
+        self.in_use = False
+        self.probing = False
+
+    def is_alive(self) -> bool:
+        """不做网络交互的快速存活检查"""
+        try:
+            transport = self.ssh.get_transport() if self.ssh else None
+            return bool(transport and transport.is_active() and self.shell and not self.shell.closed)
+        except Exception:
+            return False
+
+    def close(self) -> None:
+        """关闭会话"""
+        for obj in (self.shell, self.ssh):
+            try:
+                if obj:
+                    obj.close()
+            except Exception:
+                pass
+        self.shell = None
+        self.ssh = None
+
+
+class SSHConnectionPool:
+    """SSH会话连接池
+
+    - checkout/checkin 语义，同一会话同一时间只给一个使用者
+    - 空闲会话按LRU顺序淘汰，超过空闲时间自动关闭
+    - 限制每台主机和总的会话数
+    - 后台保活探测在锁外进行
+    """
+
+    def __init__(
+        self,
+        max_per_host: int = 2,
+        max_total: int = 200,
+        idle_timeout: float = 300,
+        keepalive_interval: float = 60
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.max_per_host = max_per_host
+        self.max_total = max_total
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self._cond = threading.Condition()
+        self._idle: "OrderedDict[int, PooledSession]" = OrderedDict()  # 按最近使用排序
+        self._in_use: Dict[int, PooledSession] = {}
+        self._host_count: Dict[str, int] = {}  # 每台主机的会话数(含预留)
+        self._total = 0
+        self._keepalive_thread = None
+        self._closed = False
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'discards': 0}
+
+    def acquire(self, key: str, host: str, timeout: float = 30) -> Optional[PooledSession]:
+        """获取会话
+
+        命中时返回空闲会话；未命中时预留一个名额并返回 None，
+        调用方新建连接后调用 add() 登记，失败则调用 cancel()。
+        """
+        deadline = time.monotonic() + timeout
+        to_close = []
+        try:
+            with self._cond:
+                while True:
+                    session = self._take_idle(key)
+                    if session:
+                        self.stats['hits'] += 1
+                        return session
+
+                    if self._host_count.get(host, 0) >= self.max_per_host:
+                        # 同一主机的其他账号空闲会话让出名额
+                        victim = self._evict_lru(host)
+                        if victim:
+                            to_close.append(victim)
+
+                    if self._host_count.get(host, 0) < self.max_per_host:
+                        if self._total >= self.max_total:
+                            victim = self._evict_lru()
+                            if victim:
+                                to_close.append(victim)
+                        if self._total < self.max_total:
+                            self._host_count[host] = self._host_count.get(host, 0) + 1
+                            self._total += 1
+                            self.stats['misses'] += 1
+                            return None
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"等待连接池名额超时: {host}")
+                    self._cond.wait(remaining)
+        finally:
+            for session in to_close:
+                session.close()
+
+    def add(self, key: str, host: str, ssh, shell) -> PooledSession:
+        """登记新建的会话(占用 acquire 预留的名额)"""
+        session = PooledSession(key, host, ssh, shell)
+        session.in_use = True
+        with self._cond:
+            self._in_use[id(session)] = session
+        self._ensure_keepalive()
+        return session
+
+    def cancel(self, host: str) -> None:
+        """释放 acquire 预留但未使用的名额"""
+        with self._cond:
+            self._release_slot(host)
+            self._cond.notify_all()
+
+    def checkin(self, session: PooledSession) -> None:
+        """归还会话到池中"""
+        with self._cond:
+            self._in_use.pop(id(session), None)
+            session.in_use = False
+            session.last_used = time.time()
+            if self._closed:
+                self._release_slot(session.host)
+                closed = True
+            else:
+                self._idle[id(session)] = session
+                closed = False
+            self._cond.notify_all()
+        if closed:
+            session.close()
+
+    def discard(self, session: PooledSession) -> None:
+        """丢弃失效会话"""
+        with self._cond:
+            removed = self._in_use.pop(id(session), None) or self._idle.pop(id(session), None)
+            if removed:
+                self._release_slot(session.host)
+                self.stats['discards'] += 1
+            self._cond.notify_all()
+        session.close()
+
+    def clear(self) -> None:
+        """关闭所有空闲会话"""
+        with self._cond:
+            sessions = list(self._idle.values())
+            self._idle.clear()
+            for session in sessions:
+                self._release_slot(session.host)
+            self._cond.notify_all()
+        for session in sessions:
+            session.close()
+
+    def shutdown(self) -> None:
+        """关闭连接池"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.clear()
+
+    def get_stats(self) -> Dict:
+        """获取命中、未命中、淘汰等统计"""
+        with self._cond:
+            stats = dict(self.stats)
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = len(self._in_use)
+            stats['total'] = self._total
+        return stats
+
+    def _take_idle(self, key: str) -> Optional[PooledSession]:
+        """取出指定key最近使用的空闲会话，顺带清理已失效的会话"""
+        for sid in reversed(list(self._idle.keys())):
+            session = self._idle[sid]
+            if session.key != key or session.probing:
+                continue
+            del self._idle[sid]
+            if not session.is_alive():
+                self._release_slot(session.host)
+                self.stats['discards'] += 1
+                threading.Thread(target=session.close, daemon=True).start()
+                continue
+            session.in_use = True
+            self._in_use[sid] = session
+            return session
+        return None
+
+    def _evict_lru(self, host: Optional[str] = None) -> Optional[PooledSession]:
+        """淘汰最久未使用的空闲会话，可限定主机"""
+        for sid, session in self._idle.items():
+            if session.probing or (host and session.host != host):
+                continue
+            del self._idle[sid]
+            self._release_slot(session.host)
+            self.stats['evictions'] += 1
+            return session
+        return None
+
+    def _release_slot(self, host: str) -> None:
+        count = self._host_count.get(host, 0) - 1
+        if count > 0:
+            self._host_count[host] = count
+        else:
+            self._host_count.pop(host, None)
+        self._total = max(0, self._total - 1)
+
+    def _ensure_keepalive(self) -> None:
+        with self._cond:
+            if self._keepalive_thread and self._keepalive_thread.is_alive():
+                return
+            self._keepalive_thread = threading.Thread(
+                target=self._keepalive_loop,
+                name="SSHPoolKeepalive",
+                daemon=True
+            )
+            self._keepalive_thread.start()
+
+    def _keepalive_loop(self) -> None:
+        """定期淘汰超时空闲会话并探测其余空闲会话"""
+        interval = max(1.0, min(self.keepalive_interval, self.idle_timeout) / 2)
+        while True:
+            with self._cond:
+                self._cond.wait(interval)
+                if self._closed:
+                    return
+                now = time.time()
+                expired: List[PooledSession] = []
+                to_probe: List[PooledSession] = []
+                for sid, session in list(self._idle.items()):
+                    if session.probing:
+                        continue
+                    if now - session.last_used > self.idle_timeout:
+                        del self._idle[sid]
+                        self._release_slot(session.host)
+                        self.stats['evictions'] += 1
+                        expired.append(session)
+                    elif now - session.last_probe > self.keepalive_interval:
+                        session.probing = True
+                        to_probe.append(session)
+                if expired:
+                    self._cond.notify_all()
+
+            # 关闭和探测都在锁外进行
+            for session in expired:
+                self.logger.debug(f"关闭空闲超时的连接: {session.host}")
+                session.close()
+
+            for session in to_probe:
+                alive = session.is_alive()
+                if alive:
+                    try:
+                        session.ssh.get_transport().send_ignore()
+                    except Exception:
+                        alive = False
+                session.last_probe = time.time()
+                with self._cond:
+                    session.probing = False
+                    if not alive and self._idle.pop(id(session), None):
+                        self._release_slot(session.host)
+                        self.stats['discards'] += 1
+                    else:
+                        alive = True
+                    self._cond.notify_all()
+                if not alive:
+                    self.logger.info(f"连接保活失败，已移除: {session.host}")
+                    session.close()
@@ -0,0 +1,196 @@
+import re
+from typing import Dict, List, Optional, Pattern, Tuple, Type
+
+# 通用提示符: <HOST> / [HOST-视图] / [~HOST] / HOST> / HOST(config)# / user@host$
+GENERIC_PROMPT_PATTERN = r'(?:^|[\r\n])[^\r\n]{0,80}?[>#\]$]\s*$'
+
+# 分页提示: 华为/H3C "---- More ----"，思科 "--More--"
+PAGER_PATTERN = re.compile(r'-{2,} ?More ?-{2,}\s*$', re.IGNORECASE)
+
+# 分页残留: 分页提示及其后用于擦除的光标控制符/退格
+PAGER_ARTIFACT_PATTERN = re.compile(
+    r' *-{2,} ?More ?-{2,} *(?:(?:\x1b\[\d*[A-Za-z]|\x08)+ *)*',
+    re.IGNORECASE
+)
+
+
+def strip_pager_artifacts(output: str) -> str:
+    """去除输出中的分页提示残留"""
+    return PAGER_ARTIFACT_PATTERN.sub('', output)
+
+
+class VendorDriver:
+    """厂商驱动基类
+
+    描述一类设备的提示符语法、配置模式进出、分页、确认对话框和
+    每条命令的完成规则。命令以提示符返回为完成信号，超时只是上限。
+    """
+
+    name = 'generic'
+    banner_keywords: Tuple[str, ...] = ()  # SSH版本串/登录横幅中的识别关键字
+    config_enter_commands: Tuple[str, ...] = ()
+    config_exit_command = ''
+    paging_command: Optional[str] = None
+    rename_prefixes: Tuple[str, ...] = ('sysname ', 'hostname ')
+    confirm_commands: Tuple[str, ...] = ('save', 'reset', 'reboot', 'delete', 'format')
+    slow_commands: Tuple[str, ...] = ('save', 'reset', 'reboot')
+    # 设备拒绝命令时的输出
+    error_pattern = re.compile(r'(^|\n)\s*(Error|% ?Invalid|\^)', re.IGNORECASE)
+    # 确认对话框及应答
+    dialogs: List[Tuple[Pattern, str]] = [
+        (re.compile(r'(\[Y/N\]|\[YES/NO\]|CONTINUE\?)[:\s]*$', re.IGNORECASE), 'Y\n'),
+    ]
+
+    def prompt_pattern(self, hostname: str) -> str:
+        """生成只匹配缓冲区末尾的提示符正则"""
+        return r'(?:^|[\r\n])(?:' + self._prompt_body(re.escape(hostname)) + r')\s*$'
+
+    def prompt_line_pattern(self, hostname: str) -> str:
+        """匹配行首提示符(其后可跟回显的命令)，用于切分流水线输出"""
+        return r'(?m)^[ \t]*(?:' + self._prompt_body(re.escape(hostname)) + r')'
+
+    def _prompt_body(self, host: str) -> str:
+        return (
+            rf'<{host}(?:-[^<>\r\n]*)?>'
+            rf'|\[[~*]?{host}(?:-[^\[\]\r\n]*)?\]'
+            rf'|{host}(?:\([^()\r\n]*\))?[>#]'
+        )
+
+    def extract_hostname(self, prompt_line: str) -> Optional[str]:
+        """从提示符行中提取主机名"""
+        line = prompt_line.strip()
+        for pattern in (r'^<([^<>\s]+)>$', r'^\[[~*]?([^\[\]\s]+)\]$',
+                        r'^([^\s()<>\[\]#]+)(?:\([^()]*\))?[>#]$'):
+            match = re.match(pattern, line)
+            if match:
+                return match.group(1)
+        return None
+
+    def is_config_prompt(self, prompt_line: str) -> bool:
+        """提示符是否处于配置模式"""
+        return False
+
+    def enters_config(self, command: str) -> bool:
+        return command.strip().lower() in self.config_enter_commands
+
+    def renames_host(self, command: str) -> bool:
+        """修改主机名的命令会改变提示符"""
+        return command.strip().lower().startswith(self.rename_prefixes)
+
+    def needs_confirmation(self, command: str) -> bool:
+        """可能弹出确认对话框的命令，不能与后续命令一起流水线发送"""
+        return any(cmd in command.lower() for cmd in self.confirm_commands)
+
+    def command_timeout(self, command: str) -> int:
+        """等待提示符的上限(秒)"""
+        if self.enters_config(command):
+            return 5
+        if any(cmd in command.lower() for cmd in self.slow_commands):
+            return 30
+        return 10
+
+    def auto_responses(self) -> List[Tuple[Pattern, str]]:
+        """读取过程中的自动应答: 确认对话框和分页提示"""
+        return self.dialogs + [(PAGER_PATTERN, ' ')]
+
+    def rejected(self, output: str) -> bool:
+        """设备是否拒绝了命令"""
+        return bool(self.error_pattern.search(output))
+
+
+class HuaweiVRPDriver(VendorDriver):
+    """华为 VRP"""
+
+    name = 'huawei'
+    banner_keywords = ('huawei', 'vrp')
+    config_enter_commands = ('sy', 'sys', 'system-view')
+    config_exit_command = 'return'
+    paging_command = 'screen-length 0 temporary'
+    rename_prefixes = ('sysname ',)
+    error_pattern = re.compile(r'(^|\n)\s*(Error:|\^)', re.IGNORECASE)
+    dialogs = [
+        (re.compile(r'(\[Y/N\]|\[YES/NO\]|CONTINUE\?)[:\s]*$', re.IGNORECASE), 'Y\n'),
+        # 首次保存时询问配置文件名，使用默认值
+        (re.compile(r'file name.*\[[^\]]*\][:\s]*$', re.IGNORECASE), '\n'),
+    ]
+
+    def _prompt_body(self, host: str) -> str:
+        return rf'<{host}(?:-[^<>\r\n]*)?>|\[[~*]?{host}(?:-[^\[\]\r\n]*)?\]'
+
+    def is_config_prompt(self, prompt_line: str) -> bool:
+        return prompt_line.rstrip().endswith(']')
+
+
+class H3CComwareDriver(HuaweiVRPDriver):
+    """H3C Comware"""
+
+    name = 'h3c'
+    banner_keywords = ('h3c', 'comware')
+    config_enter_commands = ('sys', 'system-view')
+    paging_command = 'screen-length disable'
+    error_pattern = re.compile(r'(^|\n)\s*(% ?(Unrecognized|Incomplete|Too many|Wrong)|\^)', re.IGNORECASE)
+    dialogs = [
+        (re.compile(r'(\[Y/N\]|overwrite\?.*)[:\s]*$', re.IGNORECASE), 'Y\n'),
+        (re.compile(r'file name.*\[[^\]]*\][:\s]*$', re.IGNORECASE), '\n'),
+    ]
+
+
+class CiscoIOSDriver(VendorDriver):
+    """思科 IOS"""
+
+    name = 'cisco'
+    banner_keywords = ('cisco',)
+    config_enter_commands = ('conf t', 'config t', 'configure terminal')
+    config_exit_command = 'end'
+    paging_command = 'terminal length 0'
+    rename_prefixes = ('hostname ',)
+    confirm_commands = ('write', 'copy', 'reload', 'delete', 'erase', 'format')
+    slow_commands = ('write', 'copy', 'reload')
+    error_pattern = re.compile(r'(^|\n)\s*(% ?(Invalid|Incomplete|Ambiguous)|\^)', re.IGNORECASE)
+    dialogs = [
+        (re.compile(r'\[confirm\]\s*$', re.IGNORECASE), '\n'),
+        (re.compile(r'(\[yes/no\]|\[y/n\])[:\s]*$', re.IGNORECASE), 'y\n'),
+        # Destination filename [startup-config]?
+        (re.compile(r'filename \[[^\]]*\]\?\s*$', re.IGNORECASE), '\n'),
+    ]
+
+    def _prompt_body(self, host: str) -> str:
+        return rf'{host}(?:\([^()\r\n]*\))?[>#]'
+
+    def is_config_prompt(self, prompt_line: str) -> bool:
+        return bool(re.search(r'\(config[^()]*\)#$', prompt_line.rstrip()))
+
+
+DRIVERS: Dict[str, Type[VendorDriver]] = {}
+
+
+def register_driver(driver_class: Type[VendorDriver]) -> Type[VendorDriver]:
+    """注册厂商驱动，可用于扩展其他厂商"""
+    DRIVERS[driver_class.name] = driver_class
+    return driver_class
+
+
+for _driver in (VendorDriver, HuaweiVRPDriver, H3CComwareDriver, CiscoIOSDriver):
+    register_driver(_driver)
+
+
+def get_driver(name: Optional[str]) -> VendorDriver:
+    """按名称获取驱动，未知名称返回通用驱动"""
+    return DRIVERS.get((name or '').lower(), VendorDriver)()
+
+
+def detect_driver(banner: str = '', output: str = '') -> VendorDriver:
+    """根据SSH版本串/登录横幅识别厂商，无法识别时根据提示符形式判断"""
+    text = f"{banner}\n{output}".lower()
+    # 后注册的驱动更具体，优先匹配
+    for driver_class in reversed(list(DRIVERS.values())):
+        if any(keyword in text for keyword in driver_class.banner_keywords):
+            return driver_class()
+
+    lines = [line for line in output.replace('\r', '\n').split('\n') if line.strip()]
+    prompt_line = lines[-1].strip() if lines else ''
+    if re.match(r'^[<\[].*[>\]]$', prompt_line):
+        return HuaweiVRPDriver()
+    if re.match(r'^[^\s]+[>#]$', prompt_line):
+        return CiscoIOSDriver()
+    return VendorDriver()
@@ -7,6 +7,12 @@ from concurrent.futures import ThreadPoolExecutor
 import socket
 import time
 import stat
+from .transport_broker import get_transport_broker
+from .rate_limit import AdmissionController, get_admission_controller
+from .cancellation import CancelToken, CancelledError
+from .retry import CircuitOpenError, get_retry_manager
+from .concurrency import classify_error
+from .metrics import BYTES_TOTAL, ERRORS_TOTAL, QUEUE_WAIT_SECONDS, SESSION_SETUP_SECONDS
 
 class FTPManager:
     def __init__(
@@ -15,8 +21,17 @@ class FTPManager:
         username: str,
         password: str,
         timeout: int = 30,
-        port: int = 22  # 改为 SFTP 默认端口
+        port: int = 22,  # 改为 SFTP 默认端口
+        device: Optional[Dict] = None,
+        admission: Optional[AdmissionController] = None,
+        cancel: Optional[CancelToken] = None
     ):
+        """
+        Args:
+            device: 设备字典，用于按站点、AAA服务器等属性限流
+            admission: 限流控制，默认使用 config.json 中的规则
+            cancel: 取消令牌，取消时中止登录和正在进行的传输
+        """
         self.ip = ip
         self.username = username
         self.password = password
@@ -27,68 +42,98 @@ class FTPManager:
         self.logger = logging.getLogger(__name__)
         self._lock = threading.Lock()
         self.progress_callback = None
+        self.device = device or {'ip': ip}
+        self.admission = admission or get_admission_controller()
+        self._ticket = None  # 限流放行的会话，close() 时归还
+        self.cancel = cancel
+        self._unregister_cancel = None
+        self.last_error = None  # 最近一次连接失败的分类，与 SSHManager 一致
+        self.connect_latency = None  # 最近一次建立连接的耗时(秒)
 
     def set_progress_callback(self, callback: Callable[[str, int, int], None]) -> None:
         """设置进度回调函数"""
         self.progress_callback = callback
 
     def connect(self) -> bool:
-        """建立SFTP连接"""
-        retry_count = 3
-        for attempt in range(retry_count):
-            try:
-                self.ssh = paramiko.SSHClient()
-                self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                
-                self.logger.info(f"正在尝试连接设备 {self.ip} (尝试 {attempt + 1}/{retry_count})")
-                
-                self.ssh.connect(
-                    hostname=self.ip,
-                    port=self.port,
-                    username=self.username,
-                    password=self.password,
-                    timeout=self.timeout,
-                    allow_agent=False,
-                    look_for_keys=False
-                )
-
-                self.sftp = self.ssh.open_sftp()
-                self.sftp.get_channel().settimeout(self.timeout)
-                
-                self.logger.info(f"SFTP连接成功: {self.ip}")
-                return True
-                
-            except paramiko.AuthenticationException:
-                self.logger.error(f"SFTP认证失败 {self.ip}: 用户名或密码错误")
-                break
-                
-            except socket.timeout:
-                self.logger.error(f"SFTP连接超时 {self.ip}")
-                if attempt < retry_count - 1:
-                    continue
-                    
-            except Exception as e:
-                self.logger.error(f"SFTP连接失败 {self.ip}: {str(e)}")
-                if attempt < retry_count - 1:
-                    continue
-                    
-            finally:
-                if not self.sftp and self.ssh:
-                    self.close()
-                    
+        """建立SFTP连接，与SSH连接共用按设备的重试策略和熔断器"""
+        self.last_error = None
+        try:
+            # 登录前等待站点/AAA服务器/网段的限流放行，等待超时不计入设备熔断
+            if not self._ticket:
+                admit_start = time.monotonic()
+                self._ticket = self.admission.acquire(self.device, timeout=self.timeout * 10, cancel=self.cancel)
+                QUEUE_WAIT_SECONDS.observe(time.monotonic() - admit_start, stage='sftp_admission')
+            connect_start = time.monotonic()
+            get_retry_manager().call(f"{self.ip}:{self.port}", self._open_sftp, cancel=self.cancel)
+            self.connect_latency = time.monotonic() - connect_start
+            SESSION_SETUP_SECONDS.observe(self.connect_latency, protocol='sftp')
+            self.logger.info(f"SFTP连接成功: {self.ip}")
+            return True
+
+        except CancelledError as e:
+            self.logger.warning(f"SFTP连接 {self.ip} 已取消: {str(e)}")
+            self.last_error = 'cancelled'
+
+        except CircuitOpenError as e:
+            self.logger.warning(str(e))
+            self._record_error('circuit_open')
+
+        except paramiko.AuthenticationException as e:
+            self.logger.error(f"SFTP认证失败 {self.ip}: 用户名或密码错误")
+            self._record_error(classify_error(e))
+
+        except socket.timeout as e:
+            self.logger.error(f"SFTP连接超时 {self.ip}")
+            self._record_error(classify_error(e))
+
+        except Exception as e:
+            self.logger.error(f"SFTP连接失败 {self.ip}: {str(e)}")
+            self._record_error(classify_error(e))
+
+        self._release_ticket()
         return False
 
+    def _record_error(self, kind: Optional[str]) -> None:
+        self.last_error = kind
+        ERRORS_TOTAL.inc(vendor=self.device.get('driver') or 'unknown', kind=f"sftp_{kind}")
+
+    def _open_sftp(self, attempt: int) -> None:
+        """建立一次SFTP连接，失败时抛出异常并清理"""
+        try:
+            self.logger.info(f"正在尝试连接设备 {self.ip} (第 {attempt} 次)")
+
+            # 与命令执行、LLDP发现共享同一设备的已认证传输
+            self.ssh = get_transport_broker().acquire(
+                self.ip,
+                self.username,
+                self.password,
+                port=self.port,
+                timeout=self.timeout,
+                cancel=self.cancel
+            )
+
+            self.sftp = self.ssh.open_sftp()
+            self.sftp.get_channel().settimeout(self.timeout)
+            if self.cancel:
+                # 取消时关闭SFTP通道，阻塞中的读写立即返回
+                self._unregister_cancel = self.cancel.on_cancel(self._abort)
+        except BaseException:
+            self._close_channels()
+            raise
+
     def upload_file(self, local_path: str, remote_path: str) -> bool:
         """上传文件"""
         if not os.path.exists(local_path):
             self.logger.error(f"本地文件不存在: {local_path}")
             return False
 
+        uploaded_size = [0]  # 使用列表以便在回调中修改
         try:
             file_size = os.path.getsize(local_path)
-            uploaded_size = [0]  # 使用列表以便在回调中修改
 
             def callback(sent, total):
+                if self.cancel:
+                    self.cancel.check()  # 在回调中抛出异常即中止传输
                 uploaded_size[0] = sent
                 if self.progress_callback:
                     self.progress_callback(
@@ -120,6 +165,8 @@ class FTPManager:
         except Exception as e:
             self.logger.error(f"文件上传失败: {str(e)}")
             return False
+        finally:
+            BYTES_TOTAL.inc(uploaded_size[0], direction='upload')
 
     def download_file(self, remote_file: str, local_file: str) -> bool:
         """从设备下载文件
@@ -131,6 +178,7 @@ class FTPManager:
         Returns:
             bool: 下载是否成功
         """
+        bytes_downloaded = 0
         try:
             if not self.sftp:
                 raise Exception("SFTP连接未建立")
@@ -144,10 +192,11 @@ class FTPManager:
             # 下载文件并显示进度
             with self._lock:
                 self.logger.info(f"开始下载文件: {remote_file} -> {local_file}")
-                bytes_downloaded = 0
                 
                 def update_progress(bytes_transferred: int, _):
                     nonlocal bytes_downloaded
+                    if self.cancel:
+                        self.cancel.check()
                     bytes_downloaded = bytes_transferred
                     if self.progress_callback:
                         self.progress_callback(remote_file, bytes_downloaded, file_size)
@@ -164,6 +213,8 @@ class FTPManager:
         except Exception as e:
             self.logger.error(f"文件下载失败 {remote_file}: {str(e)}")
             return False
+        finally:
+            BYTES_TOTAL.inc(bytes_downloaded, direction='download')
 
     def list_remote_files(self, remote_path: str = '.') -> List[Dict]:
         """列出远程目录下的文件
@@ -199,8 +250,26 @@ class FTPManager:
             self.logger.error(f"获取远程文件列表失败: {str(e)}")
             return []
 
+    def _abort(self) -> None:
+        """取消回调: 关闭SFTP通道"""
+        sftp = self.sftp
+        if sftp:
+            try:
+                sftp.close()
+            except Exception:
+                pass
+
     def close(self) -> None:
         """关闭SFTP连接"""
+        self._close_channels()
+        self._release_ticket()
+        self.logger.info(f"关闭SFTP连接: {self.ip}")
+
+    def _close_channels(self) -> None:
+        """关闭SFTP通道并释放传输引用，保留限流名额"""
+        if self._unregister_cancel:
+            self._unregister_cancel()
+            self._unregister_cancel = None
         if self.sftp:
             try:
                 self.sftp.close()
@@ -214,5 +283,8 @@ class FTPManager:
             except:
                 pass
             self.ssh = None
-            
-        self.logger.info(f"关闭SFTP连接: {self.ip}") 
\ No newline at end of file
+
+    def _release_ticket(self) -> None:
+        if self._ticket:
+            self._ticket.release()
+            self._ticket = None 
\ No newline at end of file
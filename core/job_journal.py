@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+import time
+import logging
+from typing import Dict, List, Optional
+
+from .drivers import DRIVERS
+
+
+def _enters_config(command: str) -> bool:
+    return any(driver_class().enters_config(command) for driver_class in DRIVERS.values())
+
+
+def safe_restart_index(commands: List[str], completed: int) -> int:
+    """中断设备的安全重启位置
+
+    已完成 completed 条命令时，从包含下一条命令的配置块开头(最近一次
+    进入配置模式的命令)重新执行，保证后续命令处在正确的视图中。
+    """
+    commands = [cmd.strip() for cmd in commands if cmd.strip()]
+    if completed <= 0 or completed >= len(commands):
+        return max(0, min(completed, len(commands)))
+    for index in range(completed - 1, -1, -1):
+        if _enters_config(commands[index]):
+            return index
+    return completed
+
+
+class JournalState:
+    """从日志恢复的作业状态"""
+
+    def __init__(self):
+        self.command_map: Dict[str, List[str]] = {}
+        self.finished: Dict[str, str] = {}  # ip -> 最终状态
+        self.completed: Dict[str, int] = {}  # ip -> 已完成命令数(未结束的设备)
+
+    def remaining_commands(self, ip: str, commands: Optional[List[str]] = None) -> List[str]:
+        """设备还需执行的命令，已成功完成的设备返回空列表"""
+        commands = [cmd.strip() for cmd in (commands or self.command_map.get(ip, [])) if cmd.strip()]
+        if self.finished.get(ip) == 'success':
+            return []
+        if ip in self.finished:
+            return commands  # 失败的设备整体重做
+        return commands[safe_restart_index(commands, self.completed.get(ip, 0)):]
+
+
+class JobJournal:
+    """追加写入的作业日志，记录每台设备和每条命令的完成情况
+
+    每条记录一行JSON，写入后立即刷到系统缓冲区，设备结束时 fsync，
+    相比SSH交互的开销可以忽略。日志中不保存密码。
+    """
+
+    def __init__(self, path: str):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+
+    def start_job(self, devices: List[Dict], command_map: Dict[str, List[str]]) -> None:
+        """记录作业内容，用于恢复时确定剩余命令"""
+        self._append({
+            'type': 'job',
+            'devices': [{k: v for k, v in device.items() if k != 'password'} for device in devices],
+            'commands': {ip: list(commands) for ip, commands in command_map.items()}
+        })
+
+    def device_start(self, ip: str, skipped: int = 0) -> None:
+        """设备开始执行，skipped 为恢复时跳过的已完成命令数"""
+        with self._lock:
+            self._counts[ip] = skipped
+        self._append({'type': 'device_start', 'ip': ip, 'skipped': skipped})
+
+    def command_done(self, ip: str, command: str) -> None:
+        with self._lock:
+            self._counts[ip] = self._counts.get(ip, 0) + 1
+            index = self._counts[ip]
+        self._append({'type': 'command', 'ip': ip, 'command': command, 'done': index})
+
+    def device_end(self, ip: str, status: str, expected: Optional[int] = None) -> None:
+        """设备结束；成功但命令未全部完成(如被取消)时记为 incomplete"""
+        with self._lock:
+            done = self._counts.pop(ip, 0)
+        if status == 'success' and expected is not None and done < expected:
+            status = 'incomplete'
+        self._append({'type': 'device_end', 'ip': ip, 'status': status}, sync=True)
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def _append(self, record: Dict, sync: bool = False) -> None:
+        record['time'] = time.time()
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(line)
+            self._file.flush()
+            if sync:
+                try:
+                    os.fsync(self._file.fileno())
+                except OSError:
+                    pass
+
+    @staticmethod
+    def load(path: str) -> JournalState:
+        """读取日志，得到每台设备的完成情况；末尾写了一半的行会被忽略"""
+        state = JournalState()
+        if not os.path.exists(path):
+            return state
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                record_type = record.get('type')
+                ip = record.get('ip')
+                if record_type == 'job':
+                    state.command_map.update(record.get('commands', {}))
+                elif record_type == 'device_start':
+                    state.finished.pop(ip, None)
+                    state.completed[ip] = record.get('skipped', 0)
+                elif record_type == 'command':
+                    state.completed[ip] = record.get('done', state.completed.get(ip, 0) + 1)
+                elif record_type == 'device_end' and record.get('status') != 'incomplete':
+                    state.finished[ip] = record.get('status')
+                    state.completed.pop(ip, None)
+        return state
@@ -0,0 +1,207 @@
+import itertools
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, List, Optional
+from .command_executor import CommandExecutor
+from .concurrency import AIMDController, configured_max_threads
+from .metrics import export_metrics
+
+
+class DeviceJob:
+    """一次多设备命令作业"""
+
+    def __init__(self, job_id: int, devices: List[Dict], command_map: Dict[str, List[str]],
+                 executor: CommandExecutor, on_done: Optional[Callable[["DeviceJob"], None]] = None):
+        self.id = job_id
+        self.devices = [device for device in devices if command_map.get(device['ip'])]
+        self.command_map = command_map
+        self.executor = executor
+        self.on_done = on_done
+        self.start_time = time.time()
+        self.end_time = None
+        self.cancelled = False
+        self._futures: List[Future] = []
+        self._remaining = len(self.devices)
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        if not self.devices:
+            self._finish()
+
+    @property
+    def results(self) -> Dict:
+        return self.executor.results
+
+    def get_progress(self) -> tuple:
+        """获取作业进度 (已完成设备数, 设备总数)"""
+        return len(self.executor.results), len(self.devices)
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待作业完成，超时返回False"""
+        return self._done.wait(timeout)
+
+    def cancel(self) -> None:
+        """取消作业: 未开始的设备不再执行，正在连接或读取的设备在1秒内中止"""
+        self.cancelled = True
+        self.executor.is_running = False
+        self.executor.cancel_token.cancel()
+        for future in self._futures:
+            future.cancel()  # 取消的任务同样触发完成回调
+
+    def _device_finished(self, future: Optional[Future] = None) -> None:
+        with self._lock:
+            self._remaining -= 1
+            finished = self._remaining == 0
+        if finished:
+            self._finish()
+
+    def _finish(self) -> None:
+        self.end_time = time.time()
+        self.executor.is_running = False
+        if self.executor.latency_store:
+            self.executor.latency_store.save()
+        if self.executor.sink:
+            self.executor.sink.flush()
+        self.executor.admission.log_stats()
+        export_metrics()
+        self._done.set()
+        if self.on_done:
+            try:
+                self.on_done(self)
+            except Exception as e:
+                logging.getLogger(__name__).error(f"作业完成回调失败: {str(e)}")
+
+
+class ExecutorService:
+    """应用级的命令执行服务
+
+    所有作业共用一个有界线程池，全局并发数不随设备数增长；
+    每个作业可包含多台设备，通过回调获得逐设备的进度和事件。
+    实际并发由 AIMD 控制器在 1 到 max_concurrency 之间自适应调整。
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None):
+        self.logger = logging.getLogger(__name__)
+        self.max_concurrency = max_concurrency = max_concurrency or configured_max_threads()
+        self.concurrency = AIMDController(
+            initial=max(1, max_concurrency // 2),
+            max_limit=max_concurrency,
+            name="执行服务"
+        )
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="CmdJob")
+        self._jobs: Dict[int, DeviceJob] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def submit(
+        self,
+        devices: List[Dict],
+        command_map: Dict[str, List[str]],
+        timeout: Optional[int] = None,
+        on_event: Optional[Callable[[Dict], None]] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        on_done: Optional[Callable[[DeviceJob], None]] = None,
+        **executor_options
+    ) -> DeviceJob:
+        """提交多设备作业
+
+        Args:
+            on_event: 执行事件回调，见 CommandExecutor.set_event_callback
+            on_progress: 每台设备完成时回调 (已完成数, 总数)
+            on_done: 作业全部完成(或取消)时回调
+            executor_options: 传给 CommandExecutor 的参数，如 mode、output_limit、order、sink、journal
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("执行服务已关闭")
+            job_id = next(self._ids)
+
+        executor_options.setdefault('concurrency', self.concurrency)
+        executor = CommandExecutor(**executor_options)
+        executor.set_event_callback(on_event)
+        executor.set_progress_callback(on_progress)
+
+        def finished(finished_job: DeviceJob) -> None:
+            with self._lock:
+                self._jobs.pop(finished_job.id, None)
+            if on_done:
+                on_done(finished_job)
+
+        job = DeviceJob(job_id, executor.order_devices(devices), command_map, executor, on_done=finished)
+        executor.pending_devices = job.devices
+        if executor.journal:
+            executor.journal.start_job(job.devices, command_map)
+        executor.is_running = True
+        with self._lock:
+            if not job.done():
+                self._jobs[job_id] = job
+
+        for device in job.devices:
+            future = self._pool.submit(self._run_device, job, device, timeout)
+            future.add_done_callback(job._device_finished)
+            job._futures.append(future)
+
+        self.logger.info(f"提交作业 {job_id}: {len(job.devices)} 台设备")
+        return job
+
+    def _run_device(self, job: DeviceJob, device: Dict, timeout: Optional[int]) -> None:
+        with self.concurrency.slot():
+            if job.cancelled or job.executor.cancel_token.cancelled:
+                return
+            job.executor.execute_device_commands(
+                device['ip'],
+                device['username'],
+                device['password'],
+                job.command_map[device['ip']],
+                device.get('port', 22),
+                timeout,
+                device.get('driver'),
+                device
+            )
+
+    def get_jobs(self) -> List[DeviceJob]:
+        """获取未完成的作业"""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel_all(self) -> None:
+        """取消所有未完成的作业"""
+        for job in self.get_jobs():
+            job.cancel()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """关闭服务: 取消未完成的作业并回收工作线程"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self.cancel_all()
+        self._pool.shutdown(wait=wait)
+        self.logger.info("命令执行服务已关闭")
+
+
+_default_service = None
+_default_service_lock = threading.Lock()
+
+
+def get_executor_service() -> ExecutorService:
+    """获取应用级共享的命令执行服务"""
+    global _default_service
+    with _default_service_lock:
+        if _default_service is None:
+            _default_service = ExecutorService()
+        return _default_service
+
+
+def shutdown_executor_service(wait: bool = True) -> None:
+    """关闭共享的命令执行服务(应用退出时调用)"""
+    global _default_service
+    with _default_service_lock:
+        service, _default_service = _default_service, None
+    if service:
+        service.shutdown(wait=wait)
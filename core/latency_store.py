@@ -0,0 +1,170 @@
+import json
+import math
+import os
+import threading
+import logging
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+
+
+def command_key(command: str) -> str:
+    """命令归类: 取前两个词，避免带参数的命令产生大量条目"""
+    return ' '.join(command.lower().split()[:2])
+
+
+class LatencyStore:
+    """按设备和驱动记录命令耗时，并据此计算超时上限
+
+    每个(设备, 驱动, 命令)保留最近 max_samples 个样本，超时取
+    p99 × margin，并限制在 [min_timeout, max_timeout] 之间。样本不足时
+    返回 None，由调用方使用驱动的默认值。另外记录每台设备整体执行
+    耗时的滑动平均，用于调度排序。数据保存在一个小的JSON文件中。
+    """
+
+    def __init__(
+        self,
+        path: str = 'latency_stats.json',
+        margin: float = 3.0,
+        min_samples: int = 5,
+        max_samples: int = 200,
+        max_commands: int = 200,
+        min_timeout: float = 3.0,
+        max_timeout: float = 300.0
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.margin = margin
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.max_commands = max_commands
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self._lock = threading.Lock()
+        self._entries: Dict[str, "OrderedDict[str, deque]"] = {}
+        self._devices: Dict[str, float] = {}  # 设备整体耗时的滑动平均
+        self._dirty = False
+        self._load()
+
+    def record(self, ip: str, driver: str, command: str, elapsed: float) -> None:
+        """记录一次命令耗时(秒)"""
+        key = command_key(command)
+        if not key:
+            return
+        with self._lock:
+            commands = self._entries.setdefault(f"{ip}|{driver}", OrderedDict())
+            samples = commands.get(key)
+            if samples is None:
+                samples = commands[key] = deque(maxlen=self.max_samples)
+                if len(commands) > self.max_commands:
+                    commands.popitem(last=False)
+            samples.append(round(elapsed, 3))
+            self._dirty = True
+
+    def record_device(self, ip: str, elapsed: float, alpha: float = 0.3) -> None:
+        """记录一台设备一次作业的整体耗时"""
+        with self._lock:
+            previous = self._devices.get(ip)
+            value = elapsed if previous is None else previous + alpha * (elapsed - previous)
+            self._devices[ip] = round(value, 3)
+            self._dirty = True
+
+    def device_duration(self, ip: str) -> Optional[float]:
+        """设备的预计执行耗时，没有记录时返回 None"""
+        with self._lock:
+            return self._devices.get(ip)
+
+    def timeout_for(self, ip: str, driver: str, command: str) -> Optional[float]:
+        """根据历史耗时计算超时上限，样本不足时返回 None"""
+        with self._lock:
+            samples = self._entries.get(f"{ip}|{driver}", {}).get(command_key(command))
+            if not samples or len(samples) < self.min_samples:
+                return None
+            p99 = self._percentile(sorted(samples), 0.99)
+        return min(self.max_timeout, max(self.min_timeout, p99 * self.margin))
+
+    def get_stats(self, ip: Optional[str] = None) -> Dict[str, Dict[str, Dict]]:
+        """查看学习到的耗时和超时，可按设备过滤"""
+        stats = {}
+        with self._lock:
+            for entry, commands in self._entries.items():
+                if ip and not entry.startswith(f"{ip}|"):
+                    continue
+                stats[entry] = {}
+                for key, samples in commands.items():
+                    ordered = sorted(samples)
+                    p99 = self._percentile(ordered, 0.99)
+                    stats[entry][key] = {
+                        'count': len(ordered),
+                        'p50': self._percentile(ordered, 0.5),
+                        'p99': p99,
+                        'timeout': (min(self.max_timeout, max(self.min_timeout, p99 * self.margin))
+                                    if len(ordered) >= self.min_samples else None)
+                    }
+        return stats
+
+    def reset(self, ip: Optional[str] = None, driver: Optional[str] = None) -> None:
+        """清除学习到的数据，可按设备和驱动限定范围"""
+        with self._lock:
+            for entry in list(self._entries):
+                entry_ip, entry_driver = entry.split('|', 1)
+                if (ip is None or entry_ip == ip) and (driver is None or entry_driver == driver):
+                    del self._entries[entry]
+            if driver is None:
+                for device_ip in list(self._devices):
+                    if ip is None or device_ip == ip:
+                        del self._devices[device_ip]
+            self._dirty = True
+        self.save()
+
+    def save(self) -> None:
+        """有变化时写回文件，先写临时文件再替换"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                entry: {key: list(samples) for key, samples in commands.items()}
+                for entry, commands in self._entries.items()
+            }
+            devices = dict(self._devices)
+            self._dirty = False
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': 1, 'entries': data, 'devices': devices}, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self.logger.error(f"保存命令耗时数据失败: {str(e)}")
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            data = stored.get('entries', {})
+            self._devices = {ip: float(value) for ip, value in stored.get('devices', {}).items()}
+            for entry, commands in data.items():
+                self._entries[entry] = OrderedDict(
+                    (key, deque(samples, maxlen=self.max_samples)) for key, samples in commands.items()
+                )
+        except Exception as e:
+            self.logger.error(f"加载命令耗时数据失败: {str(e)}")
+
+    @staticmethod
+    def _percentile(ordered: list, q: float) -> float:
+        if not ordered:
+            return 0.0
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_latency_store() -> LatencyStore:
+    """获取进程内共享的耗时存储"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = LatencyStore()
+        return _default_store
@@ -1,6 +1,8 @@
 import re
 from typing import Dict, List
 import logging
+import time
+from .metrics import DISCOVERY_PROBES, DISCOVERY_SECONDS
 
 class LLDPDiscovery:
     def __init__(self, ssh_manager):
@@ -76,6 +78,7 @@ class LLDPDiscovery:
 
     def parse_lldp_topology(self) -> Dict:
         """解析LLDP信息为拓扑字典结构"""
+        start = time.monotonic()
         try:
             # 获取当前设备的主机名
             hostname = self.ssh.execute_command("display current-configuration | include sysname").split()[-1]
@@ -129,8 +132,12 @@ class LLDPDiscovery:
                         }
                     }
             
+            DISCOVERY_PROBES.inc(method='lldp', result='ok')
             return topology
             
         except Exception as e:
             self.logger.error(f"解析LLDP拓扑失败: {str(e)}")
-            return {'devices': {}, 'connections': []} 
\ No newline at end of file
+            DISCOVERY_PROBES.inc(method='lldp', result='failed')
+            return {'devices': {}, 'connections': []}
+        finally:
+            DISCOVERY_SECONDS.observe(time.monotonic() - start, method='lldp') 
\ No newline at end of file
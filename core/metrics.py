@@ -0,0 +1,241 @@
+import bisect
+import os
+import threading
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 默认的耗时分桶(秒)，覆盖从毫秒级命令到分钟级的慢命令
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ''
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增不减的计数"""
+    type_name = 'counter'
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, description, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in values]
+
+
+class Histogram(_Metric):
+    """耗时分布，按累计分桶导出，可计算分位数"""
+    type_name = 'histogram'
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], List] = {}  # key -> [分桶计数..., 总和, 次数]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, list(entry)) for key, entry in self._values.items())
+        lines = []
+        for key, entry in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), entry):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(entry[-2])}")
+            lines.append(f"{self.name}_count{labels} {entry[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """进程内的指标注册表，导出为 Prometheus 文本格式"""
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, description: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, description, labelnames))
+
+    def histogram(self, name: str, description: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, description, labelnames, buckets))
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str) -> None:
+        """写入文件(可供 node_exporter textfile 采集)，先写临时文件再替换"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def serve(self, port: int, host: str = '127.0.0.1') -> None:
+        """在本机端口提供 /metrics，后台线程运行"""
+        if self._server:
+            return
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="MetricsHTTP", daemon=True).start()
+        self.logger.info(f"指标导出: http://{host}:{port}/metrics")
+
+    def stop_server(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+REGISTRY = MetricsRegistry()
+
+# 连接与认证: connect 为TCP建连，auth 为SSH握手和认证
+CONNECT_SECONDS = REGISTRY.histogram('nettool_connect_seconds', "TCP连接建立耗时", ('protocol',))
+AUTH_SECONDS = REGISTRY.histogram('nettool_auth_seconds', "SSH握手和认证耗时", ('protocol',))
+SESSION_SETUP_SECONDS = REGISTRY.histogram(
+    'nettool_session_setup_seconds', "从开始连接到会话可用的耗时(含重试)", ('protocol',)
+)
+COMMAND_SECONDS = REGISTRY.histogram('nettool_command_seconds', "单条命令耗时", ('vendor', 'command_class'))
+DEVICE_SECONDS = REGISTRY.histogram('nettool_device_seconds', "单台设备执行全部命令的耗时", ('status',))
+QUEUE_WAIT_SECONDS = REGISTRY.histogram('nettool_queue_wait_seconds', "执行前的排队等待", ('stage',))
+BYTES_TOTAL = REGISTRY.counter('nettool_bytes_total', "传输的字节数", ('direction',))
+POOL_REQUESTS = REGISTRY.counter('nettool_pool_requests_total', "连接池和共享传输的命中情况", ('pool', 'result'))
+RETRIES_TOTAL = REGISTRY.counter('nettool_retries_total', "连接重试次数", ('kind',))
+CIRCUIT_OPEN_TOTAL = REGISTRY.counter('nettool_circuit_open_total', "熔断器断开次数")
+ERRORS_TOTAL = REGISTRY.counter('nettool_errors_total', "按厂商和类型统计的错误", ('vendor', 'kind'))
+DEVICES_TOTAL = REGISTRY.counter('nettool_devices_total', "执行完成的设备数", ('status',))
+DISCOVERY_SECONDS = REGISTRY.histogram('nettool_discovery_seconds', "拓扑发现耗时", ('method',))
+DISCOVERY_PROBES = REGISTRY.counter('nettool_discovery_probes_total', "发现过程中的探测次数", ('method', 'result'))
+
+
+def get_metrics() -> MetricsRegistry:
+    """获取进程内共享的指标注册表"""
+    return REGISTRY
+
+
+def _configured(key: str):
+    try:
+        from .settings import get_settings
+        return get_settings().get('metrics', {}).get(key)
+    except Exception:
+        return None
+
+
+def start_metrics_server(port: Optional[int] = None, host: Optional[str] = None) -> bool:
+    """按 config.json 的 settings.metrics.port 启动本机 /metrics 端口，未配置时不启动
+
+    示例: {"metrics": {"file": "results/nettool.prom", "port": 9464}}
+    """
+    port = port or _configured('port')
+    if not port:
+        return False
+    try:
+        REGISTRY.serve(int(port), host or _configured('host') or '127.0.0.1')
+        return True
+    except OSError as e:
+        logging.getLogger(__name__).warning(f"指标端口 {port} 启动失败: {str(e)}")
+        return False
+
+
+def export_metrics(path: Optional[str] = None) -> None:
+    """写入指标文件，路径默认取 config.json 的 settings.metrics.file，未配置时不写"""
+    path = path or _configured('file')
+    if not path:
+        return
+    try:
+        REGISTRY.write(path)
+    except OSError as e:
+        logging.getLogger(__name__).warning(f"写入指标文件失败: {str(e)}")
@@ -0,0 +1,215 @@
+import ipaddress
+import threading
+import time
+import logging
+from typing import Dict, List, Optional
+from .cancellation import POLL_INTERVAL, CancelToken
+
+
+class Budget:
+    """一个限流对象: 令牌桶限制新建会话的速率，并限制同时存在的会话数"""
+
+    def __init__(self, key: str, rate: Optional[float] = None, burst: Optional[int] = None,
+                 max_sessions: Optional[int] = None):
+        self.key = key
+        self.rate = rate  # 每秒允许新建的会话数
+        self.burst = burst or (max(1, int(rate)) if rate else 0)
+        self.max_sessions = max_sessions
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.stats = {'admitted': 0, 'timeouts': 0, 'waits': 0, 'peak_waiting': 0,
+                      'wait_time_total': 0.0, 'wait_time_max': 0.0}
+
+    def acquire(self, deadline: Optional[float], cancel: Optional[CancelToken] = None) -> None:
+        """等待会话名额和令牌，超过截止时间抛出 TimeoutError，取消时抛出 CancelledError"""
+        start = time.monotonic()
+        with self._cond:
+            self.waiting += 1
+            self.stats['peak_waiting'] = max(self.stats['peak_waiting'], self.waiting)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait_for = None
+                    if self.max_sessions and self.active >= self.max_sessions:
+                        wait_for = deadline - now if deadline else None
+                    elif self.rate:
+                        self._refill(now)
+                        if self._tokens >= 1:
+                            self._tokens -= 1
+                            break
+                        wait_for = (1 - self._tokens) / self.rate
+                        if deadline:
+                            wait_for = min(wait_for, deadline - now)
+                    else:
+                        break
+
+                    if deadline and deadline - now <= 0:
+                        self.stats['timeouts'] += 1
+                        raise TimeoutError(f"等待限流名额超时: {self.key}")
+                    if cancel:
+                        cancel.check()
+                        wait_for = POLL_INTERVAL if wait_for is None else min(wait_for, POLL_INTERVAL)
+                    self._cond.wait(wait_for)
+
+                self.active += 1
+                self.stats['admitted'] += 1
+                waited = time.monotonic() - start
+                if waited > 0.001:
+                    self.stats['waits'] += 1
+                    self.stats['wait_time_total'] += waited
+                    self.stats['wait_time_max'] = max(self.stats['wait_time_max'], waited)
+            finally:
+                self.waiting -= 1
+
+    def try_acquire(self) -> bool:
+        """不等待: 有空闲名额和令牌且没有排队者时占用，否则返回False"""
+        with self._cond:
+            if self.waiting or (self.max_sessions and self.active >= self.max_sessions):
+                return False
+            if self.rate:
+                self._refill(time.monotonic())
+                if self._tokens < 1:
+                    return False
+                self._tokens -= 1
+            self.active += 1
+            self.stats['admitted'] += 1
+            return True
+
+    def release(self) -> None:
+        with self._cond:
+            self.active = max(0, self.active - 1)
+            self._cond.notify()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            stats = dict(self.stats)
+            stats.update({'active': self.active, 'waiting': self.waiting})
+        return stats
+
+
+class AdmissionTicket:
+    """已获准的会话，结束时调用 release()"""
+
+    def __init__(self, budgets: List[Budget]):
+        self._budgets = budgets
+
+    def release(self) -> None:
+        budgets, self._budgets = self._budgets, []
+        for budget in budgets:
+            budget.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class AdmissionController:
+    """按设备属性(站点、AAA服务器、网段等)限流
+
+    规则示例(config.json 的 settings.rate_limits):
+        [{"by": "site", "rate": 5, "burst": 10, "max_sessions": 50},
+         {"by": "aaa_server", "rate": 20},
+         {"by": "subnet", "prefix": 24, "max_sessions": 20}]
+    rate 为每秒新建会话数，max_sessions 为同时存在的会话上限。
+    by 为设备字典中的字段名，subnet 按设备IP和 prefix 计算网段。
+    设备没有对应字段时该规则不生效。
+    """
+
+    def __init__(self, rules: Optional[List[Dict]] = None):
+        self.logger = logging.getLogger(__name__)
+        self.rules = rules or []
+        self._budgets: Dict[str, Budget] = {}
+        self._lock = threading.Lock()
+
+    def budgets_for(self, device: Dict) -> List[Budget]:
+        """设备受哪些限流对象约束，按key排序以避免相互等待"""
+        budgets = []
+        for rule in self.rules:
+            attr = rule.get('by')
+            if attr == 'subnet':
+                try:
+                    value = str(ipaddress.ip_network(f"{device['ip']}/{rule.get('prefix', 24)}", strict=False))
+                except ValueError:
+                    continue
+            else:
+                value = device.get(attr)
+            if not value:
+                continue
+            key = f"{attr}={value}"
+            with self._lock:
+                budget = self._budgets.get(key)
+                if budget is None:
+                    budget = self._budgets[key] = Budget(
+                        key, rule.get('rate'), rule.get('burst'), rule.get('max_sessions')
+                    )
+            budgets.append(budget)
+        return sorted(budgets, key=lambda budget: budget.key)
+
+    def acquire(self, device: Dict, timeout: Optional[float] = None,
+                cancel: Optional[CancelToken] = None) -> AdmissionTicket:
+        """等待设备所属的全部限流对象放行"""
+        deadline = time.monotonic() + timeout if timeout else None
+        acquired = []
+        try:
+            for budget in self.budgets_for(device):
+                budget.acquire(deadline, cancel)
+                acquired.append(budget)
+        except Exception:
+            for budget in acquired:
+                budget.release()
+            raise
+        return AdmissionTicket(acquired)
+
+    def try_acquire(self, device: Dict) -> Optional[AdmissionTicket]:
+        """只使用当前空闲的名额，不排队；有设备在等待或名额已满时返回 None"""
+        acquired = []
+        for budget in self.budgets_for(device):
+            if not budget.try_acquire():
+                for held in acquired:
+                    held.release()
+                return None
+            acquired.append(budget)
+        return AdmissionTicket(acquired)
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """各限流对象的排队数、等待时间等指标"""
+        with self._lock:
+            budgets = list(self._budgets.values())
+        return {budget.key: budget.get_stats() for budget in budgets}
+
+    def log_stats(self) -> None:
+        """输出发生过等待的限流对象，判断瓶颈是否在限流"""
+        for key, stats in self.get_stats().items():
+            if stats['waits']:
+                self.logger.info(
+                    f"限流 {key}: 等待 {stats['waits']} 次, 累计 {stats['wait_time_total']:.2f}秒, "
+                    f"最长 {stats['wait_time_max']:.2f}秒, 最大排队 {stats['peak_waiting']}"
+                )
+
+
+_default_controller = None
+_default_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """获取进程内共享的限流控制器，规则来自 config.json 的 settings.rate_limits"""
+    global _default_controller
+    with _default_controller_lock:
+        if _default_controller is None:
+            rules = []
+            try:
+                from .settings import get_settings
+                rules = get_settings().get('rate_limits', [])
+            except Exception:
+                pass
+            _default_controller = AdmissionController(rules)
+        return _default_controller
@@ -0,0 +1,278 @@
+import gzip
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, Optional
+
+from .ssh_manager import has_command_error
+
+
+def summarize(result: Dict) -> Dict:
+    """生成设备结果的摘要，只保留状态、耗时和命令统计，不含输出"""
+    commands = result.get('commands', {})
+    summary = {key: value for key, value in result.items() if key != 'commands'}
+    summary['command_count'] = len(commands)
+    summary['output_size'] = sum(len(output) for output in commands.values())
+    summary['error_commands'] = [cmd for cmd, output in commands.items() if has_command_error(output)]
+    return summary
+
+
+class ResultReader:
+    """按需读取已保存的设备结果"""
+
+    def ips(self) -> List[str]:
+        raise NotImplementedError
+
+    def get(self, ip: str) -> Optional[Dict]:
+        """读取一台设备的完整结果"""
+        raise NotImplementedError
+
+    def __iter__(self) -> Iterator[Dict]:
+        for ip in self.ips():
+            result = self.get(ip)
+            if result:
+                yield result
+
+    def __len__(self) -> int:
+        return len(self.ips())
+
+
+class ResultSink:
+    """结果输出目标，设备完成时写入完整结果，内存中只保留摘要"""
+
+    def write(self, result: Dict) -> Dict:
+        """写入一台设备的完整结果，返回摘要"""
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def reader(self) -> ResultReader:
+        raise NotImplementedError
+
+
+class MemorySink(ResultSink):
+    """保存在内存中(原有行为)，适合少量设备"""
+
+    def __init__(self):
+        self._results: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def write(self, result: Dict) -> Dict:
+        with self._lock:
+            self._results[result['ip']] = result
+        return result
+
+    def reader(self) -> ResultReader:
+        sink = self
+
+        class _Reader(ResultReader):
+            def ips(self):
+                with sink._lock:
+                    return list(sink._results)
+
+            def get(self, ip):
+                with sink._lock:
+                    return sink._results.get(ip)
+
+        return _Reader()
+
+
+class JSONLSink(ResultSink):
+    """每台设备一行JSON追加写入文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def write(self, result: Dict) -> Dict:
+        # ip 写在最前面，读取时建立索引不必解析整行
+        line = json.dumps({'ip': result['ip'], **result}, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._file.write(line)
+        return summarize(result)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def reader(self) -> ResultReader:
+        self.flush()
+        return JSONLReader(self.path)
+
+
+class JSONLReader(ResultReader):
+    """JSONL结果读取器，只建立 IP 到文件偏移的索引，读取时再解析
+
+    ip 位于行首时直接截取，否则(如其他程序写入的文件)解析整行。
+    """
+
+    _IP_PATTERN = re.compile(rb'^\{"ip": "([^"]+)"')
+
+    def __init__(self, path: str):
+        self.path = path
+        self._index: Dict[str, int] = {}
+        offset = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                ip = self._line_ip(line)
+                if ip:
+                    self._index[ip] = offset  # 同一设备以最后一次为准
+                offset += len(line)
+
+    def _line_ip(self, line: bytes) -> Optional[str]:
+        match = self._IP_PATTERN.match(line)
+        if match and line.endswith(b'\n'):
+            return match.group(1).decode('utf-8')
+        try:
+            record = json.loads(line.decode('utf-8'))
+        except ValueError:
+            return None  # 写了一半的行
+        return record.get('ip') if isinstance(record, dict) else None
+
+    def ips(self) -> List[str]:
+        return list(self._index)
+
+    def get(self, ip: str) -> Optional[Dict]:
+        offset = self._index.get(ip)
+        if offset is None:
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline().decode('utf-8'))
+
+
+class SQLiteSink(ResultSink):
+    """保存到SQLite数据库，设备和命令输出分表存储"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    ip TEXT PRIMARY KEY, status TEXT, error TEXT,
+                    start_time REAL, end_time REAL, summary TEXT
+                );
+                CREATE TABLE IF NOT EXISTS commands (
+                    ip TEXT, seq INTEGER, command TEXT, output TEXT,
+                    PRIMARY KEY (ip, seq)
+                );
+                """
+            )
+
+    def write(self, result: Dict) -> Dict:
+        summary = summarize(result)
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM commands WHERE ip = ?", (result['ip'],))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                    (result['ip'], result.get('status'), result.get('error'), result.get('start_time'),
+                     result.get('end_time'), json.dumps(summary, ensure_ascii=False))
+                )
+                self._conn.executemany(
+                    "INSERT INTO commands VALUES (?, ?, ?, ?)",
+                    [(result['ip'], seq, cmd, output)
+                     for seq, (cmd, output) in enumerate(result.get('commands', {}).items())]
+                )
+        return summary
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def reader(self) -> ResultReader:
+        return SQLiteReader(self.path)
+
+
+class SQLiteReader(ResultReader):
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def ips(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT ip FROM results ORDER BY rowid")]
+
+    def get(self, ip: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT summary FROM results WHERE ip = ?", (ip,)).fetchone()
+            if not row:
+                return None
+            commands = self._conn.execute(
+                "SELECT command, output FROM commands WHERE ip = ? ORDER BY seq", (ip,)
+            ).fetchall()
+        result = json.loads(row[0])
+        for key in ('command_count', 'output_size', 'error_commands'):
+            result.pop(key, None)
+        result['commands'] = dict(commands)
+        return result
+
+
+class CompressedFileSink(ResultSink):
+    """每台设备一个gzip压缩的JSON文件"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, result: Dict) -> Dict:
+        path = os.path.join(self.directory, f"{result['ip']}.json.gz")
+        with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+        return summarize(result)
+
+    def reader(self) -> ResultReader:
+        return CompressedFileReader(self.directory)
+
+
+class CompressedFileReader(ResultReader):
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def ips(self) -> List[str]:
+        return sorted(name[:-len('.json.gz')] for name in os.listdir(self.directory)
+                      if name.endswith('.json.gz'))
+
+    def get(self, ip: str) -> Optional[Dict]:
+        path = os.path.join(self.directory, f"{ip}.json.gz")
+        if not os.path.exists(path):
+            return None
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+
+def create_sink(target: str) -> ResultSink:
+    """根据路径创建输出目标: *.jsonl / *.db|*.sqlite / 其他视为压缩文件目录"""
+    if target.endswith('.jsonl'):
+        return JSONLSink(target)
+    if target.endswith(('.db', '.sqlite', '.sqlite3')):
+        return SQLiteSink(target)
+    return CompressedFileSink(target)
+
+
+def open_results(target: str) -> ResultReader:
+    """打开已保存的结果用于查看或分析"""
+    if target.endswith('.jsonl'):
+        return JSONLReader(target)
+    if target.endswith(('.db', '.sqlite', '.sqlite3')):
+        return SQLiteReader(target)
+    return CompressedFileReader(target)
@@ -0,0 +1,228 @@
+import random
+import threading
+import time
+import logging
+from typing import Callable, Dict, Optional, TypeVar
+
+from .cancellation import CancelToken, CancelledError
+from .concurrency import classify_error
+from .metrics import CIRCUIT_OPEN_TOTAL, RETRIES_TOTAL
+
+T = TypeVar('T')
+
+
+class CircuitOpenError(Exception):
+    """设备处于熔断状态，快速失败不再连接"""
+
+    def __init__(self, key: str, retry_in: float):
+        super().__init__(f"设备 {key} 连续连接失败，熔断中，{retry_in:.0f}秒后再试")
+        self.key = key
+        self.retry_in = retry_in
+
+
+class RetryPolicy:
+    """重试策略: 按错误类型决定是否重试，退避时间指数增长并加随机抖动
+
+    认证失败不重试，避免触发设备或AAA的账号锁定。
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        retry_on: tuple = ('timeout', 'reset', 'other')
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+
+    def should_retry(self, kind: Optional[str], attempt: int) -> bool:
+        """attempt 为已失败的次数(从1开始)"""
+        return attempt < self.max_attempts and kind in self.retry_on
+
+    def delay(self, attempt: int) -> float:
+        """第 attempt 次失败后的等待时间，在 [0, base × 2^(attempt-1)] 内均匀抖动，
+        同时失败的大量连接不会在同一时刻重试"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """单台设备的熔断器
+
+    连续失败 failure_threshold 次后断开，cooldown 秒内直接失败；
+    冷却结束后放行一次试探，成功则恢复，失败则冷却时间加倍(不超过 max_cooldown)。
+    """
+
+    def __init__(self, key: str, failure_threshold: int = 5, cooldown: float = 30.0,
+                 max_cooldown: float = 300.0):
+        self.key = key
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = 'closed'  # closed / open / half_open
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> None:
+        """允许连接时返回，熔断中抛出 CircuitOpenError"""
+        with self._lock:
+            if self.state == 'closed':
+                return
+            remaining = self.opened_at + self.cooldown - time.monotonic()
+            if self.state == 'open' and remaining <= 0:
+                self.state = 'half_open'  # 只放行一个试探连接
+                return
+            raise CircuitOpenError(self.key, max(0.0, remaining))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.cooldown = self.base_cooldown
+
+    def record_failure(self, kind: Optional[str]) -> bool:
+        """记录一次失败，熔断器因此断开时返回True"""
+        with self._lock:
+            self.failures += 1
+            self.last_error = kind
+            if self.state == 'half_open':
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+            elif self.failures < self.failure_threshold:
+                return False
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+            return True
+
+    def abandon(self) -> None:
+        """试探连接被取消、没有结果时，允许下一次试探"""
+        with self._lock:
+            if self.state == 'half_open':
+                self.state = 'open'
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {'state': self.state, 'failures': self.failures, 'cooldown': self.cooldown,
+                    'last_error': self.last_error}
+
+
+class RetryManager:
+    """按设备共享的重试与熔断
+
+    SSH和SFTP连接同一设备时使用同一个熔断器，故障网段的设备快速失败，
+    不再占用健康设备需要的工作线程。
+    """
+
+    def __init__(self, policy: Optional[RetryPolicy] = None, failure_threshold: int = 5,
+                 cooldown: float = 30.0, max_cooldown: float = 300.0):
+        self.logger = logging.getLogger(__name__)
+        self.policy = policy or RetryPolicy()
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, key: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._breakers[key] = CircuitBreaker(
+                    key, self.failure_threshold, self.cooldown, self.max_cooldown
+                )
+            return breaker
+
+    def call(self, key: str, func: Callable[[int], T], cancel: Optional[CancelToken] = None,
+             policy: Optional[RetryPolicy] = None) -> T:
+        """按策略重试执行 func(attempt)
+
+        每次尝试前检查熔断器；失败按错误类型决定是否重试，
+        最后一次的异常原样抛出。取消时立即抛出 CancelledError。
+        """
+        policy = policy or self.policy
+        breaker = self.breaker(key)
+        attempt = 0
+        while True:
+            breaker.allow()
+            attempt += 1
+            try:
+                result = func(attempt)
+            except CancelledError:
+                breaker.abandon()
+                raise
+            except Exception as e:
+                if cancel and cancel.cancelled:
+                    breaker.abandon()
+                    raise CancelledError(cancel.reason) from e
+                kind = classify_error(e)
+                if kind in ('auth', 'credentials'):
+                    breaker.abandon()  # 设备可达，认证失败不计入熔断，也不重试
+                    raise
+                if breaker.record_failure(kind):
+                    CIRCUIT_OPEN_TOTAL.inc()
+                    self.logger.warning(f"设备 {key} 连续失败 {breaker.failures} 次({kind})，熔断 {breaker.cooldown:.0f}秒")
+                    raise
+                if not policy.should_retry(kind, attempt):
+                    raise
+                delay = policy.delay(attempt)
+                RETRIES_TOTAL.inc(kind=kind)
+                self.logger.info(f"连接 {key} 失败({kind})，{delay:.1f}秒后第 {attempt + 1} 次尝试")
+                if cancel:
+                    cancel.sleep(delay)
+                else:
+                    time.sleep(delay)
+                continue
+            breaker.record_success()
+            return result
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """未处于正常状态的熔断器"""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        stats = {breaker.key: breaker.get_stats() for breaker in breakers}
+        return {key: value for key, value in stats.items() if value['state'] != 'closed' or value['failures']}
+
+    def reset(self, key: Optional[str] = None) -> None:
+        """清除熔断状态，key 为空时全部清除"""
+        with self._lock:
+            if key is None:
+                self._breakers.clear()
+            else:
+                self._breakers.pop(key, None)
+
+
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+
+def get_retry_manager() -> RetryManager:
+    """获取进程内共享的重试管理器，参数来自 config.json 的 settings.retry
+
+    示例: {"max_attempts": 3, "base_delay": 1, "max_delay": 30,
+           "failure_threshold": 5, "cooldown": 30}
+    """
+    global _default_manager
+    with _default_manager_lock:
+        if _default_manager is None:
+            options = {}
+            try:
+                from .settings import get_settings
+                options = get_settings().get('retry', {})
+            except Exception:
+                pass
+            policy = RetryPolicy(
+                max_attempts=options.get('max_attempts', 3),
+                base_delay=options.get('base_delay', 1.0),
+                max_delay=options.get('max_delay', 30.0)
+            )
+            _default_manager = RetryManager(
+                policy,
+                failure_threshold=options.get('failure_threshold', 5),
+                cooldown=options.get('cooldown', 30.0),
+                max_cooldown=options.get('max_cooldown', 300.0)
+            )
+        return _default_manager
@@ -0,0 +1,128 @@
+import math
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+
+from .cancellation import CancelToken
+from .rate_limit import AdmissionController, AdmissionTicket, get_admission_controller
+from .retry import get_retry_manager
+from .ssh_manager import has_command_error
+from .transport_broker import TransportLease, get_transport_broker
+
+
+def plan_waves(devices: List[Dict], canary: int = 1, wave_size: Union[int, float, None] = None) -> List[List[Dict]]:
+    """把设备分为金丝雀批次和后续批次
+
+    Args:
+        canary: 金丝雀设备数，0 表示不单独验证
+        wave_size: 每批设备数(整数)或占设备总数的比例(0~1 的小数)，None 表示剩余设备一批完成
+    """
+    devices = list(devices)
+    canary = max(0, min(canary, len(devices)))
+    waves = [devices[:canary]] if canary else []
+    rest = devices[canary:]
+    if isinstance(wave_size, float) and 0 < wave_size <= 1:
+        size = max(1, math.ceil(len(devices) * wave_size))
+    else:
+        size = int(wave_size) if wave_size else len(rest)
+    size = max(1, size)
+    waves.extend(rest[i:i + size] for i in range(0, len(rest), size))
+    return waves
+
+
+def device_failed(result: Dict) -> bool:
+    """设备执行失败或命令输出中包含错误信息"""
+    if result.get('status') != 'success':
+        return True
+    if result.get('error_commands'):
+        return True  # 结果写入sink后只保留摘要
+    return any(has_command_error(output) for output in result.get('commands', {}).values())
+
+
+class ConnectionPrewarmer:
+    """在当前批次执行时提前为下一批设备建立已认证的SSH传输
+
+    下一批设备连接时由传输代理直接复用，省去TCP握手、密钥交换和AAA认证。
+    预热登录与正常连接一样经过限流、重试和熔断，作业取消时随之中止。
+    预热的传输占用会话，限流名额随传输一起持有，设备执行时通过
+    take_ticket() 接手，未被使用的名额在 release() 时归还。预热只使用
+    当前空闲的名额，不排队，不会挤占正在执行的设备。
+    """
+
+    def __init__(self, max_workers: int = 10, timeout: int = 10, cancel: Optional[CancelToken] = None,
+                 admission: Optional[AdmissionController] = None):
+        self.logger = logging.getLogger(__name__)
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.cancel = cancel
+        self.admission = admission or get_admission_controller()
+        self._leases: List[TransportLease] = []
+        self._tickets: Dict[str, AdmissionTicket] = {}  # ip -> 预热传输占用的限流名额
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def start(self, devices: List[Dict]) -> None:
+        """后台为设备建立传输，不阻塞调用方"""
+        if not devices:
+            return
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, min(self.max_workers, len(devices))), thread_name_prefix="Prewarm"
+        )
+        for device in devices:
+            self._pool.submit(self._warm, device)
+
+    def _warm(self, device: Dict) -> None:
+        port = device.get('port', 22)
+        try:
+            if self.cancel:
+                self.cancel.check()
+            # 名额随预热的传输一起持有，预热的会话同样计入 max_sessions
+            ticket = self.admission.try_acquire(device)
+            if ticket is None:
+                self.logger.debug(f"没有空闲的限流名额，跳过预热 {device['ip']}")
+                return
+            try:
+                lease = get_retry_manager().call(
+                    f"{device['ip']}:{port}",
+                    lambda attempt: get_transport_broker().acquire(
+                        device['ip'],
+                        device['username'],
+                        device['password'],
+                        port=port,
+                        timeout=self.timeout,
+                        cancel=self.cancel
+                    ),
+                    cancel=self.cancel
+                )
+            except Exception:
+                ticket.release()
+                raise
+        except Exception as e:
+            # 预热失败不影响执行，设备轮到时按正常流程连接
+            self.logger.debug(f"预热连接 {device['ip']} 失败: {str(e)}")
+            return
+        with self._lock:
+            self._leases.append(lease)
+            previous = self._tickets.pop(device['ip'], None)
+            self._tickets[device['ip']] = ticket
+        if previous:
+            previous.release()
+
+    def take_ticket(self, ip: str) -> Optional[AdmissionTicket]:
+        """设备复用预热的传输时接手其限流名额，由设备结束时归还"""
+        with self._lock:
+            return self._tickets.pop(ip, None)
+
+    def release(self) -> None:
+        """等待预热结束并释放持有的传输引用，已被设备复用的传输保持连接"""
+        if self._pool:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        with self._lock:
+            leases, self._leases = self._leases, []
+            tickets, self._tickets = list(self._tickets.values()), {}
+        for lease in leases:
+            lease.close()
+        for ticket in tickets:
+            ticket.release()
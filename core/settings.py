@@ -0,0 +1,17 @@
+import json
+import os
+from typing import Any, Dict
+
+CONFIG_FILE = 'config.json'
+
+
+def get_settings(config_file: str = CONFIG_FILE) -> Dict[str, Any]:
+    """读取 config.json 中的 settings 部分
+
+    与 GUI 的 utils.config.ConfigManager 读取同一个文件，core 只读不写，
+    命令行工具因此不依赖 core 以外的包。文件不存在时返回空字典。
+    """
+    if not os.path.exists(config_file):
+        return {}
+    with open(config_file, 'r', encoding='utf-8') as f:
+        return json.load(f).get('settings', {})
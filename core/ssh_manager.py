@@ -1,141 +1,295 @@
-import paramiko
 import time
 import logging
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 import socket
 from paramiko.ssh_exception import SSHException, AuthenticationException
+import re
 import threading
+from collections import deque
+from .channel_reader import read_until, get_channel_reader
+from .connection_pool import SSHConnectionPool
+from .transport_broker import get_transport_broker
+from .concurrency import classify_error
+from .cancellation import POLL_INTERVAL, CancelToken, CancelledError
+from .retry import CircuitOpenError, get_retry_manager
+from .metrics import BYTES_TOTAL, COMMAND_SECONDS, POOL_REQUESTS, SESSION_SETUP_SECONDS
+from .drivers import (VendorDriver, GENERIC_PROMPT_PATTERN, PAGER_PATTERN,
+                      strip_pager_artifacts, get_driver, detect_driver)
+
+# 只读命令前缀，可以走exec通道
+READ_ONLY_PREFIXES = ('display ', 'dis ', 'show ', 'ping ', 'tracert ', 'traceroute ')
+
+# 输出中表示命令失败的关键字
+ERROR_KEYWORDS = ['error', 'failed', 'invalid', '无响应']
+
+# 指标中的命令分类，取值固定，避免按命令文本产生无限多的时间序列
+COMMAND_CLASSES = {'display': 'display', 'dis': 'display', 'show': 'display',
+                   'ping': 'ping', 'tracert': 'traceroute', 'traceroute': 'traceroute',
+                   'save': 'save', 'write': 'save', 'commit': 'save'}
+
+
+def is_read_only_command(command: str) -> bool:
+    """判断是否为只读的查看类命令"""
+    return command.strip().lower().startswith(READ_ONLY_PREFIXES)
+
+
+def command_class(command: str) -> str:
+    """命令的指标分类: display / ping / traceroute / save，其余为 config"""
+    words = command.lower().split()
+    return COMMAND_CLASSES.get(words[0], 'config') if words else 'config'
+
+
+def has_command_error(output: str) -> bool:
+    """根据输出判断命令是否可能执行失败"""
+    lower_output = output.lower()
+    return any(error in lower_output for error in ERROR_KEYWORDS)
+
 
 class SSHManager:
-    _connection_pool = {}  # 类级别的连接池
-    _pool_lock = threading.Lock()  # 连接池锁
+    _pool = SSHConnectionPool()  # 类级别的连接池
+    _broker = get_transport_broker()  # 按设备共享的SSH传输
     
-    def __init__(self, ip: str, username: str, password: str, port: int = 22, timeout: int = 10):
+    def __init__(self, ip: str, username: str, password: str, port: int = 22, timeout: int = 10,
+                 encoding: str = 'utf-8', driver: Optional[str] = None, cancel: Optional[CancelToken] = None):
         self.ip = ip
         self.username = username
         self.password = password
         self.port = port
         self.timeout = timeout
+        self.encoding = encoding  # 设备输出编码，如 utf-8、gbk
+        self.driver_name = driver  # 指定厂商驱动，None 时登录后自动识别
+        self.driver: VendorDriver = get_driver(driver)
+        self.latency_store = None  # 设置后按历史耗时计算超时并记录本次耗时
+        self.cancel = cancel  # 作业的取消令牌，取消或超过截止时间时中止连接和读取
+        self.last_error = None  # 最近一次连接失败的原因: timeout / auth / credentials / reset / other / circuit_open
+        self.connect_latency = None  # 最近一次建立连接的耗时(秒)
         self.ssh = None
         self.shell = None
         self.logger = logging.getLogger(__name__)
         self.prompt_patterns = [r'>$', r'#$', r'\]$']  # 命令提示符模式
+        self.hostname = None  # 登录后学习到的设备主机名
+        self.prompt_line = ""  # 最近一次识别到的提示符行
+        self.prompt_regex = re.compile(GENERIC_PROMPT_PATTERN)  # 当前会话的提示符正则
         self.last_output = ""
         self._connection_key = f"{username}@{ip}:{port}"
+        self._session = None  # 从连接池取得的会话
 
     def _wait_for_prompt(self, timeout: int = 10) -> bool:
         """等待命令提示符"""
-        start_time = time.time()
-        buffer = ""
-        
-        while time.time() - start_time < timeout:
-            if self.shell.recv_ready():
-                chunk = self.shell.recv(65535).decode('utf-8', errors='ignore')
-                buffer += chunk
-                
-                # 检查是否出现提示符（更宽松的匹配）
-                if any(char in buffer for char in ['>', '#', ']', '$']):
-                    self.last_output = buffer
-                    return True
-                
-                # 检查是否需要确认
-                if any(prompt in buffer.upper() for prompt in ['[Y/N]', '[YES/NO]', 'CONTINUE?']):
-                    self.logger.info(f"检测到确认提示，自动发送 'Y'")
-                    self.shell.send('Y\n')
-                    time.sleep(0.5)  # 等待响应
-                    
-            time.sleep(0.1)
-        
-        self.last_output = buffer
-        return False
+        result = read_until(
+            self.shell,
+            self._prompt_at_end,
+            timeout,
+            responses=self._auto_responses(),
+            encoding=self.encoding,
+            cancel=self.cancel
+        )
+        self.last_output = strip_pager_artifacts(result.output)
+        return result.matched
 
-    def connect(self) -> bool:
-        """建立SSH连接，优先从连接池获取"""
-        with self._pool_lock:
-            # 检查连接池中是否有可用连接
-            if self._connection_key in self._connection_pool:
-                try:
-                    self.ssh, self.shell = self._connection_pool[self._connection_key]
-                    # 测试连接是否还有效
-                    self.shell.send('\n')
-                    if self._wait_for_prompt(timeout=2):
-                        self.logger.info(f"从连接池获取连接: {self.ip}")
-                        return True
-                except:
-                    # 连接失效，从池中移除
-                    self._connection_pool.pop(self._connection_key, None)
-                    self.ssh = None
-                    self.shell = None
-
-        # 创建新连接
-        retry_count = 3
-        retry_delay = 2
-
-        for attempt in range(retry_count):
+    def _auto_responses(self) -> list:
+        """读取过程中的自动应答，由厂商驱动定义确认对话框和分页处理"""
+        return self.driver.auto_responses()
+
+    def _command_timeout(self, command: str) -> float:
+        """命令超时上限: 优先使用历史耗时学习到的值，否则使用驱动默认值"""
+        if self.latency_store:
+            learned = self.latency_store.timeout_for(self.ip, self.driver.name, command)
+            if learned:
+                return learned
+        return self.driver.command_timeout(command)
+
+    def _record_latency(self, command: str, elapsed: float, output: str = '') -> None:
+        # 指标只按命令分类统计，具体命令的耗时由 LatencyStore 记录
+        COMMAND_SECONDS.observe(elapsed, vendor=self.driver.name, command_class=command_class(command))
+        self._record_output_bytes(output)
+        if self.latency_store:
+            self.latency_store.record(self.ip, self.driver.name, command, elapsed)
+
+    def _record_output_bytes(self, output: str) -> None:
+        """按设备编码统计输出的字节数，中文等多字节字符不会少计"""
+        BYTES_TOTAL.inc(len(output.encode(self.encoding, errors='replace')), direction='command_output')
+
+    def _detect_driver(self, output: str) -> None:
+        """根据SSH版本串、登录横幅和提示符识别厂商驱动"""
+        if self.driver_name:
+            return
+        banner = ''
+        try:
+            transport = self.ssh.get_transport()
+            banner = f"{transport.remote_version or ''} {(transport.get_banner() or b'').decode('utf-8', 'replace')}"
+        except Exception:
+            pass
+        self.driver = detect_driver(banner, output)
+        self.logger.debug(f"设备 {self.ip} 使用驱动: {self.driver.name}")
+
+    def _disable_paging(self) -> bool:
+        """登录后关闭分页，长输出无需逐页翻页"""
+        command = self.driver.paging_command
+        if not command:
+            return False
+        self.shell.send(command + '\n')
+        if not self._wait_for_prompt(timeout=self.timeout):
+            self.logger.debug(f"设备 {self.ip} 关闭分页未返回提示符")
+            return False
+        if self.driver.rejected(self.last_output):
+            self.logger.debug(f"设备 {self.ip} 不支持 {command}，依靠分页检测")
+            return False
+        return True
+
+    def _prompt_at_end(self, buffer: str) -> bool:
+        """检查缓冲区末尾是否为当前会话的提示符"""
+        return bool(self.prompt_regex.search(buffer[-512:]))
+
+    def _learn_prompt(self, output: Optional[str] = None) -> bool:
+        """从真实提示符学习主机名并生成会话专用的提示符正则"""
+        if output is None:
+            self.prompt_regex = re.compile(GENERIC_PROMPT_PATTERN)
+            self.shell.send('\n')
+            if not self._wait_for_prompt(timeout=self.timeout):
+                return False
+            output = self.last_output
+
+        lines = [line for line in output.replace('\r', '\n').split('\n') if line.strip()]
+        hostname = self.driver.extract_hostname(lines[-1]) if lines else None
+        if not hostname:
+            self.logger.debug(f"设备 {self.ip} 未能识别提示符，使用通用匹配")
+            return False
+
+        self.hostname = hostname
+        self.prompt_line = lines[-1].strip()
+        self.prompt_regex = re.compile(self.driver.prompt_pattern(hostname))
+        self.logger.debug(f"设备 {self.ip} 提示符主机名: {hostname}")
+        return True
+
+    def connect(self, interactive: bool = True) -> bool:
+        """建立SSH连接，优先从连接池获取
+
+        Args:
+            interactive: False 时只建立传输不打开shell，用于exec通道模式
+        """
+        self.last_error = None
+        connect_start = time.monotonic()
+
+        # 检查连接池中是否有可用连接，验证在池锁之外进行
+        while interactive:
             try:
-                if self.ssh:
-                    self.close()
+                session = self._pool.acquire(self._connection_key, self.ip)
+            except TimeoutError as e:
+                self.logger.error(str(e))
+                self.last_error = 'timeout'
+                return False
+            if session is None:
+                POOL_REQUESTS.inc(pool='session', result='miss')
+                break  # 未命中，已预留名额
 
-                self.ssh = paramiko.SSHClient()
-                self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                
-                # 设置连接超时
-                socket.setdefaulttimeout(self.timeout)
-                
-                # 使用异步方式连接
-                transport = self.ssh.get_transport()
-                if transport:
-                    transport.set_keepalive(60)  # 启用心跳
-                
-                self.ssh.connect(
-                    self.ip,
-                    port=self.port,
-                    username=self.username,
-                    password=self.password,
-                    timeout=self.timeout,
-                    allow_agent=False,
-                    look_for_keys=False,
-                    banner_timeout=10
-                )
-
-                self.shell = self.ssh.invoke_shell(
-                    term='vt100',
-                    width=160,
-                    height=48
-                )
-                self.shell.settimeout(self.timeout)
-                
-                # 等待初始提示符
-                if self._wait_for_prompt(timeout=5):
-                    # 将有效连接添加到连接池
-                    with self._pool_lock:
-                        self._connection_pool[self._connection_key] = (self.ssh, self.shell)
+            self.ssh, self.shell = session.ssh, session.shell
+            try:
+                self.shell.send('\n')
+                if self._wait_for_prompt(timeout=2):
+                    self._detect_driver(self.last_output)
+                    self._learn_prompt(self.last_output)
+                    self._session = session
+                    self.connect_latency = time.monotonic() - connect_start
+                    POOL_REQUESTS.inc(pool='session', result='hit')
+                    SESSION_SETUP_SECONDS.observe(self.connect_latency, protocol='ssh')
+                    self.logger.info(f"从连接池获取连接: {self.ip}")
                     return True
-                else:
-                    raise Exception("等待提示符超时")
+            except Exception:
+                pass
+            # 连接失效，从池中移除
+            self._pool.discard(session)
+            self.ssh = None
+            self.shell = None
 
-            except AuthenticationException:
-                self.logger.error(f"设备 {self.ip} 认证失败")
-                break
-                
-            except (SSHException, socket.timeout) as e:
-                self.logger.error(f"SSH连接错误 {self.ip}: {str(e)}")
-                if attempt < retry_count - 1:
-                    time.sleep(retry_delay)
-                    
-            except Exception as e:
-                self.logger.error(f"连接设备 {self.ip} 失败: {str(e)}")
-                if attempt < retry_count - 1:
-                    time.sleep(retry_delay)
-                    
-            finally:
-                if not self.shell and self.ssh:
-                    self.close()
+        # 创建新连接，按设备共享的重试策略退避重试，连续失败的设备熔断后快速失败
+        try:
+            get_retry_manager().call(
+                f"{self.ip}:{self.port}",
+                lambda attempt: self._open_connection(interactive, attempt),
+                cancel=self.cancel
+            )
+            self.connect_latency = time.monotonic() - connect_start
+            SESSION_SETUP_SECONDS.observe(self.connect_latency, protocol='ssh')
+            return True
+
+        except CancelledError as e:
+            self.logger.warning(f"连接设备 {self.ip} 已取消: {str(e)}")
+            if interactive:
+                self._pool.cancel(self.ip)
+            raise
+
+        except CircuitOpenError as e:
+            self.logger.warning(str(e))
+            self.last_error = 'circuit_open'
 
+        except AuthenticationException as e:
+            self.logger.error(f"设备 {self.ip} 认证失败")
+            self.last_error = classify_error(e)
+
+        except (SSHException, socket.timeout) as e:
+            self.logger.error(f"SSH连接错误 {self.ip}: {str(e)}")
+            self.last_error = classify_error(e)
+
+        except Exception as e:
+            self.logger.error(f"连接设备 {self.ip} 失败: {str(e)}")
+            self.last_error = classify_error(e)
+
+        if interactive:
+            self._pool.cancel(self.ip)
         return False
 
-    def execute_command(self, command: str, wait_time: Optional[int] = None) -> str:
-        """执行单个命令"""
+    def _open_connection(self, interactive: bool, attempt: int) -> None:
+        """建立一次新连接，失败时抛出异常并清理"""
+        try:
+            if self.ssh:
+                self._disconnect()
+            if self.cancel:
+                self.cancel.check()
+            self.logger.debug(f"连接设备 {self.ip} (第 {attempt} 次)")
+
+            # 同一设备的shell/exec/SFTP通道共享一个已认证的传输，超时只作用于本连接的套接字
+            self.ssh = self._broker.acquire(
+                self.ip,
+                self.username,
+                self.password,
+                port=self.port,
+                timeout=self.timeout,
+                cancel=self.cancel
+            )
+            if not interactive:
+                return
+
+            self.shell = self.ssh.open_shell(
+                term='vt100',
+                width=160,
+                height=48
+            )
+            self.shell.settimeout(self.timeout)
+
+            # 等待初始提示符
+            if not self._wait_for_prompt(timeout=5):
+                raise Exception("等待提示符超时")
+            self._detect_driver(self.last_output)
+            self._learn_prompt(self.last_output)
+            self._disable_paging()
+            # 将有效连接登记到连接池
+            self._session = self._pool.add(self._connection_key, self.ip, self.ssh, self.shell)
+        except BaseException:
+            self._disconnect()
+            raise
+
+    def execute_command(
+        self,
+        command: str,
+        wait_time: Optional[int] = None,
+        on_output: Optional[Callable[[str], None]] = None
+    ) -> str:
+        """执行单个命令，检测到提示符即返回
+
+        Args:
+            on_output: 输出到达时的回调，用于实时显示
+        """
         try:
             if not self.shell:
                 raise Exception("SSH连接未建立")
@@ -146,68 +300,161 @@ class SSHManager:
             while self.shell.recv_ready():
                 self.shell.recv(65535)
             
+            # 修改主机名的命令会改变提示符，本次使用通用匹配
+            renames_host = self.driver.renames_host(command)
+            if renames_host:
+                self.prompt_regex = re.compile(GENERIC_PROMPT_PATTERN)
+            
             # 发送命令
             self.shell.send(command + '\n')
             
-            # 华为设备特殊处理
-            if command.lower() == 'sy' or command.lower() == 'system-view':
-                time.sleep(2)  # 等待系统视图切换
-                # 发送回车确认进入系统视图
-                self.shell.send('\n')
-                time.sleep(1)
-            
-            # 特殊命令处理
-            if command.lower().startswith(('sys', 'system-view')):
-                wait_time = wait_time or 5
-            elif any(cmd in command.lower() for cmd in ['reset', 'reboot', 'save']):
-                wait_time = wait_time or 10
-            else:
-                wait_time = wait_time or 3
+            # 超时时间只作为上限，提示符返回即结束
+            wait_time = wait_time or self._command_timeout(command)
             
-            # 收集输出
-            output = ""
-            start_time = time.time()
-            no_output_count = 0
+            # 收集输出，提示符出现在输出末尾即命令完成
+            start_time = time.monotonic()
+            result = read_until(
+                self.shell,
+                self._prompt_at_end,
+                wait_time,
+                responses=self._auto_responses(),
+                on_data=(lambda data: on_output(strip_pager_artifacts(data))) if on_output else None,
+                encoding=self.encoding,
+                cancel=self.cancel
+            )
+            output = strip_pager_artifacts(result.output)
+            self.last_output = output
+            # 超时的样本也记录，下次的上限随之增大
+            self._record_latency(command, time.monotonic() - start_time, output)
+            if result.matched:
+                if renames_host:
+                    self._learn_prompt(output)
+                return output.strip()
             
-            while time.time() - start_time < wait_time:
-                if self.shell.recv_ready():
-                    chunk = self.shell.recv(65535).decode('utf-8', errors='ignore')
-                    output += chunk
-                    no_output_count = 0  # 重置无输出计数
-                    
-                    # 检查是否需要确认
-                    if '[Y/N]' in chunk or '[yes/no]' in chunk:
-                        self.logger.info(f"检测到确认提示，自动发送 'Y'")
-                        time.sleep(0.5)
-                        self.shell.send('Y\n')
-                        time.sleep(1)
-                        continue
-                    
-                    # 检查是否出现提示符
-                    if '>' in chunk or '#' in chunk or ']' in chunk:
-                        return output.strip()
-                else:
-                    no_output_count += 1
-                    if no_output_count > 30:  # 如果连续3秒没有输出
-                        break
-                    time.sleep(0.1)
+            if renames_host:
+                self._learn_prompt()
             
             # 命令可能没有明显的提示符返回，返回收集到的所有输出
             if output:
+                self.logger.warning(f"命令 {command} 在 {wait_time} 秒内未返回提示符")
                 return output.strip()
             
             self.logger.warning(f"命令 {command} 没有返回任何输出")
             return "命令执行无响应"
             
+        except CancelledError:
+            raise
         except Exception as e:
             error_msg = f"执行命令失败: {str(e)}"
             self.logger.error(error_msg)
             return error_msg
 
-    def execute_commands(self, commands: List[str]) -> Dict[str, str]:
-        """执行多个命令"""
+    def exec_command(self, command: str, wait_time: Optional[int] = None) -> str:
+        """通过exec通道执行单条只读命令"""
+        return self.exec_commands([command], wait_time=wait_time, max_channels=1).get(command.strip(), "")
+
+    def exec_commands(
+        self,
+        commands: List[str],
+        wait_time: Optional[int] = None,
+        max_channels: int = 4,
+        on_event: Optional[Callable[[Dict], None]] = None
+    ) -> Dict[str, str]:
+        """在同一传输上并发执行多条只读命令
+
+        每条命令一个exec通道，以通道结束作为完成信号，不依赖提示符和等待。
+        通道由共享的 ChannelReader 统一读取。
+        """
+        if not self.ssh:
+            raise Exception("SSH连接未建立")
+
+        reader = get_channel_reader()
+        cond = threading.Condition()
+        pending = deque(cmd.strip() for cmd in commands if cmd.strip())
+        running = {}  # 序号 -> (命令, 通道, 输出块, 开始时间, 截止时间)
+        finished = set()
         results = {}
-        in_system_view = False
+        seq = 0
+
+        try:
+            while pending or running:
+                # 打开新通道直到达到并发上限
+                while pending and len(running) < max_channels:
+                    cmd = pending.popleft()
+                    self.logger.info(f"在设备 {self.ip} 上通过exec执行命令: {cmd}")
+                    self._emit(on_event, 'command_start', command=cmd)
+                    channel = self.ssh.open_exec(cmd)
+                    chunks = []
+                    start_time = time.monotonic()
+                    running[seq] = (cmd, channel, chunks, start_time,
+                                    start_time + (wait_time or self._command_timeout(cmd)))
+
+                    def on_data(data, cmd=cmd, chunks=chunks):
+                        chunks.append(data)
+                        self._emit(on_event, 'output', command=cmd, data=data)
+
+                    def on_close(index=seq):
+                        with cond:
+                            finished.add(index)
+                            cond.notify_all()
+
+                    reader.watch(channel, on_data, on_close, encoding=self.encoding)
+                    seq += 1
+
+                with cond:
+                    now = time.monotonic()
+                    done = [i for i in running if i in finished]
+                    expired = [i for i, item in running.items() if i not in finished and item[4] <= now]
+                    if not done and not expired:
+                        wait = min(item[4] for item in running.values()) - now
+                        if self.cancel:
+                            self.cancel.check()
+                            wait = min(wait, POLL_INTERVAL)
+                        cond.wait(wait)
+                        continue
+
+                for index in done + expired:
+                    cmd, channel, chunks, start_time, _ = running.pop(index)
+                    if index in expired:
+                        reader.unwatch(channel)
+                        self.logger.warning(f"命令 {cmd} exec通道超时")
+                    channel.close()
+                    output = ''.join(chunks).strip()
+                    results[cmd] = output or "命令执行无响应"
+                    self._record_latency(cmd, time.monotonic() - start_time, output)
+                    self._emit(on_event, 'command_end', command=cmd,
+                               elapsed=time.monotonic() - start_time, size=len(output))
+        finally:
+            for _, channel, _, _, _ in running.values():
+                reader.unwatch(channel)
+                try:
+                    channel.close()
+                except Exception:
+                    pass
+
+        # 按命令原始顺序返回
+        return {cmd.strip(): results[cmd.strip()] for cmd in commands if cmd.strip() in results}
+
+    def _emit(self, on_event: Optional[Callable[[Dict], None]], event_type: str, **fields) -> None:
+        """发送执行事件: command_start / output / command_end"""
+        if on_event:
+            fields.update({'type': event_type, 'ip': self.ip})
+            on_event(fields)
+
+    def execute_commands(
+        self,
+        commands: List[str],
+        on_event: Optional[Callable[[Dict], None]] = None,
+        wait_time: Optional[int] = None
+    ) -> Dict[str, str]:
+        """执行多个命令
+
+        Args:
+            on_event: 执行事件回调，依次收到 command_start、output、command_end
+            wait_time: 每条命令的等待上限，None 时按历史耗时或驱动默认值
+        """
+        results = {}
+        in_config = False
         
         for cmd in commands:
             cmd = cmd.strip()
@@ -216,40 +463,174 @@ class SSHManager:
                 
             self.logger.info(f"在设备 {self.ip} 上执行命令: {cmd}")
             
-            # 系统视图状态跟踪
-            if cmd.lower() in ['sy', 'system-view']:
-                in_system_view = True
-            elif cmd.lower() == 'quit' and in_system_view:
-                in_system_view = False
+            # 配置模式状态跟踪
+            if self.driver.enters_config(cmd):
+                in_config = True
+            elif cmd.lower() == self.driver.config_exit_command and in_config:
+                in_config = False
             
             # 执行命令
-            output = self.execute_command(cmd)
+            self._emit(on_event, 'command_start', command=cmd)
+            start_time = time.monotonic()
+            output = self.execute_command(
+                cmd,
+                wait_time=wait_time,
+                on_output=(lambda data, cmd=cmd: self._emit(on_event, 'output', command=cmd, data=data))
+                if on_event else None
+            )
             results[cmd] = output
+            self._emit(on_event, 'command_end', command=cmd,
+                       elapsed=time.monotonic() - start_time, size=len(output))
             
             # 检查命令执行结果
-            lower_output = output.lower()
-            if any(error in lower_output for error in ['error', 'failed', 'invalid', '无响应']):
+            if has_command_error(output):
                 self.logger.warning(f"命令可能执行失败: {cmd}")
                 self.logger.warning(f"输出: {output}")
-            
-            # 命令后等待
-            if cmd.lower() in ['sy', 'system-view']:
-                time.sleep(2)
-            elif 'save' in cmd.lower():
-                time.sleep(5)
-            elif in_system_view:
-                time.sleep(1)  # 系统视图下的命令多等待一下
-            else:
-                time.sleep(0.5)
                 
         return results
 
-    def close(self):
-        """关闭SSH连接"""
-        with self._pool_lock:
-            if self._connection_key in self._connection_pool:
-                self._connection_pool.pop(self._connection_key)
-        
+    def execute_pipelined(
+        self,
+        commands: List[str],
+        window: int = 20,
+        stop_on_error: bool = True,
+        on_event: Optional[Callable[[Dict], None]] = None,
+        wait_time: Optional[int] = None
+    ) -> Dict[str, str]:
+        """流水线执行配置命令
+
+        每次一次性写入 window 条命令，再按行首提示符把输出切回每条命令，
+        回显的命令用于核对归属。可能弹出确认的命令和修改主机名的命令
+        单独执行。stop_on_error 时某批出现错误后不再发送后续命令。
+        wait_time 为每条命令的等待上限，一批的上限为各条之和。
+        """
+        if not self.hostname:
+            # 未识别出主机名时无法可靠切分输出
+            return self.execute_commands(commands, on_event=on_event, wait_time=wait_time)
+
+        results = {}
+        batch = []
+        queue = [cmd.strip() for cmd in commands if cmd.strip()]
+
+        def flush() -> bool:
+            if not batch:
+                return True
+            ok = self._execute_burst(batch, results, on_event, wait_time)
+            batch.clear()
+            return ok or not stop_on_error
+
+        for cmd in queue:
+            if self.driver.needs_confirmation(cmd) or self.driver.renames_host(cmd):
+                if not flush():
+                    break
+                results.update(self.execute_commands([cmd], on_event=on_event, wait_time=wait_time))
+                if stop_on_error and has_command_error(results[cmd]):
+                    break
+                continue
+            batch.append(cmd)
+            if len(batch) >= window and not flush():
+                break
+        else:
+            flush()
+
+        return results
+
+    def _execute_burst(self, batch: List[str], results: Dict[str, str],
+                       on_event: Optional[Callable[[Dict], None]], wait_time: Optional[int] = None) -> bool:
+        """一次写入一批命令并切分输出，全部成功返回True"""
+        line_pattern = re.compile(self.driver.prompt_line_pattern(self.hostname))
+        prompt_lines = [0]
+        partial = [""]
+
+        def count_prompts(data: str) -> None:
+            # 统计完整行中的提示符，最后一个提示符在缓冲区末尾，由匹配条件判断
+            lines = (partial[0] + data).split('\n')
+            partial[0] = lines.pop()
+            prompt_lines[0] += sum(1 for line in lines if line_pattern.match(line))
+
+        def burst_done(tail: str) -> bool:
+            return prompt_lines[0] >= len(batch) - 1 and self._prompt_at_end(tail)
+
+        while self.shell.recv_ready():
+            self.shell.recv(65535)
+
+        for cmd in batch:
+            self.logger.info(f"在设备 {self.ip} 上流水线执行命令: {cmd}")
+            self._emit(on_event, 'command_start', command=cmd)
+        start_time = time.monotonic()
+        self.shell.send(''.join(cmd + '\n' for cmd in batch))
+
+        result = read_until(
+            self.shell,
+            burst_done,
+            sum(wait_time or self._command_timeout(cmd) for cmd in batch),
+            responses=[(PAGER_PATTERN, ' ')],
+            on_data=count_prompts,
+            encoding=self.encoding,
+            cancel=self.cancel
+        )
+        output = strip_pager_artifacts(result.output)
+        self.last_output = output
+        elapsed = time.monotonic() - start_time
+        # 一批命令共用一次读取，不计入单条命令的耗时分布
+        self._record_output_bytes(output)
+
+        # 第一条命令之前的提示符已在上一次读取中消费，之后每个行首提示符开始一条新命令
+        bounds = [0] + [m.start() for m in line_pattern.finditer(output)]
+        segments = [output[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+        segments.append(output[bounds[-1]:])
+
+        ok = result.matched
+        if not result.matched:
+            self.logger.warning(f"设备 {self.ip} 流水线命令在超时前未全部返回")
+
+        for index, cmd in enumerate(batch):
+            segment = segments[index] if index < len(segments) else ""
+            # 去掉段首的提示符，剩下回显 + 输出
+            segment = line_pattern.sub('', segment, count=1).strip()
+            if segment and not segment.startswith(cmd[:20]):
+                self.logger.warning(f"设备 {self.ip} 流水线输出与命令回显不一致: {cmd}")
+            output_text = segment or "命令执行无响应"
+            results[cmd] = output_text
+            self._emit(on_event, 'output', command=cmd, data=output_text + '\n')
+            self._emit(on_event, 'command_end', command=cmd, elapsed=elapsed, size=len(output_text))
+            if has_command_error(output_text):
+                ok = False
+                self.logger.warning(f"命令可能执行失败: {cmd}")
+                self.logger.warning(f"输出: {output_text}")
+
+        return ok
+
+    def close(self, discard: bool = False):
+        """释放SSH连接，健康的会话归还连接池以便复用"""
+        if self._session:
+            session, self._session = self._session, None
+            if not discard and self.shell and self._return_to_user_view():
+                self._pool.checkin(session)
+                self.logger.info(f"连接归还连接池: {self.ip}")
+            else:
+                self._pool.discard(session)
+                self.logger.info(f"关闭与设备 {self.ip} 的连接")
+            self.ssh = None
+            self.shell = None
+            return
+
+        self._disconnect()
+        self.logger.info(f"关闭与设备 {self.ip} 的连接")
+
+    def _return_to_user_view(self) -> bool:
+        """归还前退出系统视图/配置模式，避免下一个使用者处在配置模式"""
+        try:
+            tail = self.last_output.rstrip()[-256:]
+            if not self.driver.config_exit_command or not self.driver.is_config_prompt(tail):
+                return True
+            self.shell.send(self.driver.config_exit_command + '\n')
+            return self._wait_for_prompt(timeout=3)
+        except Exception:
+            return False
+
+    def _disconnect(self):
+        """直接关闭底层连接"""
         if self.shell:
             try:
                 self.shell.close()
@@ -263,19 +644,13 @@ class SSHManager:
             except:
                 pass
             self.ssh = None
-            
-        self.logger.info(f"关闭与设备 {self.ip} 的连接")
 
     @classmethod
     def clear_connection_pool(cls):
-        """清理连接池中的所有连接"""
-        with cls._pool_lock:
-            for ssh, shell in cls._connection_pool.values():
-                try:
-                    if shell:
-                        shell.close()
-                    if ssh:
-                        ssh.close()
-                except:
-                    pass
-            cls._connection_pool.clear() 
\ No newline at end of file
+        """清理连接池中的所有空闲连接"""
+        cls._pool.clear()
+
+    @classmethod
+    def get_pool_stats(cls) -> Dict:
+        """获取连接池统计信息"""
+        return cls._pool.get_stats()
@@ -0,0 +1,239 @@
+import errno
+import os
+import select
+import socket
+import threading
+import time
+import logging
+import paramiko
+from contextlib import contextmanager
+from typing import Dict, Optional
+from .cancellation import POLL_INTERVAL, CancelToken, CancelledError
+from .metrics import AUTH_SECONDS, CONNECT_SECONDS, POOL_REQUESTS
+
+
+def open_socket(ip: str, port: int, timeout: float, cancel: Optional[CancelToken] = None) -> socket.socket:
+    """建立TCP连接，等待期间可被取消打断，超时只作用于本套接字"""
+    if cancel:
+        timeout = cancel.remaining(timeout)
+    family, socktype, proto, _, address = socket.getaddrinfo(ip, port, 0, socket.SOCK_STREAM)[0]
+    sock = socket.socket(family, socktype, proto)
+    try:
+        sock.setblocking(False)
+        error = sock.connect_ex(address)
+        deadline = time.monotonic() + timeout
+        while error in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+            if cancel:
+                cancel.check()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout(f"连接 {ip}:{port} 超时")
+            _, writable, _ = select.select([], [sock], [], min(remaining, POLL_INTERVAL))
+            if writable:
+                error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error not in (0, errno.EISCONN):
+            raise OSError(error, os.strerror(error))
+        sock.settimeout(max(timeout, POLL_INTERVAL))
+        return sock
+    except Exception:
+        sock.close()
+        raise
+
+
+@contextmanager
+def _locked(lock: threading.Lock, cancel: Optional[CancelToken] = None):
+    """获取锁，等待其他线程登录期间可被取消打断"""
+    while not lock.acquire(timeout=POLL_INTERVAL):
+        if cancel:
+            cancel.check()
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+def _shutdown(sock: socket.socket) -> None:
+    """关闭套接字，唤醒阻塞在读写上的传输线程"""
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class DeviceTransport:
+    """一台设备上已认证的SSH传输，多个通道共享"""
+
+    def __init__(self, key: str, client: paramiko.SSHClient):
+        self.key = key
+        self.client = client
+        self.refcount = 0
+
+    @property
+    def transport(self) -> paramiko.Transport:
+        return self.client.get_transport()
+
+    def is_active(self) -> bool:
+        transport = self.client.get_transport()
+        return bool(transport and transport.is_active())
+
+    def close(self) -> None:
+        try:
+            self.client.close()
+        except Exception:
+            pass
+
+
+class TransportLease:
+    """使用者持有的传输引用，close() 只释放引用，最后一个引用释放时才断开"""
+
+    def __init__(self, broker: "TransportBroker", device: DeviceTransport):
+        self._broker = broker
+        self._device = device
+        self._released = False
+
+    def get_transport(self) -> paramiko.Transport:
+        return self._device.transport
+
+    def open_shell(self, term: str = 'vt100', width: int = 160, height: int = 48) -> paramiko.Channel:
+        """在共享传输上打开交互式shell通道"""
+        channel = self._device.transport.open_session()
+        channel.get_pty(term=term, width=width, height=height)
+        channel.invoke_shell()
+        return channel
+
+    def open_exec(self, command: str) -> paramiko.Channel:
+        """在共享传输上打开exec通道执行单条命令"""
+        channel = self._device.transport.open_session()
+        channel.set_combine_stderr(True)
+        channel.exec_command(command)
+        return channel
+
+    def open_sftp(self) -> paramiko.SFTPClient:
+        """在共享传输上打开SFTP通道"""
+        return paramiko.SFTPClient.from_transport(self._device.transport)
+
+    def close(self) -> None:
+        """释放引用"""
+        if not self._released:
+            self._released = True
+            self._broker.release(self._device)
+
+
+class TransportBroker:
+    """按设备复用已认证的SSH传输
+
+    同一设备的shell、exec、SFTP通道共用一个TCP连接，
+    密钥交换和AAA认证只做一次。
+    """
+
+    def __init__(self, keepalive: int = 60):
+        self.logger = logging.getLogger(__name__)
+        self.keepalive = keepalive
+        self._lock = threading.Lock()
+        self._devices: Dict[str, DeviceTransport] = {}
+        self._connect_locks: Dict[str, threading.Lock] = {}
+
+    def acquire(
+        self,
+        ip: str,
+        username: str,
+        password: str,
+        port: int = 22,
+        timeout: int = 10,
+        cancel: Optional[CancelToken] = None
+    ) -> TransportLease:
+        """获取设备的传输引用，没有可用传输时登录一次
+
+        cancel 取消时关闭正在握手或认证的套接字，登录立即中止。
+        """
+        key = f"{username}@{ip}:{port}"
+
+        with self._lock:
+            connect_lock = self._connect_locks.setdefault(key, threading.Lock())
+
+        # 同一设备的并发请求等待同一次登录，等待期间作业取消则立即返回
+        with _locked(connect_lock, cancel):
+            with self._lock:
+                device = self._devices.get(key)
+                if device and device.is_active():
+                    device.refcount += 1
+                    POOL_REQUESTS.inc(pool='transport', result='hit')
+                    self.logger.debug(f"复用设备传输: {ip}")
+                    return TransportLease(self, device)
+                if device:
+                    self._devices.pop(key, None)
+            POOL_REQUESTS.inc(pool='transport', result='miss')
+
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            sock = None
+            unregister = None
+            try:
+                started = time.monotonic()
+                sock = open_socket(ip, port, timeout, cancel)
+                connected = time.monotonic()
+                CONNECT_SECONDS.observe(connected - started, protocol='ssh')
+                unregister = cancel.on_cancel(lambda: _shutdown(sock)) if cancel else None
+                client.connect(
+                    ip,
+                    port=port,
+                    username=username,
+                    password=password,
+                    timeout=timeout,
+                    allow_agent=False,
+                    look_for_keys=False,
+                    banner_timeout=cancel.remaining(10) if cancel else 10,
+                    auth_timeout=cancel.remaining(timeout) if cancel else None,
+                    sock=sock
+                )
+                AUTH_SECONDS.observe(time.monotonic() - connected, protocol='ssh')
+                client.get_transport().set_keepalive(self.keepalive)  # 启用心跳
+            except Exception as e:
+                client.close()
+                if sock:
+                    sock.close()
+                if cancel and cancel.cancelled and not isinstance(e, CancelledError):
+                    raise CancelledError(cancel.reason) from e
+                raise
+            finally:
+                # 传输建立后由多个使用者共享，不再随本次作业取消而关闭
+                if unregister:
+                    unregister()
+
+            device = DeviceTransport(key, client)
+            with self._lock:
+                device.refcount = 1
+                self._devices[key] = device
+            self.logger.info(f"建立设备传输: {ip}")
+            return TransportLease(self, device)
+
+    def release(self, device: DeviceTransport) -> None:
+        """释放一个引用，无人使用时关闭传输"""
+        with self._lock:
+            device.refcount -= 1
+            if device.refcount > 0:
+                return
+            if self._devices.get(device.key) is device:
+                self._devices.pop(device.key, None)
+        device.close()
+
+    def close_all(self) -> None:
+        """关闭所有传输"""
+        with self._lock:
+            devices = list(self._devices.values())
+            self._devices.clear()
+        for device in devices:
+            device.close()
+
+
+_default_broker = None
+_default_broker_lock = threading.Lock()
+
+
+def get_transport_broker() -> TransportBroker:
+    """获取进程内共享的传输代理"""
+    global _default_broker
+    with _default_broker_lock:
+        if _default_broker is None:
+            _default_broker = TransportBroker()
+        return _default_broker
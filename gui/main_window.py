@@ -6,12 +6,36 @@ from PyQt5.QtGui import QPalette, QColor, QBrush, QPainter, QRegExpValidator
 from PyQt5.QtGui import QPixmap, QImage
 from .widgets import (DeviceTableWidget, CommandEditorWidget, 
                      FileTransferWidget, LogWidget, TopologyWidget)
-from core.command_executor import CommandExecutor
 from utils.config import ConfigManager
+import importlib
 import logging
 import json
+import os
+import sys
+import threading
+
+BACKGROUND_IMAGE = "sta/background.jpg"
+BACKGROUND_CACHE = "cache/background.png"  # 处理后的背景图，原图更新后重新生成
+BACKGROUND_ALPHA = 180  # 背景透明度(0-255)
+
+# 各标签页首次使用时需要的较重模块，切换到该标签页时在后台预先导入
+TAB_MODULES = {
+    "命令执行": ('core.job_service', 'core.result_sink'),
+    "文件传输": ('core.ftp_manager',),
+    "网络拓扑": ('networkx', 'core.topology_discovery', 'core.lldp_discovery', 'core.ssh_manager'),
+}
+
+
+def _import_modules(names) -> None:
+    for name in names:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logging.getLogger(__name__).debug(f"预先导入 {name} 失败: {str(e)}")
 
 class MainWindow(QMainWindow):
+    _background_pixmap = None  # 同一进程内复用处理后的背景图
+
     def __init__(self):
         super().__init__()
         self.config = ConfigManager()
@@ -34,17 +58,9 @@ class MainWindow(QMainWindow):
     def set_background(self):
         """设置背景图片"""
         try:
-            # 加载背景图片
-            background = QImage("sta/background.jpg")  # 请确保图片路径正确
-            # 创建半透明效果
-            painter = QPainter(background)
-            painter.setCompositionMode(QPainter.CompositionMode_DestinationIn)
-            painter.fillRect(background.rect(), QColor(0, 0, 0, 180))  # 180是透明度(0-255)
-            painter.end()
-            
             # 设置为背景
             palette = self.palette()
-            palette.setBrush(QPalette.Window, QBrush(QPixmap.fromImage(background)))
+            palette.setBrush(QPalette.Window, QBrush(self._load_background()))
             self.setPalette(palette)
             
             # 允许背景显示
@@ -52,6 +68,36 @@ class MainWindow(QMainWindow):
         except Exception as e:
             self.logger.error(f"设置背景图片失败: {str(e)}")
 
+    @classmethod
+    def _load_background(cls) -> QPixmap:
+        """加载半透明背景图，优先使用缓存，避免每次启动重新合成"""
+        if cls._background_pixmap is not None:
+            return cls._background_pixmap
+
+        try:
+            cached = os.path.getmtime(BACKGROUND_CACHE) >= os.path.getmtime(BACKGROUND_IMAGE)
+        except OSError:
+            cached = False
+        pixmap = QPixmap(BACKGROUND_CACHE) if cached else QPixmap()
+
+        if pixmap.isNull():
+            # 加载背景图片
+            background = QImage(BACKGROUND_IMAGE)  # 请确保图片路径正确
+            # 创建半透明效果
+            painter = QPainter(background)
+            painter.setCompositionMode(QPainter.CompositionMode_DestinationIn)
+            painter.fillRect(background.rect(), QColor(0, 0, 0, BACKGROUND_ALPHA))
+            painter.end()
+            try:
+                os.makedirs(os.path.dirname(BACKGROUND_CACHE), exist_ok=True)
+                background.save(BACKGROUND_CACHE, "PNG")
+            except OSError as e:
+                logging.getLogger(__name__).debug(f"保存背景缓存失败: {str(e)}")
+            pixmap = QPixmap.fromImage(background)
+
+        cls._background_pixmap = pixmap
+        return pixmap
+
     def setup_style(self):
         """设置窗口样式"""
         # 修改样式表，确保控件背景半透明
@@ -159,6 +205,7 @@ class MainWindow(QMainWindow):
         # 创建选项卡
         tab_widget = QTabWidget()
         layout.addWidget(tab_widget)
+        self.tab_widget = tab_widget
 
         # 设备管理选项卡
         self.device_tab = QWidget()
@@ -188,6 +235,9 @@ class MainWindow(QMainWindow):
         topology_layout.addWidget(self.topology_view)
         tab_widget.addTab(self.topology_tab, "网络拓扑")
 
+        # 切换标签页时在后台导入该页需要的模块
+        tab_widget.currentChanged.connect(self.preload_tab_modules)
+
         # 日志显示
         self.log_widget = LogWidget()
         layout.addWidget(self.log_widget)
@@ -205,6 +255,13 @@ class MainWindow(QMainWindow):
             change_machine_code_action = settings_menu.addAction("修改机器码")
             change_machine_code_action.triggered.connect(self.show_change_machine_code_dialog)
 
+    def preload_tab_modules(self, index: int):
+        """在后台线程导入标签页首次使用时需要的模块"""
+        names = [name for name in TAB_MODULES.get(self.tab_widget.tabText(index), ())
+                 if name not in sys.modules]
+        if names:
+            threading.Thread(target=_import_modules, args=(names,), name="TabPreload", daemon=True).start()
+
     def connect_signals(self):
         """连接信号和槽"""
         self.device_table.device_selected.connect(self.command_editor.set_device)
@@ -240,6 +297,13 @@ class MainWindow(QMainWindow):
     def closeEvent(self, event):
         """窗口关闭事件"""
         self.config.save_config()
+        # 只清理本次运行中用到过的模块，退出时不再导入
+        job_service = sys.modules.get('core.job_service')
+        if job_service:
+            job_service.shutdown_executor_service()
+        ssh_manager = sys.modules.get('core.ssh_manager')
+        if ssh_manager:
+            ssh_manager.SSHManager.clear_connection_pool()
         event.accept() 
 
     def show_change_machine_code_dialog(self):
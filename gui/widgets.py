@@ -5,24 +5,26 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableWidget,
                             QGraphicsItem, QGraphicsLineItem, QGraphicsTextItem,
                             QGraphicsRectItem, QGraphicsDropShadowEffect, QRadioButton,
                             QListWidgetItem)
-from PyQt5.QtCore import Qt, pyqtSignal, QThread, QRectF, QPointF
+from PyQt5.QtCore import Qt, pyqtSignal, QThread, QObject, QRectF, QPointF
 from PyQt5.QtGui import (QPainter, QPen, QBrush, QColor, QPainterPath,
-                        QImage, QPixmap, QRadialGradient)
+                        QImage, QPixmap, QRadialGradient, QTextCursor)
 import logging
+import threading
+import time
 import os
-from core.command_executor import CommandExecutor
-from core.ftp_manager import FTPManager
-from core.topology_discovery import TopologyDiscoveryThread
-import networkx as nx
 import math
 from typing import Dict, List
-from core.lldp_discovery import LLDPDiscovery
-from core.ssh_manager import SSHManager
+from core.cancellation import CancelToken
 import json
-import webbrowser
 from .resources import HTML_TEMPLATE
+
+# networkx、paramiko(SSH/SFTP)、拓扑扫描和LLDP模块较重，在首次使用时才导入，
+# MainWindow 切换到对应标签页时会在后台预先导入，见 main_window.TAB_MODULES
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+OUTPUT_MAX_LINES = 20000  # 输出窗口最多保留的行数
+RESULTS_DIR = 'results'  # 命令执行结果保存目录，每次执行一个JSONL文件
+
 class TopologyWidget(QWidget):
     def __init__(self):
         super().__init__()
@@ -30,7 +32,11 @@ class TopologyWidget(QWidget):
         self.setup_ui()
         self.devices = {}
         self.links = []
-        self.layout_engine = nx.spring_layout
+
+    @property
+    def layout_engine(self):
+        import networkx as nx
+        return nx.spring_layout
 
     def setup_ui(self):
         layout = QVBoxLayout(self)
@@ -81,6 +87,7 @@ class TopologyWidget(QWidget):
             progress_dialog.setAutoReset(True)
             
             # 创建拓扑发现线程
+            from core.topology_discovery import TopologyDiscoveryThread
             self.discovery_thread = TopologyDiscoveryThread()
             
             # 连接信号
@@ -128,6 +135,7 @@ class TopologyWidget(QWidget):
             self.scene.setBackgroundBrush(QColor(30, 30, 30))
 
             # 创建NetworkX图
+            import networkx as nx
             G = nx.Graph()
             for device_id, device in self.devices.items():
                 G.add_node(device_id, **device)
@@ -251,11 +259,18 @@ class TopologyWidget(QWidget):
             progress.setWindowTitle("LLDP拓扑发现")
             progress.setWindowModality(Qt.WindowModal)
             
-            # 创建线程池
-            with ThreadPoolExecutor(max_workers=min(len(devices), 10)) as executor:
+            # 创建线程池，实际并发由自适应控制器限制
+            from core.concurrency import AIMDController, configured_max_threads
+            max_threads = configured_max_threads()
+            concurrency = AIMDController(
+                initial=max(1, max_threads // 2),
+                max_limit=max_threads,
+                name="LLDP发现"
+            )
+            with ThreadPoolExecutor(max_workers=min(len(devices), max_threads)) as executor:
                 # 存储所有任务的Future对象
                 future_to_device = {
-                    executor.submit(self._discover_device_topology, device): device
+                    executor.submit(self._discover_device_topology, device, concurrency): device
                     for device in devices
                 }
                 
@@ -320,8 +335,10 @@ class TopologyWidget(QWidget):
             self.logger.error(f"LLDP拓扑发现失败: {str(e)}")
             QMessageBox.critical(self, "错误", f"LLDP拓扑发现失败: {str(e)}")
 
-    def _discover_device_topology(self, device):
+    def _discover_device_topology(self, device, concurrency=None):
         """在单独的线程中发现单个设备的拓扑"""
+        from core.lldp_discovery import LLDPDiscovery
+        from core.ssh_manager import SSHManager
         try:
             ssh = SSHManager(
                 device['ip'],
@@ -330,11 +347,20 @@ class TopologyWidget(QWidget):
                 port=int(device.get('port', 22))
             )
             
-            if ssh.connect():
-                lldp = LLDPDiscovery(ssh)
-                topology = lldp.parse_lldp_topology()
-                ssh.close()
-                return topology
+            if concurrency:
+                concurrency.acquire()
+            try:
+                connected = ssh.connect()
+                if concurrency:
+                    concurrency.record(ssh.last_error, ssh.connect_latency, key=device['ip'])
+                if connected:
+                    lldp = LLDPDiscovery(ssh)
+                    topology = lldp.parse_lldp_topology()
+                    ssh.close()
+                    return topology
+            finally:
+                if concurrency:
+                    concurrency.release()
             return None
             
         except Exception as e:
@@ -377,6 +403,7 @@ class TopologyWidget(QWidget):
             print("Links:", json.dumps(self.links, indent=2))
 
             # 创建NetworkX图
+            import networkx as nx
             G = nx.Graph()
             
             # 添加节点
@@ -500,6 +527,7 @@ class TopologyWidget(QWidget):
             print(html_content[:1000])
             
             # 在默认浏览器中打开
+            import webbrowser
             webbrowser.open(f'file://{temp_file}')
             
         except Exception as e:
@@ -737,7 +765,8 @@ class CommandEditorWidget(QWidget):
     def __init__(self):
         super().__init__()
         self.setup_ui()
-        self.execution_thread = None
+        self.execution_job = None
+        self.last_sink = None  # 最近一次执行的结果输出，查看时通过 reader() 读取
 
     def setup_ui(self):
         layout = QVBoxLayout(self)
@@ -760,6 +789,7 @@ class CommandEditorWidget(QWidget):
         # 输出显示区
         self.output_text = QTextEdit()
         self.output_text.setReadOnly(True)
+        self.output_text.document().setMaximumBlockCount(OUTPUT_MAX_LINES)  # 限制显示行数
         layout.addWidget(self.output_text)
 
         # 按钮区
@@ -769,9 +799,11 @@ class CommandEditorWidget(QWidget):
         self.save_btn = QPushButton("保存命令")
         self.cancel_btn = QPushButton("取消执行")
         self.cancel_btn.setEnabled(False)
+        self.results_btn = QPushButton("查看结果")
         
         btn_layout.addWidget(self.execute_btn)
         btn_layout.addWidget(self.cancel_btn)
+        btn_layout.addWidget(self.results_btn)
         btn_layout.addWidget(self.load_btn)
         btn_layout.addWidget(self.save_btn)
         layout.addLayout(btn_layout)
@@ -779,6 +811,7 @@ class CommandEditorWidget(QWidget):
         # 连接信号
         self.execute_btn.clicked.connect(self.execute_commands)
         self.cancel_btn.clicked.connect(self.cancel_execution)
+        self.results_btn.clicked.connect(self.show_results)
         self.load_btn.clicked.connect(self.load_commands)
         self.save_btn.clicked.connect(self.save_commands)
         self.select_device_btn.clicked.connect(self.select_device)
@@ -824,18 +857,16 @@ class CommandEditorWidget(QWidget):
                 self.cancel_btn.setEnabled(True)
                 self.output_text.clear()
 
-                # 创建多个执行线程
-                self.execution_threads = []
-                for device in selected_devices:
-                    thread = CommandExecutionThread(
-                        device,
-                        commands,
-                        self.command_output,
-                        self.execution_finished
-                    )
-                    thread.finished.connect(self.on_thread_finished)
-                    self.execution_threads.append(thread)
-                    thread.start()
+                # 所有设备作为一个作业提交到共享的执行服务
+                self.execution_job = CommandExecutionJob(
+                    selected_devices,
+                    commands,
+                    self.command_output,
+                    self.execution_finished
+                )
+                self.execution_job.output_chunk.connect(self.append_output_chunk)
+                self.execution_job.finished.connect(self.on_job_finished)
+                self.execution_job.start()
 
             except Exception as e:
                 self.execution_finished.emit(False, f"执行出错: {str(e)}")
@@ -844,23 +875,41 @@ class CommandEditorWidget(QWidget):
 
     def cancel_execution(self):
         """取消所有执行"""
-        if hasattr(self, 'execution_threads'):
-            for thread in self.execution_threads:
-                if thread.isRunning():
-                    thread.stop()
-                    thread.wait()
+        if self.execution_job:
+            self.execution_job.stop()
             self.execution_finished.emit(False, "用户取消执行")
             self.execute_btn.setEnabled(True)
             self.cancel_btn.setEnabled(False)
 
-    def on_thread_finished(self):
-        """单个线程完成的处理"""
-        if hasattr(self, 'execution_threads'):
-            all_finished = all(not thread.isRunning() for thread in self.execution_threads)
-            if all_finished:
-                self.execute_btn.setEnabled(True)
-                self.cancel_btn.setEnabled(False)
-                self.execution_threads = []
+    def on_job_finished(self):
+        """作业完成的处理"""
+        if self.sender() is not self.execution_job:
+            return  # 已取消的旧作业
+        if self.execution_job.sink:
+            self.last_sink = self.execution_job.sink
+        self.execute_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        self.execution_job = None
+
+    def show_results(self):
+        """查看最近一次或选择的结果文件，设备的完整输出在选中时才读取"""
+        try:
+            if self.last_sink and os.path.exists(self.last_sink.path):
+                path, reader = self.last_sink.path, self.last_sink.reader()
+            else:
+                path, _ = QFileDialog.getOpenFileName(
+                    self,
+                    "打开执行结果",
+                    RESULTS_DIR,
+                    "结果文件 (*.jsonl *.db);;所有文件 (*.*)"
+                )
+                if not path:
+                    return
+                from core.result_sink import open_results
+                reader = open_results(path)
+            ResultViewerDialog(reader, path, self).exec_()
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"打开结果失败: {str(e)}")
 
     def update_output(self, text):
         """更新输出显示"""
@@ -869,6 +918,15 @@ class CommandEditorWidget(QWidget):
         scrollbar = self.output_text.verticalScrollBar()
         scrollbar.setValue(scrollbar.maximum())
 
+    def append_output_chunk(self, ip, text):
+        """追加设备的实时输出，每行加设备前缀"""
+        lines = text.replace('\r', '').strip('\n').split('\n')
+        cursor = self.output_text.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertPlainText('\n' + '\n'.join(f"[{ip}] {line}" for line in lines))
+        scrollbar = self.output_text.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum())
+
     def load_commands(self):
         """加载命令文件"""
         file_name, _ = QFileDialog.getOpenFileName(
@@ -899,45 +957,150 @@ class CommandEditorWidget(QWidget):
             except Exception as e:
                 QMessageBox.warning(self, "错误", f"保存文件失败: {str(e)}")
 
-class CommandExecutionThread(QThread):
-    def __init__(self, device, commands, output_signal, finished_signal):
+class CommandExecutionJob(QObject):
+    """把多设备作业提交到共享的执行服务，并把事件转成界面信号
+
+    回调在执行服务的工作线程中调用，信号跨线程排队发送到界面线程。
+    """
+    output_chunk = pyqtSignal(str, str)  # 实时输出片段(设备IP, 完整的若干行)
+    finished = pyqtSignal()
+
+    def __init__(self, devices, commands, output_signal, finished_signal):
         super().__init__()
-        self.device = device
+        self.devices = devices
         self.commands = commands
         self.output_signal = output_signal
         self.finished_signal = finished_signal
-        self._stop = False
+        self.job = None
+        self.sink = None
+        self._lock = threading.Lock()
+        self._pending_chunks: Dict[str, List[str]] = {}  # 每台设备单独缓存，并发设备的输出不会混在一起
+        self._pending_size: Dict[str, int] = {}
+        self._last_flush: Dict[str, float] = {}
+
+    def start(self):
+        """提交作业，立即返回"""
+        def progress_callback(completed, total):
+            self.output_signal.emit(f"执行进度: {completed}/{total}")
 
-    def run(self):
-        executor = CommandExecutor()
         try:
-            def progress_callback(completed, total):
-                self.output_signal.emit(f"执行进度: {completed}/{total}")
-
-            executor.set_progress_callback(progress_callback)
-            
-            result = executor.batch_execute(
-                [self.device],
-                {self.device['ip']: self.commands}
+            from core.job_service import get_executor_service
+            from core.result_sink import create_sink
+
+            # 完整输出随设备完成写入文件，内存中只保留摘要
+            self.sink = create_sink(os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d_%H%M%S')}.jsonl"))
+            self.job = get_executor_service().submit(
+                self.devices,
+                {device['ip']: self.commands for device in self.devices},
+                on_event=self.on_event,
+                on_progress=progress_callback,
+                on_done=self.on_done,
+                sink=self.sink
             )
-            
-            device_result = result.get(self.device['ip'], {})
-            if device_result.get('status') == 'success':
-                # 显示每个命令的输出
-                for cmd, output in device_result.get('commands', {}).items():
-                    self.output_signal.emit(f"\n执行命令: {cmd}")
-                    self.output_signal.emit(output)
-                self.finished_signal.emit(True, "命令执行成功")
-            else:
-                error = device_result.get('error', '未知错误')
-                self.finished_signal.emit(False, f"执行失败: {error}")
-                
         except Exception as e:
             self.finished_signal.emit(False, str(e))
+            self.finished.emit()
+
+    def on_done(self, job):
+        """作业结束，汇总各设备结果"""
+        with self._lock:
+            for ip in list(self._pending_chunks):
+                self.flush_output(ip, force=True)
+        self.sink.close()
+        self.output_signal.emit(f"执行结果已保存: {self.sink.path}")
+        if not job.cancelled:
+            failed = [ip for ip, result in job.results.items() if result['status'] != 'success']
+            if failed:
+                self.finished_signal.emit(False, f"执行失败: {len(failed)}/{len(job.devices)} 台设备")
+            else:
+                self.finished_signal.emit(True, "命令执行成功")
+        self.finished.emit()
+
+    def on_event(self, event):
+        """处理执行事件，输出片段合并后再发给界面"""
+        with self._lock:
+            self._handle_event(event)
+
+    def _handle_event(self, event):
+        event_type = event['type']
+        ip = event.get('ip')
+        if event_type == 'output':
+            self._pending_chunks.setdefault(ip, []).append(event['data'])
+            self._pending_size[ip] = self._pending_size.get(ip, 0) + len(event['data'])
+            if self._pending_size[ip] >= 4096 or time.monotonic() - self._last_flush.get(ip, 0.0) >= 0.1:
+                self.flush_output(ip)
+        elif event_type == 'command_start':
+            self.flush_output(ip, force=True)
+            self.output_signal.emit(f"\n[{ip}] 执行命令: {event['command']}")
+        elif event_type == 'command_end':
+            self.flush_output(ip, force=True)
+            self.output_signal.emit(
+                f"[{event['ip']}] 命令完成: {event['command']} ({event['elapsed']:.2f}秒)"
+            )
+        elif event_type == 'device_end':
+            self.flush_output(ip, force=True)
+            if event['status'] == 'success':
+                self.output_signal.emit(f"[{event['ip']}] 设备执行完成")
+            else:
+                self.output_signal.emit(f"[{event['ip']}] 设备执行失败: {event['error'] or '未知错误'}")
+
+    def flush_output(self, ip: str, force: bool = False):
+        """发送设备缓存的完整行，调用方持有 _lock
+
+        未结束的行留到下次发送，界面按行加设备前缀；force 时全部发送。
+        """
+        text = ''.join(self._pending_chunks.pop(ip, []))
+        if not force and '\n' in text:
+            text, rest = text.rsplit('\n', 1)
+            if rest:
+                self._pending_chunks[ip] = [rest]
+        elif not force and len(text) < 4096:  # 超长的单行直接发送
+            self._pending_chunks[ip] = [text]
+            text = ''
+        self._pending_size[ip] = sum(len(chunk) for chunk in self._pending_chunks.get(ip, []))
+        if text.strip('\r\n'):
+            self.output_chunk.emit(ip, text)
+        self._last_flush[ip] = time.monotonic()
 
     def stop(self):
         """停止执行"""
-        self._stop = True
+        if self.job:
+            self.job.cancel()
+
+class ResultViewerDialog(QDialog):
+    """按设备查看已保存的执行结果，列表只含设备IP，选中时通过 reader 读取该设备的完整输出"""
+
+    def __init__(self, reader, path, parent=None):
+        super().__init__(parent)
+        self.reader = reader
+        self.setWindowTitle(f"执行结果 - {os.path.basename(path)}")
+        self.resize(900, 600)
+
+        layout = QHBoxLayout(self)
+        self.device_list = QListWidget()
+        self.device_list.setMaximumWidth(200)
+        self.device_list.addItems(reader.ips())
+        self.output_text = QTextEdit()
+        self.output_text.setReadOnly(True)
+        layout.addWidget(self.device_list)
+        layout.addWidget(self.output_text)
+
+        self.device_list.currentTextChanged.connect(self.show_device)
+        if self.device_list.count():
+            self.device_list.setCurrentRow(0)
+
+    def show_device(self, ip):
+        """显示一台设备的完整结果"""
+        result = self.reader.get(ip) if ip else None
+        if not result:
+            self.output_text.clear()
+            return
+        lines = [f"设备: {ip}", f"状态: {result.get('status')}"]
+        if result.get('error'):
+            lines.append(f"错误: {result['error']}")
+        for command, output in result.get('commands', {}).items():
+            lines.append(f"\n[{ip}] 执行命令: {command}\n{output}")
+        self.output_text.setPlainText('\n'.join(lines))
 
 class FileTransferWidget(QWidget):
     transfer_started = pyqtSignal()
@@ -1060,6 +1223,7 @@ class FileTransferWidget(QWidget):
             
         device = self.selected_devices[0]
         try:
+            from core.ftp_manager import FTPManager
             ftp = FTPManager(device['ip'], device['username'], device['password'], port=int(device['port']))
             if ftp.connect():
                 files = ftp.list_remote_files(path)
@@ -1085,6 +1249,7 @@ class FileTransferWidget(QWidget):
             
         device = self.selected_devices[0]
         try:
+            from core.ftp_manager import FTPManager
             ftp = FTPManager(
                 device['ip'], 
                 device['username'], 
@@ -1284,15 +1449,18 @@ class FileTransferThread(QThread):
         self.remote_file = remote_file
         self.local_file = local_file
         self.is_download = is_download
-        self._stop = False
+        self._cancel = CancelToken()
 
     def run(self):
         try:
+            from core.ftp_manager import FTPManager
             ftp = FTPManager(
                 self.device['ip'], 
                 self.device['username'], 
                 self.device['password'],
-                port=int(self.device.get('port', 22))
+                port=int(self.device.get('port', 22)),
+                device=self.device,
+                cancel=self._cancel
             )
             
             def progress_callback(filename, current, total):
@@ -1324,7 +1492,7 @@ class FileTransferThread(QThread):
                 else:
                     # 上传多个文件
                     for file_path in self.files:
-                        if self._stop:
+                        if self._cancel.cancelled:
                             break
                             
                         remote_file = os.path.join(self.remote_path, os.path.basename(file_path))
@@ -1363,8 +1531,8 @@ class FileTransferThread(QThread):
             )
 
     def stop(self):
-        """停止传输"""
-        self._stop = True
+        """停止传输，正在进行的连接或文件传输在1秒内中止"""
+        self._cancel.cancel()
 
 # 还需要添加 LogWidget 类
 class LogWidget(QWidget):
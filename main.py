@@ -1,11 +1,16 @@
 import sys
 import warnings
-from gui.main_window import MainWindow
-from gui.login_dialog import LoginDialog
-from utils.logger import setup_logger
-from PyQt5.QtWidgets import QApplication
+from utils.startup_timer import StartupTimer
 
 def main():
+    # --startup-report 时统计各模块导入耗时，在窗口可交互后输出
+    startup_timer = StartupTimer.from_args(sys.argv)
+
+    from utils.logger import setup_logger
+    from PyQt5.QtCore import QTimer
+    from PyQt5.QtWidgets import QApplication
+    from gui.login_dialog import LoginDialog
+
     # 设置日志
     logger = setup_logger()
     logger.info("启动网络自动化配置工具")
@@ -19,17 +24,29 @@ def main():
     app.setStyle('Fusion')  # 使用Fusion风格，更现代的外观
     
     # 显示登录对话框
+    startup_timer.mark("显示登录对话框")
     login_dialog = LoginDialog()
     if login_dialog.exec_() != LoginDialog.Accepted:
         sys.exit(0)
     
+    # 登录后才导入主窗口，各标签页的重模块在首次使用时导入
+    startup_timer.mark("登录完成")
+    from gui.main_window import MainWindow
+    from core.metrics import start_metrics_server
+
+    # 配置了 settings.metrics.port 时在本机提供 /metrics
+    start_metrics_server()
+
     # 创建主窗口
     window = MainWindow()
     window.setWindowTitle("网络自动化工具       作者：LXX")
     window.show()
+    startup_timer.mark("主窗口创建")
+    # 事件循环开始处理后窗口即可交互
+    QTimer.singleShot(0, lambda: (startup_timer.mark("主窗口可交互"), startup_timer.report()))
     
     # 运行应用
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
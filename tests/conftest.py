@@ -0,0 +1,69 @@
+import os
+import socket
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeChannel:
+    """用 socketpair 模拟 paramiko Channel，测试中由 feed() 写入设备输出"""
+
+    def __init__(self):
+        self._sock, self._remote = socket.socketpair()
+        self.closed = False
+        self.eof_received = False
+        self.sent = []
+        self.on_send = None  # 收到应答时模拟设备的回调
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def recv_ready(self):
+        if self.eof_received:
+            return False
+        self._sock.setblocking(False)
+        try:
+            data = self._sock.recv(1, socket.MSG_PEEK)
+        except BlockingIOError:
+            return False
+        finally:
+            self._sock.setblocking(True)
+        if not data:
+            self.eof_received = True  # paramiko 由传输线程设置
+        return bool(data)
+
+    def recv(self, size):
+        data = self._sock.recv(size)
+        if not data:
+            self.eof_received = True
+        return data
+
+    def send(self, data):
+        self.sent.append(data)
+        if self.on_send:
+            self.on_send(data)
+        return len(data)
+
+    def feed(self, text):
+        self._remote.sendall(text.encode('utf-8'))
+
+    def close_remote(self):
+        self._remote.close()
+
+    def close(self):
+        self.closed = True
+        self._sock.close()
+        try:
+            self._remote.close()
+        except OSError:
+            pass
+
+
+@pytest.fixture
+def channel():
+    chan = FakeChannel()
+    yield chan
+    if not chan.closed:
+        chan.close()
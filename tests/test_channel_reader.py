@@ -0,0 +1,97 @@
+import re
+import threading
+import time
+
+import pytest
+
+from core.cancellation import CancelToken, CancelledError
+from core.channel_reader import ChannelReader, read_until
+from core.drivers import get_driver
+
+PROMPT = re.compile(r'<HW>\s*$')
+
+
+def test_read_until_prompt_across_chunks(channel):
+    channel.feed('display version\r\nVRP ')
+    threading.Timer(0.05, channel.feed, ('software\r\n<H',)).start()
+    threading.Timer(0.1, channel.feed, ('W>',)).start()
+    result = read_until(channel, PROMPT, timeout=2)
+    assert result.matched
+    assert result.output == 'display version\r\nVRP software\r\n<HW>'
+
+
+def test_read_until_timeout_returns_partial_output(channel):
+    channel.feed('partial output')
+    start = time.monotonic()
+    result = read_until(channel, PROMPT, timeout=0.2)
+    assert not result.matched
+    assert result.output == 'partial output'
+    assert time.monotonic() - start < 1
+
+
+def test_read_until_closed_channel(channel):
+    channel.feed('bye\r\n')
+    channel.close_remote()
+    result = read_until(channel, PROMPT, timeout=2)
+    assert result.closed
+    assert result.output == 'bye\r\n'
+
+
+def test_multibyte_character_split_between_chunks(channel):
+    data = '设备\r\n<HW>'.encode('utf-8')
+    channel._remote.sendall(data[:4])
+    threading.Timer(0.05, channel._remote.sendall, (data[4:],)).start()
+    result = read_until(channel, PROMPT, timeout=2)
+    assert result.output == '设备\r\n<HW>'
+
+
+def test_dialog_is_answered_once(channel):
+    # 设备回显应答的换行后才输出提示符，回显不能让同一个对话框再次应答
+    def device(reply):
+        channel.feed('\r\n')
+        threading.Timer(0.05, channel.feed, ('Info: saved.\r\n<HW>',)).start()
+
+    channel.on_send = device
+    channel.feed('save\r\nPlease input the file name(*.cfg)[flash:/vrpcfg.cfg]:')
+    result = read_until(channel, PROMPT, timeout=2, responses=get_driver('huawei').auto_responses())
+    assert result.matched
+    assert channel.sent == ['\n']
+
+
+def test_pager_is_answered_for_each_page(channel):
+    def device(reply):
+        if len(channel.sent) == 1:
+            channel.feed('\r\npage 2\r\n  ---- More ----')
+        else:
+            channel.feed('\r\npage 3\r\n<HW>')
+
+    channel.on_send = device
+    channel.feed('page 1\r\n  ---- More ----')
+    result = read_until(channel, PROMPT, timeout=2, responses=get_driver('huawei').auto_responses())
+    assert result.matched
+    assert channel.sent == [' ', ' ']
+
+
+def test_read_until_cancel(channel):
+    token = CancelToken()
+    threading.Timer(0.1, token.cancel).start()
+    start = time.monotonic()
+    with pytest.raises(CancelledError):
+        read_until(channel, PROMPT, timeout=10, cancel=token)
+    assert time.monotonic() - start < 2
+
+
+def test_channel_reader_delivers_chunks_and_close(channel):
+    reader = ChannelReader()
+    received = []
+    closed = threading.Event()
+    reader.watch(channel, on_data=received.append, on_close=closed.set)
+    channel.feed('hello ')
+    channel.feed('world')
+    deadline = time.monotonic() + 2
+    while ''.join(received) != 'hello world' and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert ''.join(received) == 'hello world'
+    channel.close_remote()
+    assert closed.wait(2)
+    reader.stop()
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from core import cli
+from core.command_executor import CommandExecutor
+from core.job_journal import JobJournal
+
+DEVICES = [{'ip': f'10.0.0.{index}', 'username': 'u', 'password': 'p', 'port': 22} for index in (1, 2, 3)]
+COMMAND_MAP = {device['ip']: ['display version'] for device in DEVICES}
+
+
+@pytest.fixture
+def executed(monkeypatch, tmp_path):
+    """不连接设备，记录实际执行的设备"""
+    monkeypatch.chdir(tmp_path)
+    ran = []
+
+    def execute_device_commands(self, ip, username, password, commands, port=22, timeout=None,
+                                driver=None, device=None):
+        ran.append(ip)
+        if self.journal:
+            self.journal.device_start(ip)
+            for command in commands:
+                self.journal.command_done(ip, command)
+            self.journal.device_end(ip, 'success', expected=len(commands))
+        result = {'ip': ip, 'status': 'success', 'error': None,
+                  'commands': {command: '<HW>' for command in commands}}
+        with self._lock:
+            self.results[ip] = result
+        return result
+
+    monkeypatch.setattr(CommandExecutor, 'execute_device_commands', execute_device_commands)
+    return ran
+
+
+def _journal_with_finished(path, finished):
+    journal = JobJournal(str(path))
+    journal.start_job(DEVICES, COMMAND_MAP)
+    for ip in finished:
+        journal.device_start(ip)
+        journal.command_done(ip, 'display version')
+        journal.device_end(ip, 'success', expected=1)
+    journal.close()
+
+
+def test_resume_returns_every_device(executed, tmp_path):
+    path = tmp_path / 'job.jsonl'
+    _journal_with_finished(path, ['10.0.0.1'])
+    executor = CommandExecutor(max_threads=2, adaptive_timeout=False)
+    results = executor.resume(str(path), DEVICES, COMMAND_MAP)
+    executor.journal.close()
+
+    assert sorted(executed) == ['10.0.0.2', '10.0.0.3']
+    assert sorted(results) == ['10.0.0.1', '10.0.0.2', '10.0.0.3']
+    assert results['10.0.0.1']['resumed']
+    assert JobJournal.load(str(path)).remaining_commands('10.0.0.2') == []
+
+
+def test_cli_clean_resume_exits_zero(executed, tmp_path, capsys):
+    inventory = tmp_path / 'devices.txt'
+    inventory.write_text(''.join(f"{device['ip']},u,p,22\n" for device in DEVICES), encoding='utf-8')
+    journal = tmp_path / 'job.jsonl'
+    _journal_with_finished(journal, ['10.0.0.1', '10.0.0.2'])
+
+    code = cli.main(['run', '-i', str(inventory), '-c', 'display version',
+                     '--journal', str(journal), '--resume'])
+    assert code == 0
+    assert executed == ['10.0.0.3']
+    emitted = [json.loads(line)['ip'] for line in capsys.readouterr().out.splitlines()]
+    assert sorted(emitted) == ['10.0.0.1', '10.0.0.2', '10.0.0.3']
+
+
+def test_cli_run_reports_failed_device(monkeypatch, executed, tmp_path, capsys):
+    inventory = tmp_path / 'devices.txt'
+    inventory.write_text('10.0.0.1,u,p,22\n', encoding='utf-8')
+    original = CommandExecutor.execute_device_commands
+
+    def failing(self, ip, *args, **kwargs):
+        result = original(self, ip, *args, **kwargs)
+        result['status'] = 'failed'
+        return result
+
+    monkeypatch.setattr(CommandExecutor, 'execute_device_commands', failing)
+    assert cli.main(['run', '-i', str(inventory), '-c', 'display version']) == 1
@@ -0,0 +1,58 @@
+import socket
+import threading
+
+from paramiko.ssh_exception import AuthenticationException
+
+from core.concurrency import AIMDController, classify_error
+
+
+def test_classify_error():
+    assert classify_error(None) is None
+    assert classify_error(socket.timeout()) == 'timeout'
+    assert classify_error(ConnectionResetError()) == 'reset'
+    assert classify_error(AuthenticationException('Authentication failed.')) == 'credentials'
+    assert classify_error(AuthenticationException('Authentication timeout.')) == 'auth'
+    assert classify_error(Exception('Error reading SSH protocol banner')) == 'reset'
+    assert classify_error(Exception('no route to host')) == 'other'
+
+
+def test_limit_grows_on_success():
+    controller = AIMDController(initial=2, max_limit=4)
+    for _ in range(10):
+        controller.record(None, latency=0.1, key='10.0.0.1')
+    assert controller.limit == 4
+
+
+def test_one_failing_device_does_not_reduce_limit():
+    controller = AIMDController(initial=8, max_limit=8, cooldown=0)
+    for _ in range(20):
+        controller.record('timeout', key='10.0.0.1')
+        controller.record(AuthenticationException('Authentication failed.'), key='10.0.0.2')
+    assert controller.limit == 8
+    assert controller.get_stats()['errors'] == 20
+
+
+def test_congestion_across_devices_halves_limit():
+    controller = AIMDController(initial=8, max_limit=8, min_devices=3, cooldown=60)
+    for ip in ('10.0.0.1', '10.0.0.2', '10.0.0.3', '10.0.0.4'):
+        controller.record('timeout', key=ip)
+    assert controller.limit == 4  # 冷却期内只减一次
+
+
+def test_rare_congestion_below_ratio_is_ignored():
+    controller = AIMDController(initial=8, max_limit=8, min_devices=3, congestion_ratio=0.5)
+    for index in range(20):
+        controller.record(None, latency=0.1, key=f'10.0.1.{index}')
+    for ip in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+        controller.record('reset', key=ip)
+    assert controller.limit == 8
+
+
+def test_acquire_respects_limit():
+    controller = AIMDController(initial=1, max_limit=1)
+    assert controller.acquire(timeout=0)
+    assert not controller.acquire(timeout=0.05)
+    threading.Timer(0.05, controller.release).start()
+    with controller.slot():
+        assert controller.in_flight == 1
+    assert controller.in_flight == 0
@@ -0,0 +1,98 @@
+import pytest
+
+from core.connection_pool import SSHConnectionPool
+
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+
+class FakeClient:
+    def __init__(self):
+        self.transport = FakeTransport()
+        self.closed = False
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.closed = True
+        self.transport.active = False
+
+
+class FakeShell:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def _open(pool, key='u@10.0.0.1', host='10.0.0.1'):
+    assert pool.acquire(key, host, timeout=0.1) is None  # 未命中，预留名额
+    return pool.add(key, host, FakeClient(), FakeShell())
+
+
+def test_checkin_then_checkout_reuses_session():
+    pool = SSHConnectionPool()
+    session = _open(pool)
+    pool.checkin(session)
+    assert pool.acquire('u@10.0.0.1', '10.0.0.1') is session
+    stats = pool.get_stats()
+    assert (stats['hits'], stats['misses'], stats['in_use'], stats['idle'], stats['total']) == (1, 1, 1, 0, 1)
+    pool.shutdown()
+
+
+def test_session_is_given_to_one_user_at_a_time():
+    pool = SSHConnectionPool(max_per_host=1)
+    _open(pool)
+    with pytest.raises(TimeoutError):
+        pool.acquire('u@10.0.0.1', '10.0.0.1', timeout=0.1)
+    pool.shutdown()
+
+
+def test_dead_idle_session_is_discarded():
+    pool = SSHConnectionPool()
+    session = _open(pool)
+    pool.checkin(session)
+    session.ssh.transport.active = False
+    assert pool.acquire('u@10.0.0.1', '10.0.0.1') is None
+    stats = pool.get_stats()
+    assert stats['discards'] == 1
+    assert stats['total'] == 1  # 失效会话的名额已归还，新的预留占用一个
+    pool.shutdown()
+
+
+def test_idle_session_of_other_account_is_evicted_for_host_limit():
+    pool = SSHConnectionPool(max_per_host=1)
+    other = _open(pool, key='admin@10.0.0.1')
+    pool.checkin(other)
+    assert pool.acquire('u@10.0.0.1', '10.0.0.1', timeout=0.1) is None
+    assert other.ssh is None  # 已关闭
+    assert pool.get_stats()['evictions'] == 1
+    pool.shutdown()
+
+
+def test_cancel_and_discard_release_slots():
+    pool = SSHConnectionPool(max_per_host=1)
+    assert pool.acquire('u@10.0.0.1', '10.0.0.1') is None
+    pool.cancel('10.0.0.1')
+    session = _open(pool)
+    pool.discard(session)
+    assert pool.get_stats()['total'] == 0
+    _open(pool)
+    pool.shutdown()
+
+
+def test_checkin_after_shutdown_closes_session():
+    pool = SSHConnectionPool()
+    session = _open(pool)
+    shell = session.shell
+    pool.shutdown()
+    pool.checkin(session)
+    assert shell.closed
+    assert pool.get_stats()['total'] == 0
@@ -0,0 +1,55 @@
+import re
+
+from core.drivers import (PAGER_PATTERN, detect_driver, get_driver, strip_pager_artifacts)
+
+
+def _reply(driver, text):
+    return next((reply for pattern, reply in driver.auto_responses() if pattern.search(text)), None)
+
+
+def test_huawei_prompt_matches_user_and_system_view():
+    prompt = re.compile(get_driver('huawei').prompt_pattern('HW-1'))
+    assert prompt.search('display version\r\n...\r\n<HW-1>')
+    assert prompt.search('system-view\r\n[~HW-1]')
+    assert prompt.search('interface Gi0/0/1\r\n[HW-1-GigabitEthernet0/0/1]')
+    assert not prompt.search('<HW-10>')
+    assert not prompt.search('<HW-1>\r\nmore output')
+
+
+def test_cisco_prompt_and_config_mode():
+    driver = get_driver('cisco')
+    prompt = re.compile(driver.prompt_pattern('R1'))
+    assert prompt.search('show ver\r\nR1#')
+    assert prompt.search('conf t\r\nR1(config-if)#')
+    assert driver.is_config_prompt('R1(config-if)#')
+    assert not driver.is_config_prompt('R1#')
+
+
+def test_extract_hostname():
+    driver = get_driver(None)
+    assert driver.extract_hostname('<HW-1>') == 'HW-1'
+    assert driver.extract_hostname('[~HW-1]') == 'HW-1'
+    assert driver.extract_hostname('R1(config)#') == 'R1'
+    assert driver.extract_hostname('Password:') is None
+
+
+def test_detect_driver():
+    assert detect_driver('SSH-2.0-HUAWEI-1.5').name == 'huawei'
+    assert detect_driver('SSH-2.0-Comware-7.1.064').name == 'h3c'
+    assert detect_driver('', 'login ok\r\n<SW1>').name == 'huawei'
+    assert detect_driver('', 'R1#').name == 'cisco'
+
+
+def test_pager_prompt_and_artifacts():
+    assert PAGER_PATTERN.search('line 1\r\n  ---- More ----')
+    assert PAGER_PATTERN.search('line 1\r\n --More-- ')
+    cleaned = strip_pager_artifacts('a\r\n  ---- More ----\x1b[42D                \x1b[42Db\r\n')
+    assert cleaned == 'a\r\nb\r\n'
+
+
+def test_dialog_replies():
+    huawei = get_driver('huawei')
+    assert _reply(huawei, 'Are you sure to continue?[Y/N]:') == 'Y\n'
+    assert _reply(huawei, 'Please input the file name(*.cfg)[flash:/vrpcfg.cfg]:') == '\n'
+    assert _reply(huawei, '<HW-1>') is None
+    assert _reply(get_driver('cisco'), 'Destination filename [startup-config]? ') == '\n'
@@ -0,0 +1,79 @@
+from core.job_journal import JobJournal, safe_restart_index
+
+COMMANDS = ['display version', 'system-view', 'interface Gi0/0/1', 'description uplink',
+            'quit', 'interface Gi0/0/2', 'description downlink', 'return', 'save']
+
+
+def _journal(path, devices, command_map):
+    journal = JobJournal(str(path))
+    journal.start_job(devices, command_map)
+    return journal
+
+
+def test_safe_restart_index_rewinds_to_config_block():
+    assert safe_restart_index(COMMANDS, 0) == 0
+    assert safe_restart_index(COMMANDS, 1) == 1
+    # 中断在配置块内时从进入配置模式的命令重新开始
+    assert safe_restart_index(COMMANDS, 4) == 1
+    assert safe_restart_index(COMMANDS, 7) == 1
+    assert safe_restart_index(COMMANDS, len(COMMANDS)) == len(COMMANDS)
+
+
+def test_load_tracks_finished_and_interrupted_devices(tmp_path):
+    path = tmp_path / 'job.jsonl'
+    command_map = {'10.0.0.1': ['display version'], '10.0.0.2': COMMANDS, '10.0.0.3': ['display version']}
+    journal = _journal(path, [{'ip': ip, 'password': 'secret'} for ip in command_map], command_map)
+    journal.device_start('10.0.0.1')
+    journal.command_done('10.0.0.1', 'display version')
+    journal.device_end('10.0.0.1', 'success', expected=1)
+    journal.device_start('10.0.0.2')
+    for command in COMMANDS[:4]:
+        journal.command_done('10.0.0.2', command)
+    journal.device_start('10.0.0.3')
+    journal.device_end('10.0.0.3', 'failed', expected=1)
+    journal.close()
+
+    assert 'secret' not in path.read_text(encoding='utf-8')
+    state = JobJournal.load(str(path))
+    assert state.command_map == command_map
+    assert state.remaining_commands('10.0.0.1') == []
+    assert state.remaining_commands('10.0.0.2') == COMMANDS[1:]
+    assert state.remaining_commands('10.0.0.3') == ['display version']
+
+
+def test_resume_offset_accumulates_skipped_commands(tmp_path):
+    path = tmp_path / 'job.jsonl'
+    commands = [f'display interface Gi0/0/{index}' for index in range(6)]
+    journal = _journal(path, [{'ip': '10.0.0.1'}], {'10.0.0.1': commands})
+    journal.device_start('10.0.0.1')
+    for command in commands[:2]:
+        journal.command_done('10.0.0.1', command)
+    journal.close()
+
+    # 第二次运行跳过已完成的2条，又完成2条后中断
+    journal = JobJournal(str(path))
+    journal.device_start('10.0.0.1', skipped=2)
+    for command in commands[2:4]:
+        journal.command_done('10.0.0.1', command)
+    journal.close()
+    assert JobJournal.load(str(path)).remaining_commands('10.0.0.1') == commands[4:]
+
+
+def test_cancelled_device_is_incomplete(tmp_path):
+    path = tmp_path / 'job.jsonl'
+    journal = _journal(path, [{'ip': '10.0.0.1'}], {'10.0.0.1': COMMANDS})
+    journal.device_start('10.0.0.1')
+    journal.command_done('10.0.0.1', COMMANDS[0])
+    journal.device_end('10.0.0.1', 'success', expected=len(COMMANDS))
+    journal.close()
+    assert JobJournal.load(str(path)).remaining_commands('10.0.0.1') == COMMANDS[1:]
+
+
+def test_half_written_last_line_is_ignored(tmp_path):
+    path = tmp_path / 'job.jsonl'
+    journal = _journal(path, [{'ip': '10.0.0.1'}], {'10.0.0.1': ['display version']})
+    journal.device_start('10.0.0.1')
+    journal.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"type": "device_end", "ip": "10.0.0.1", "sta')
+    assert JobJournal.load(str(path)).remaining_commands('10.0.0.1') == ['display version']
@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+
+from core.cancellation import CancelToken, CancelledError
+from core.rate_limit import AdmissionController
+
+
+def test_max_sessions_blocks_until_release():
+    admission = AdmissionController([{'by': 'site', 'max_sessions': 1}])
+    device = {'ip': '10.0.0.1', 'site': 'A'}
+    ticket = admission.acquire(device)
+    with pytest.raises(TimeoutError):
+        admission.acquire(device, timeout=0.1)
+    threading.Timer(0.1, ticket.release).start()
+    admission.acquire(device, timeout=2).release()
+    assert admission.get_stats()['site=A']['active'] == 0
+
+
+def test_token_bucket_limits_rate():
+    admission = AdmissionController([{'by': 'site', 'rate': 10, 'burst': 2}])
+    device = {'ip': '10.0.0.1', 'site': 'A'}
+    start = time.monotonic()
+    for _ in range(4):
+        admission.acquire(device).release()
+    # 突发2个，其余按每秒10个放行
+    assert 0.15 <= time.monotonic() - start < 1
+
+
+def test_rules_apply_only_to_devices_with_the_field():
+    admission = AdmissionController([{'by': 'site', 'max_sessions': 1},
+                                     {'by': 'subnet', 'prefix': 24, 'max_sessions': 5}])
+    keys = [budget.key for budget in admission.budgets_for({'ip': '10.0.0.7'})]
+    assert keys == ['subnet=10.0.0.0/24']
+
+
+def test_acquire_is_cancellable():
+    admission = AdmissionController([{'by': 'site', 'max_sessions': 1}])
+    device = {'ip': '10.0.0.1', 'site': 'A'}
+    admission.acquire(device)
+    token = CancelToken()
+    threading.Timer(0.1, token.cancel).start()
+    with pytest.raises(CancelledError):
+        admission.acquire(device, cancel=token)
+
+
+def test_try_acquire_uses_only_free_slots():
+    admission = AdmissionController([{'by': 'site', 'max_sessions': 2},
+                                     {'by': 'aaa_server', 'max_sessions': 1}])
+    device = {'ip': '10.0.0.1', 'site': 'A', 'aaa_server': 'tacacs1'}
+    ticket = admission.try_acquire(device)
+    assert ticket is not None
+    assert admission.try_acquire(device) is None
+    # 第二个限流对象已满时，第一个对象上的名额也要归还
+    assert admission.get_stats()['site=A']['active'] == 1
+    ticket.release()
+
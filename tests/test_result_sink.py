@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from core.result_sink import JSONLReader, create_sink, open_results
+
+RESULTS = [
+    {'ip': '10.0.0.1', 'status': 'success', 'error': None, 'start_time': 1.0, 'end_time': 2.0,
+     'commands': {'display version': 'VRP 8.180\r\n<HW>', 'display clock': '时钟 2024-01-01'}},
+    {'ip': '10.0.0.2', 'status': 'failed', 'error': 'Connection failed', 'start_time': 1.0, 'end_time': 3.0,
+     'commands': {'display ip int br': 'Error: Unrecognized command'}},
+]
+
+
+@pytest.mark.parametrize('name', ['results.jsonl', 'results.db', 'results'])
+def test_round_trip(tmp_path, name):
+    target = str(tmp_path / name)
+    sink = create_sink(target)
+    summaries = [sink.write(dict(result)) for result in RESULTS]
+    reader = sink.reader()
+    assert sorted(reader.ips()) == ['10.0.0.1', '10.0.0.2']
+    for result in RESULTS:
+        assert reader.get(result['ip']) == result
+    sink.close()
+
+    assert 'commands' not in summaries[0]
+    assert summaries[0]['command_count'] == 2
+    assert summaries[1]['error_commands'] == ['display ip int br']
+    assert len(open_results(target)) == 2
+    assert open_results(target).get('10.0.0.2') == RESULTS[1]
+
+
+@pytest.mark.parametrize('name', ['results.jsonl', 'results.db', 'results'])
+def test_rewrite_keeps_latest_result(tmp_path, name):
+    sink = create_sink(str(tmp_path / name))
+    sink.write(dict(RESULTS[1]))
+    retried = dict(RESULTS[1], status='success', error=None, commands={'display ip int br': 'ok'})
+    sink.write(retried)
+    reader = sink.reader()
+    assert reader.ips() == ['10.0.0.2']
+    assert reader.get('10.0.0.2') == retried
+    sink.close()
+
+
+def test_jsonl_reader_indexes_any_key_order(tmp_path):
+    path = tmp_path / 'results.jsonl'
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'status': 'success', 'ip': '10.0.0.9', 'commands': {}}) + '\n')
+        f.write('{"ip": "10.0.0.10", "status": "succ')  # 写了一半的行
+    reader = JSONLReader(str(path))
+    assert reader.ips() == ['10.0.0.9']
+    assert reader.get('10.0.0.9')['status'] == 'success'
+    assert reader.get('10.0.0.10') is None
@@ -0,0 +1,108 @@
+import socket
+
+import pytest
+from paramiko.ssh_exception import AuthenticationException
+
+from core.cancellation import CancelToken, CancelledError
+from core.retry import CircuitBreaker, CircuitOpenError, RetryManager, RetryPolicy
+
+
+def test_breaker_opens_after_threshold(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('core.retry.time.monotonic', lambda: now[0])
+    breaker = CircuitBreaker('10.0.0.1:22', failure_threshold=3, cooldown=10)
+    assert not breaker.record_failure('timeout')
+    assert not breaker.record_failure('timeout')
+    assert breaker.record_failure('timeout')
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_breaker_half_open_probe(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('core.retry.time.monotonic', lambda: now[0])
+    breaker = CircuitBreaker('10.0.0.1:22', failure_threshold=1, cooldown=10, max_cooldown=15)
+    breaker.record_failure('timeout')
+    now[0] += 10
+    breaker.allow()
+    assert breaker.state == 'half_open'
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()  # 只放行一个试探
+
+    # 试探失败，冷却时间加倍但不超过上限
+    assert breaker.record_failure('timeout')
+    assert (breaker.state, breaker.cooldown) == ('open', 15)
+
+    now[0] += 15
+    breaker.allow()
+    breaker.record_success()
+    assert (breaker.state, breaker.failures, breaker.cooldown) == ('closed', 0, 10)
+
+
+def test_abandoned_probe_allows_next_probe(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('core.retry.time.monotonic', lambda: now[0])
+    breaker = CircuitBreaker('10.0.0.1:22', failure_threshold=1, cooldown=10)
+    breaker.record_failure('timeout')
+    now[0] += 10
+    breaker.allow()
+    breaker.abandon()
+    breaker.allow()
+    assert breaker.state == 'half_open'
+
+
+def _manager(**kwargs):
+    return RetryManager(RetryPolicy(max_attempts=3, base_delay=0), **kwargs)
+
+
+def test_call_retries_transient_errors():
+    attempts = []
+
+    def connect(attempt):
+        attempts.append(attempt)
+        if attempt < 3:
+            raise socket.timeout('timed out')
+        return 'ok'
+
+    assert _manager().call('10.0.0.1:22', connect) == 'ok'
+    assert attempts == [1, 2, 3]
+
+
+def test_call_does_not_retry_rejected_credentials():
+    attempts = []
+
+    def connect(attempt):
+        attempts.append(attempt)
+        raise AuthenticationException('Authentication failed.')
+
+    manager = _manager()
+    with pytest.raises(AuthenticationException):
+        manager.call('10.0.0.1:22', connect)
+    assert attempts == [1]
+    assert manager.breaker('10.0.0.1:22').failures == 0
+
+
+def test_call_fails_fast_when_circuit_is_open():
+    manager = _manager(failure_threshold=2, cooldown=60)
+
+    def connect(attempt):
+        raise socket.timeout('timed out')
+
+    with pytest.raises(socket.timeout):
+        manager.call('10.0.0.1:22', connect)
+    with pytest.raises(CircuitOpenError):
+        manager.call('10.0.0.1:22', connect)
+    manager.reset('10.0.0.1:22')
+    assert manager.breaker('10.0.0.1:22').state == 'closed'
+
+
+def test_call_stops_when_cancelled():
+    token = CancelToken()
+
+    def connect(attempt):
+        token.cancel()
+        raise socket.timeout('timed out')
+
+    with pytest.raises(CancelledError):
+        _manager().call('10.0.0.1:22', connect, cancel=token)
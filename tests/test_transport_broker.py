@@ -0,0 +1,110 @@
+import threading
+import time
+import types
+
+import pytest
+
+from core import transport_broker
+from core.cancellation import CancelToken, CancelledError
+from core.transport_broker import TransportBroker
+
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+    def set_keepalive(self, interval):
+        pass
+
+
+class FakeSSHClient:
+    instances = []
+    delay = 0
+
+    def __init__(self):
+        self.transport = None
+        self.closed = False
+        FakeSSHClient.instances.append(self)
+
+    def set_missing_host_key_policy(self, policy):
+        pass
+
+    def connect(self, *args, **kwargs):
+        time.sleep(self.delay)
+        self.transport = FakeTransport()
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.closed = True
+        if self.transport:
+            self.transport.active = False
+
+
+class FakeSocket:
+    def close(self):
+        pass
+
+    def shutdown(self, how):
+        pass
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    FakeSSHClient.instances = []
+    FakeSSHClient.delay = 0
+    fake_paramiko = types.SimpleNamespace(SSHClient=FakeSSHClient, AutoAddPolicy=lambda: None)
+    monkeypatch.setattr(transport_broker, 'paramiko', fake_paramiko)
+    monkeypatch.setattr(transport_broker, 'open_socket', lambda *args, **kwargs: FakeSocket())
+    return TransportBroker()
+
+
+def test_leases_share_one_login_and_close_with_last_reference(broker):
+    first = broker.acquire('10.0.0.1', 'u', 'p')
+    second = broker.acquire('10.0.0.1', 'u', 'p')
+    assert len(FakeSSHClient.instances) == 1
+    first.close()
+    first.close()  # 重复释放不影响其他使用者
+    assert not FakeSSHClient.instances[0].closed
+    second.close()
+    assert FakeSSHClient.instances[0].closed
+
+
+def test_concurrent_acquire_logs_in_once(broker):
+    FakeSSHClient.delay = 0.1
+    leases = []
+    threads = [threading.Thread(target=lambda: leases.append(broker.acquire('10.0.0.1', 'u', 'p')))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(FakeSSHClient.instances) == 1
+    assert len(leases) == 5
+    for lease in leases:
+        lease.close()
+    assert FakeSSHClient.instances[0].closed
+
+
+def test_inactive_transport_is_replaced(broker):
+    lease = broker.acquire('10.0.0.1', 'u', 'p')
+    FakeSSHClient.instances[0].transport.active = False
+    broker.acquire('10.0.0.1', 'u', 'p').close()
+    assert len(FakeSSHClient.instances) == 2
+    lease.close()
+
+
+def test_waiting_for_another_login_can_be_cancelled(broker):
+    FakeSSHClient.delay = 2
+    threading.Thread(target=lambda: broker.acquire('10.0.0.1', 'u', 'p'), daemon=True).start()
+    time.sleep(0.1)
+    token = CancelToken()
+    threading.Timer(0.1, token.cancel).start()
+    start = time.monotonic()
+    with pytest.raises(CancelledError):
+        broker.acquire('10.0.0.1', 'u', 'p', cancel=token)
+    assert time.monotonic() - start < 1.5
@@ -0,0 +1,103 @@
+import importlib.abc
+import os
+import sys
+import time
+import logging
+from typing import List, Optional, Tuple
+
+STARTUP_REPORT_FLAG = '--startup-report'
+STARTUP_REPORT_ENV = 'NETTOOL_STARTUP_REPORT'
+
+
+class _TimingLoader(importlib.abc.Loader):
+    """包装原加载器，记录模块执行耗时"""
+
+    def __init__(self, timer: "StartupTimer", loader):
+        self._timer = timer
+        self._loader = loader
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._timer._enter()
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._timer._leave(module.__name__, time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class _TimingFinder(importlib.abc.MetaPathFinder):
+    """在其他查找器找到模块后替换为计时加载器"""
+
+    def __init__(self, timer: "StartupTimer"):
+        self._timer = timer
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimingLoader(self._timer, spec.loader)
+                return spec
+        return None
+
+
+class StartupTimer:
+    """启动耗时统计: 每个模块的导入耗时和启动各阶段的时间点
+
+    通过命令行参数 --startup-report 或环境变量 NETTOOL_STARTUP_REPORT=1 开启，
+    未开启时不安装导入钩子，没有额外开销。
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self.imports: List[Tuple[str, float, float]] = []  # (模块, 含子模块耗时, 自身耗时)
+        self.marks: List[Tuple[str, float]] = []
+        self._children = [0.0]  # 导入栈中每层子模块的累计耗时
+        self._finder = None
+        if enabled:
+            self._finder = _TimingFinder(self)
+            sys.meta_path.insert(0, self._finder)
+
+    @classmethod
+    def from_args(cls, argv: List[str]) -> "StartupTimer":
+        """根据命令行参数或环境变量创建，并从 argv 中移除开关参数"""
+        enabled = STARTUP_REPORT_FLAG in argv or os.environ.get(STARTUP_REPORT_ENV) == '1'
+        while STARTUP_REPORT_FLAG in argv:
+            argv.remove(STARTUP_REPORT_FLAG)
+        return cls(enabled)
+
+    def _enter(self) -> None:
+        self._children.append(0.0)
+
+    def _leave(self, name: str, elapsed: float) -> None:
+        children = self._children.pop()
+        self._children[-1] += elapsed
+        self.imports.append((name, elapsed, elapsed - children))
+
+    def mark(self, stage: str) -> None:
+        """记录启动阶段的时间点"""
+        if self.enabled:
+            self.marks.append((stage, time.perf_counter() - self.start))
+
+    def report(self, top: int = 25, logger: Optional[logging.Logger] = None) -> None:
+        """输出启动报告并移除导入钩子"""
+        if not self.enabled:
+            return
+        if self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+        logger = logger or logging.getLogger(__name__)
+        logger.info(f"启动耗时报告: 共导入 {len(self.imports)} 个模块")
+        for stage, at in self.marks:
+            logger.info(f"  {at * 1000:8.1f} ms  {stage}")
+        logger.info("导入耗时最多的模块(自身 / 含子模块):")
+        for name, total, own in sorted(self.imports, key=lambda item: item[1], reverse=True)[:top]:
+            logger.info(f"  {own * 1000:8.1f} ms / {total * 1000:8.1f} ms  {name}")